@@ -13,4 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'final_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from main.realtime import project_events_app  # noqa: E402  (needs the app registry loaded above)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await project_events_app(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -70,8 +70,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.metrics.MetricsMiddleware',
+    'main.query_shapes.QueryShapeMiddleware',
     'corsheaders.middleware.CorsMiddleware',
-    'silk.middleware.SilkyMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -151,13 +152,19 @@ STATIC_URL = '/app/staticfiles/'
 STATIC_ROOT = '/app/staticfiles/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
-DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
+STORAGES = {
+    'default': {'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # Documents and their thumbnails.
+    'documents': {'BACKEND': 'final_project.storages.MinIOStorage'},
+}
 
 AWS_ACCESS_KEY_ID = os.getenv("MINIO_ROOT_USER", "minioadmin")
 AWS_SECRET_ACCESS_KEY = os.getenv("MINIO_ROOT_PASSWORD", "minioadmin")
 AWS_STORAGE_BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "documents-bucket")
 
 AWS_S3_ENDPOINT_URL = "http://minio:9000"
+AWS_S3_PUBLIC_ENDPOINT_URL = os.getenv("MINIO_PUBLIC_ENDPOINT", "http://localhost:9000")
 AWS_S3_CUSTOM_DOMAIN = "localhost:9000/documents-bucket"
 MEDIA_URL = "localhost:9000/documents-bucket/"
 
@@ -166,6 +173,63 @@ AWS_S3_SECURE_URLS = False
 AWS_QUERYSTRING_AUTH = False
 AWS_S3_ADDRESSING_STYLE = "path"
 
+DOCUMENT_UPLOAD_URL_EXPIRE = 15 * 60
+# Multipart part size for uploads; also the most a streaming upload buffers in memory (S3 minimum is 5 MB).
+DOCUMENT_UPLOAD_PART_SIZE = 8 * 1024 * 1024
+DOCUMENT_STREAMING_UPLOADS = True
+
+# 'stream' serves bytes from Django (with Range/ETag support), 'redirect' answers with a
+# short-lived presigned URL and 'accel' hands the transfer to Caddy via X-Accel-Redirect.
+DOCUMENT_DOWNLOAD_MODE = os.getenv("DOCUMENT_DOWNLOAD_MODE", "stream")
+DOCUMENT_DOWNLOAD_URL_EXPIRE = 60
+
+# Push channel for /ws/projects/<id>/ (served by the ASGI app). 'redis' fans events out across
+# processes through pub/sub, 'memory' only reaches sockets in the publishing process.
+REALTIME_BROKER = os.getenv("REALTIME_BROKER", "redis")
+REALTIME_REDIS_URL = os.getenv("REALTIME_REDIS_URL", "redis://redis:6379/2")
+
+# Outgoing mail is queued in OutboxEmail and delivered by `manage.py send_outbox`.
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "from@example.com")
+OUTBOX_MAX_ATTEMPTS = 8
+
+# Document contents are indexed for search by `manage.py extract_document_text`. The text cap
+# also keeps PostgreSQL tsvectors well under their 1 MB limit.
+DOCUMENT_TEXT_MAX_CHARS = 200_000
+DOCUMENT_TEXT_MAX_SOURCE_BYTES = 50 * 1024 * 1024
+
+# Thumbnails (longest side, px) and text snippets made by `manage.py generate_previews`.
+DOCUMENT_PREVIEW_SIZE = 320
+DOCUMENT_PREVIEW_SNIPPET_CHARS = 300
+
+# Prometheus metrics at /metrics. Each worker adds its counters to Redis every
+# METRICS_FLUSH_INTERVAL seconds; 'memory' keeps them per process. With METRICS_TOKEN set,
+# scrapers must send it as a bearer token.
+METRICS_BACKEND = os.getenv("METRICS_BACKEND", "redis")
+METRICS_REDIS_URL = os.getenv("METRICS_REDIS_URL", "redis://redis:6379/3")
+METRICS_FLUSH_INTERVAL = 10
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# N+1 detection: a request running the same query shape more than QUERY_SHAPE_THRESHOLD times
+# is logged ('log') or fails ('raise', for CI) with the code location that issued it. It inspects
+# every query, so it is off unless QUERY_SHAPE_MODE is set in the environment.
+QUERY_SHAPE_MODE = os.getenv("QUERY_SHAPE_MODE", "off")
+QUERY_SHAPE_THRESHOLD = int(os.getenv("QUERY_SHAPE_THRESHOLD", "5"))
+
+# Authenticated users are cached per process for AUTH_USER_LOCAL_TTL seconds and in Redis for
+# AUTH_USER_CACHE_TTL; saving or deleting a User drops both (other processes catch up within the local TTL).
+AUTH_USER_LOCAL_TTL = 5
+AUTH_USER_CACHE_TTL = 300
+
+# Silk stores every SQL query and request body, so it is off unless SILK_ENABLED=1, and then only
+# profiles SILK_SAMPLE_RATE of requests plus those sending `X-Silk-Profile: <SILK_TRIGGER_TOKEN>`.
+SILK_ENABLED = os.getenv("SILK_ENABLED", "") == "1"
+SILK_SAMPLE_RATE = float(os.getenv("SILK_SAMPLE_RATE", "0.01"))
+SILK_TRIGGER_TOKEN = os.getenv("SILK_TRIGGER_TOKEN", "")
+if SILK_ENABLED:
+    MIDDLEWARE.insert(MIDDLEWARE.index('corsheaders.middleware.CorsMiddleware') + 1, 'silk.middleware.SilkyMiddleware')
+    from main.profiling import should_profile
+    SILKY_INTERCEPT_FUNC = should_profile
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -173,7 +237,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'main.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_THROTTLE_CLASSES': [
@@ -205,7 +269,7 @@ SPECTACULAR_SETTINGS = {
 
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
+        "BACKEND": "main.cache_backends.RedisCache",
         "LOCATION": "redis://redis:6379/1",  # Redis на Docker
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
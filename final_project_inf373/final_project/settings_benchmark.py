@@ -0,0 +1,15 @@
+"""Settings for running `manage.py benchmark` offline on SQLite.
+
+    DJANGO_SETTINGS_MODULE=final_project.settings_benchmark python manage.py benchmark
+
+Caches, storage and the realtime broker are replaced by the command itself, so a local
+PostgreSQL run only needs the regular settings and a database the user may create.
+"""
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'benchmark.sqlite3',  # noqa: F405
+    }
+}
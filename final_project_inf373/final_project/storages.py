@@ -1,6 +1,182 @@
+import threading
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.files.storage import storages
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.functional import LazyObject, empty
+from django.utils.http import content_disposition_header
 from storages.backends.s3boto3 import S3Boto3Storage
 
+from main.metrics import instrument_boto_session
+
+
+class DocumentStorage(LazyObject):
+    """The ``documents`` entry of ``STORAGES``, resolved on first use like ``default_storage``."""
+
+    def _setup(self):
+        self._wrapped = storages['documents']
+
+
+document_storage = DocumentStorage()
+
+
+def get_document_storage():
+    # Passed to FileField as a callable so migrations record the setting, not a configured instance.
+    return document_storage
+
+
+@receiver(setting_changed)
+def reset_document_storage(*, setting, **kwargs):
+    if setting == 'STORAGES':
+        document_storage._wrapped = empty
+
+
 class MinIOStorage(S3Boto3Storage):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._public_connections = threading.local()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop('_public_connections', None)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._public_connections = threading.local()
+
+    def _create_session(self):
+        return instrument_boto_session(super()._create_session())
+
     def url(self, name):
         url = super().url(name)
-        return url.replace("https://", "http://")
\ No newline at end of file
+        return url.replace("https://", "http://")
+
+    @property
+    def client(self):
+        return self.connection.meta.client
+
+    @property
+    def public_client(self):
+        # Presigned URLs are signed for a host, so they have to be generated against the
+        # endpoint browsers reach MinIO on rather than the in-cluster one.
+        client = getattr(self._public_connections, 'client', None)
+        if client is None:
+            client = self._create_session().client(
+                's3',
+                region_name=self.region_name,
+                use_ssl=self.use_ssl,
+                endpoint_url=getattr(settings, 'AWS_S3_PUBLIC_ENDPOINT_URL', None) or self.endpoint_url,
+                config=self.client_config,
+                verify=self.verify,
+            )
+            self._public_connections.client = client
+        return client
+
+    def presigned_put_url(self, name, content_type=None, expire=None):
+        params = {'Bucket': self.bucket_name, 'Key': self._normalize_name(name)}
+        if content_type:
+            params['ContentType'] = content_type
+        return self.public_client.generate_presigned_url(
+            'put_object',
+            Params=params,
+            ExpiresIn=expire or self.querystring_expire,
+            HttpMethod='PUT',
+        )
+
+    def presigned_get_url(self, name, filename=None, expire=None, public=True):
+        params = {'Bucket': self.bucket_name, 'Key': self._normalize_name(name)}
+        if filename:
+            params['ResponseContentDisposition'] = content_disposition_header(True, filename)
+        client = self.public_client if public else self.client
+        return client.generate_presigned_url('get_object', Params=params, ExpiresIn=expire or self.querystring_expire)
+
+    def get_object(self, name, byte_range=None):
+        params = {'Bucket': self.bucket_name, 'Key': self._normalize_name(name)}
+        if byte_range:
+            params['Range'] = 'bytes=%d-%d' % byte_range
+        return self.client.get_object(**params)
+
+    def create_multipart_upload(self, name, content_type=None):
+        params = {'Bucket': self.bucket_name, 'Key': self._normalize_name(name)}
+        if content_type:
+            params['ContentType'] = content_type
+        return self.client.create_multipart_upload(**params)['UploadId']
+
+    def presigned_part_url(self, name, upload_id, part_number, expire=None):
+        return self.public_client.generate_presigned_url(
+            'upload_part',
+            Params={
+                'Bucket': self.bucket_name,
+                'Key': self._normalize_name(name),
+                'UploadId': upload_id,
+                'PartNumber': part_number,
+            },
+            ExpiresIn=expire or self.querystring_expire,
+            HttpMethod='PUT',
+        )
+
+    def list_parts(self, name, upload_id):
+        """Return the uploaded parts in order, or ``None`` if the upload no longer exists."""
+        parts = []
+        params = {'Bucket': self.bucket_name, 'Key': self._normalize_name(name), 'UploadId': upload_id}
+        try:
+            while True:
+                page = self.client.list_parts(**params)
+                parts.extend(page.get('Parts', []))
+                if not page.get('IsTruncated'):
+                    return parts
+                params['PartNumberMarker'] = page['NextPartNumberMarker']
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'NoSuchUpload':
+                return None
+            raise
+
+    def complete_multipart_upload(self, name, upload_id, parts):
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=self._normalize_name(name),
+            UploadId=upload_id,
+            MultipartUpload={'Parts': [{'PartNumber': p['PartNumber'], 'ETag': p['ETag']} for p in parts]},
+        )
+
+    def abort_multipart_upload(self, name, upload_id):
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket_name, Key=self._normalize_name(name), UploadId=upload_id)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'NoSuchUpload':
+                raise
+
+    def list_multipart_uploads(self, prefix=''):
+        paginator = self.client.get_paginator('list_multipart_uploads')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=self._normalize_name(prefix)):
+            yield from page.get('Uploads', [])
+
+    def list_objects(self, prefix=''):
+        """Yield every object under ``prefix`` page by page, without loading the full listing."""
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=self._normalize_name(prefix)):
+            yield from page.get('Contents', [])
+
+    def delete_objects(self, names):
+        """Delete up to 1000 keys per request; return the keys S3 reported as failed."""
+        names = list(names)
+        failed = []
+        for start in range(0, len(names), 1000):
+            response = self.client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={'Objects': [{'Key': self._normalize_name(n)} for n in names[start:start + 1000]], 'Quiet': True},
+            )
+            failed.extend(error['Key'] for error in response.get('Errors', []))
+        return failed
+
+    def head(self, name):
+        """Return the object's HEAD response, or ``None`` if it does not exist."""
+        try:
+            return self.client.head_object(Bucket=self.bucket_name, Key=self._normalize_name(name))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
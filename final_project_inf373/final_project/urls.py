@@ -22,8 +22,8 @@ from rest_framework_simplejwt.views import (
 from drf_spectacular.views import (
     SpectacularSwaggerView, SpectacularAPIView
 )
-from main.views import CurrentUserView, RegisterView
-from main.api_views import ProjectViewSet, DocumentViewSet, CommentViewSet, MemberViewSet
+from main.views import CurrentUserView, RegisterView, SearchView, metrics
+from main.api_views import ProjectViewSet, DocumentViewSet, CommentViewSet, MemberViewSet, UploadSessionViewSet
 from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested.routers import NestedSimpleRouter
@@ -35,6 +35,7 @@ router = DefaultRouter()
 router.register(r'projects', ProjectViewSet)
 router.register(r'documents', DocumentViewSet)
 router.register(r'comments', CommentViewSet)
+router.register(r'uploads', UploadSessionViewSet, basename='upload-session')
 
 projects_router = NestedSimpleRouter(router, r'projects', lookup='project')
 projects_router.register(r'members', MemberViewSet, basename='project-members')
@@ -45,7 +46,7 @@ project_members = MemberViewSet.as_view({
 })
 
 urlpatterns = [
-    path('silk/', include('silk.urls', namespace='silk')),
+    path('metrics', metrics, name='metrics'),
     path('admin/', admin.site.urls),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
@@ -53,9 +54,12 @@ urlpatterns = [
     path('api/auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/auth/register/', RegisterView.as_view(), name='register'),
     path('api/auth/current_user/', CurrentUserView.as_view(), name='current_user'),
+    path('api/search/', SearchView.as_view(), name='search'),
     path('api/', include(router.urls)),
     path('api/', include(projects_router.urls)),
     path('', lambda request: redirect('/login/')),
     # re_path(r'^.*$', FrontendAppView.as_view(), name='frontend'),
 ]
+if settings.SILK_ENABLED:
+    urlpatterns.insert(0, path('silk/', include('silk.urls', namespace='silk')))
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
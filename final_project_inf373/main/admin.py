@@ -10,26 +10,78 @@ class UserAdmin(admin.ModelAdmin):
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
     list_display = ('project_name', 'owner')
+    list_select_related = ('owner',)
     search_fields = ('project_name',)
     list_filter = ('owner',)
 
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
-    list_display = ('name', 'project', 'file')
+    list_display = ('name', 'project', 'file', 'size', 'content_type', 'uploaded_at')
+    list_select_related = ('project',)
     search_fields = ('name',)
     list_filter = ('project',)
 
 
+@admin.register(DocumentText)
+class DocumentTextAdmin(admin.ModelAdmin):
+    list_display = ('document', 'status', 'truncated', 'extracted_at')
+    list_filter = ('status',)
+    raw_id_fields = ('document',)
+    list_select_related = ('document',)
+
+
+@admin.register(DocumentPreview)
+class DocumentPreviewAdmin(admin.ModelAdmin):
+    list_display = ('document', 'status', 'thumbnail', 'created_at')
+    list_filter = ('status',)
+    raw_id_fields = ('document',)
+    list_select_related = ('document',)
+
+
 @admin.register(Member)
 class MemberAdmin(admin.ModelAdmin):
     list_display = ('member', 'project')
+    list_select_related = ('member', 'project')
     list_filter = ('project', 'member')
 
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('project', 'username', 'text')
-    search_fields = ('username', 'text')
+    list_select_related = ('project', 'user')
+    search_fields = ('user__username', 'text')
+    list_filter = ('project',)
+
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'project', 'user', 'created_at', 'updated_at')
+    list_select_related = ('project', 'user')
     list_filter = ('project',)
 
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'key', 'size', 'ref_count', 'created_at')
+    search_fields = ('sha256', 'key')
+
+
+@admin.register(StorageDeletion)
+class StorageDeletionAdmin(admin.ModelAdmin):
+    list_display = ('key', 'created_at')
+    search_fields = ('key',)
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipient', 'created_at', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('sent_at',)
+    search_fields = ('recipient',)
+
+
+@admin.register(ChangeLogEntry)
+class ChangeLogEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'project_id', 'kind', 'object_id', 'action', 'created_at')
+    list_filter = ('kind', 'action')
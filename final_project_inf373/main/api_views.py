@@ -1,108 +1,233 @@
-from rest_framework import viewsets, permissions, status
-from .models import Project, Document, Comment, Member, User
+from rest_framework import mixins, viewsets, permissions, status
+from .models import Blob, ChangeLogEntry, Project, Document, Comment, Member, UploadSession, User, document_filename, document_key
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from rest_framework.exceptions import PermissionDenied
-from django.core.mail import send_mail
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.decorators import action
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from .blobs import claim_blob, enqueue_deletion, release_blob, reuse_blob
+from .outbox import queue_project_invite
+from .upload_handlers import S3StreamingUploadHandler, S3UploadedFile
+from .downloads import DOWNLOAD_MODES, serve_document, serve_thumbnail
+from .etags import conditional_on_project
+from .changes import changes_since, head as changelog_head, record_changes
+from .caching import PAYLOAD_TIMEOUT, bump_project, bump_user, project_list_cache_key
+from .permissions import OWNER, IsProjectMember, IsProjectOwner, project_role, project_roles, require_project_role
+from .pagination import CommentCursorPagination
 from .serializers import (
-    ProjectSerializer, DocumentSerializer,
-    CommentSerializer, MemberSerializer
+    ProjectSerializer, ProjectSummarySerializer, DocumentSerializer,
+    CommentSerializer, MemberSerializer, UploadSessionSerializer
 )
 from django.core.cache import cache
+from django.core import signing
+from django.conf import settings
+import hashlib
 import logging
 
 logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_PARTS = 10000
+MAX_BULK_MEMBERS = 1000
+UPLOAD_DENIED = "You do not have permission to upload documents for this project."
+
+
+def split_param(value):
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+
+def annotate_project_summary(projects, expand=()):
+    """Counts and last activity as correlated subqueries, so the list stays a single query."""
+    def count(model):
+        rows = model.objects.filter(project=OuterRef('pk')).order_by().values('project')
+        return Coalesce(Subquery(rows.annotate(n=Count('pk')).values('n')), 0)
+
+    def latest(model, field):
+        rows = model.objects.filter(project=OuterRef('pk')).order_by().values('project')
+        return Subquery(rows.annotate(last=Max(field)).values('last'))
+
+    last_document = latest(Document, 'uploaded_at')
+    last_comment = latest(Comment, 'created_at')
+    projects = projects.annotate(
+        document_count=count(Document),
+        comment_count=count(Comment),
+        member_count=count(Member),
+        # GREATEST returns NULL on SQLite if either side is NULL, so each side falls back to the other.
+        last_activity=Greatest(Coalesce(last_document, last_comment), Coalesce(last_comment, last_document)),
+    )
+    if 'documents' in expand:
+        projects = projects.prefetch_related(Prefetch('documents', queryset=Document.objects.select_related('preview')))
+    if 'comments' in expand:
+        projects = projects.prefetch_related(Prefetch('comment_set', queryset=Comment.objects.select_related('user')))
+    return projects
+
 class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsProjectMember]
+    pagination_class = CommentCursorPagination
 
     def get_queryset(self):
-        return Comment.objects.all()
+        comments = Comment.objects.select_related('user')
+        if self.action in ('list', 'by_user'):
+            comments = comments.filter(project_id__in=project_roles(self.request))
+        return comments
 
     def perform_create(self, serializer):
+        require_project_role(self.request, serializer.validated_data['project'].id,
+                             "You do not have permission to comment on this project.")
         serializer.save(user=self.request.user)
 
+    def perform_update(self, serializer):
+        if serializer.instance.user_id != self.request.user.id:
+            raise PermissionDenied("Not allowed to edit this comment.")
+        if 'project' in serializer.validated_data:
+            require_project_role(self.request, serializer.validated_data['project'].id,
+                                 "You do not have permission to comment on this project.")
+        serializer.save()
+
     def destroy(self, request, *args, **kwargs):
         comment = self.get_object()
-        user = request.user
-        if comment.user == user or comment.project.owner == user:
+        if comment.user_id == request.user.id or project_role(request, comment.project_id) == OWNER:
             return super().destroy(request, *args, **kwargs)
         return Response({'detail': 'Not allowed to delete this comment.'}, status=403)
 
     @action(detail=False, methods=['get'], url_path='by-project/(?P<project_id>[^/.]+)')
+    @conditional_on_project('project_id')
     def by_project(self, request, project_id=None):
-        comments = Comment.objects.filter(project_id=project_id)
-        serializer = self.get_serializer(comments, many=True)
-        return Response(serializer.data)
+        require_project_role(request, project_id, "You do not have permission to view this project.")
+        comments = self.get_queryset().filter(project_id=project_id)
+        return self.paginated_response(comments)
 
     @action(detail=False, methods=['get'], url_path='by-user/(?P<user_id>[^/.]+)')
     def by_user(self, request, user_id=None):
-        comments = Comment.objects.filter(user_id=user_id)
-        serializer = self.get_serializer(comments, many=True)
-        return Response(serializer.data)
+        comments = self.get_queryset().filter(user_id=user_id)
+        return self.paginated_response(comments)
+
+    def paginated_response(self, queryset):
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 class ProjectViewSet(viewsets.ModelViewSet):
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.IsAuthenticated, IsProjectMember]
+
+    def get_permissions(self):
+        if self.action in ('update', 'partial_update', 'destroy'):
+            return [permissions.IsAuthenticated(), IsProjectOwner()]
+        return super().get_permissions()
 
     def perform_create(self, serializer):
         project = serializer.save(owner=self.request.user)
         Member.objects.create(member=self.request.user, project=project, is_owner=True)
 
-        cache_key = f"user-projects:{self.request.user.id}"
-        cache.delete(cache_key)
-
     def get_queryset(self):
-        user = self.request.user
-        cache_key = f"user-projects:{user.id}"
-        cached_projects = cache.get(cache_key)
-
-        if cached_projects is not None:
-            return cached_projects
-
-        owned = Project.objects.filter(owner=user)
-        member = Project.objects.filter(members__member=user)
-        projects = (owned | member).distinct()
+        project_ids = sorted(project_roles(self.request))
+        projects = Project.objects.filter(id__in=project_ids).order_by('id')
+        if self.action == 'project_members':
+            return projects
+        if self.action == 'list':
+            fields, expand = self.summary_options()
+            return annotate_project_summary(projects.select_related('owner'), expand)
+        return projects.select_related('owner').prefetch_related(
+            Prefetch('documents', queryset=Document.objects.select_related('preview')),
+            Prefetch('comment_set', queryset=Comment.objects.select_related('user')),
+        )
 
-        cache.set(cache_key, projects, timeout=300)
-        return projects
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ProjectSummarySerializer
+        return ProjectSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action == 'list':
+            kwargs['fields'], kwargs['expand'] = self.summary_options()
+        return super().get_serializer(*args, **kwargs)
+
+    def summary_options(self):
+        """Parse ``?fields=`` and ``?expand=`` for the list representation."""
+        if not hasattr(self, '_summary_options'):
+            fields = split_param(self.request.query_params.get('fields'))
+            expand = split_param(self.request.query_params.get('expand'))
+            known = set(ProjectSummarySerializer.Meta.fields)
+            unknown = (set(fields) - known - set(ProjectSummarySerializer.expandable)) | (set(expand) - set(ProjectSummarySerializer.expandable))
+            if unknown:
+                raise ValidationError({'detail': f'Unknown fields: {", ".join(sorted(unknown))}.'})
+            # Naming a nested list in ?fields= is the same as expanding it.
+            expand = sorted(set(expand) | (set(fields) & set(ProjectSummarySerializer.expandable)))
+            self._summary_options = (sorted(set(fields) - set(expand)), expand)
+        return self._summary_options
+
+    def list(self, request, *args, **kwargs):
+        project_ids = sorted(project_roles(request))
+        fields, expand = self.summary_options()
+        variant = f"fields={','.join(fields)}&expand={','.join(expand)}"
+        cache_key = project_list_cache_key(request.user, project_ids, variant)
+        data = cache.get(cache_key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(cache_key, data, timeout=PAYLOAD_TIMEOUT)
+        return Response(data)
+
+    @conditional_on_project('pk')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     @action(detail=True, methods=['get'], url_path='members')
+    @conditional_on_project('pk')
     def project_members(self, request, pk=None):
         project = self.get_object()
-        members = Member.objects.filter(project=project)
+        members = Member.objects.filter(project=project).select_related('member', 'project')
         serialized_members = MemberSerializer(members, many=True).data
 
         return Response({
             'members': serialized_members,
             'current_user_id': request.user.id,
-            'owner_id': project.owner.id,
+            'owner_id': project.owner_id,
         })
 
 
+    @action(detail=True, methods=['get'])
+    @conditional_on_project('pk')
+    def changes(self, request, pk=None):
+        """Delta sync: ``?since=<cursor>`` returns what changed after the cursor, without it just the current cursor."""
+        require_project_role(request, pk, "You do not have permission to view this project.")
+        since = request.query_params.get('since')
+        if since is None:
+            return Response({'cursor': changelog_head(pk), 'has_more': False, 'changes': []})
+        try:
+            since = int(since)
+        except ValueError:
+            return Response({'detail': 'since must be an integer cursor.'}, status=400)
+        return Response(changes_since(int(pk), since, request))
+
+
 class MemberViewSet(viewsets.ViewSet):
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsProjectMember]
+    owner_actions = ('create', 'destroy', 'invite_member', 'bulk_add', 'bulk_remove')
+
+    def get_permissions(self):
+        if self.action in self.owner_actions:
+            return [IsAuthenticated(), IsProjectOwner()]
+        return super().get_permissions()
 
+    @conditional_on_project('project_pk')
     def list(self, request, project_pk=None):
         project = get_object_or_404(Project, pk=project_pk)
-        members = Member.objects.filter(project=project)
+        members = Member.objects.filter(project=project).select_related('member', 'project')
         serializer = MemberSerializer(members, many=True)
         return Response({
             "members": serializer.data,
             "current_user_id": request.user.id,
-            "owner_id": project.owner.id
+            "owner_id": project.owner_id
         })
 
     def create(self, request, project_pk=None):
         project = get_object_or_404(Project, pk=project_pk)
-        if request.user != project.owner:
-            return Response({'detail': 'Only owner can add members.'}, status=403)
-
         user_id = request.data.get('member')
         if not user_id:
             return Response({'detail': 'User ID is required.'}, status=400)
@@ -116,16 +241,9 @@ class MemberViewSet(viewsets.ViewSet):
         return Response(serializer.data, status=201)
 
     def destroy(self, request, pk=None, project_pk=None):
-        project = get_object_or_404(Project, pk=project_pk)
-        member = get_object_or_404(Member, member__id=pk, project=project)
+        member = get_object_or_404(Member, member__id=pk, project_id=project_pk)
 
-        if request.user != project.owner:
-            return Response(
-                {'detail': 'Only the project owner can remove members.'},
-                status=403
-            )
-
-        if member.member == request.user:
+        if member.member_id == request.user.id:
             return Response(
                 {'detail': 'You cannot remove yourself from the project.'},
                 status=403
@@ -137,10 +255,6 @@ class MemberViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['post'], url_path='invite')
     def invite_member(self, request, project_pk=None):
         project = get_object_or_404(Project, pk=project_pk)
-
-        if request.user != project.owner:
-            return Response({'detail': 'Only owner can invite members.'}, status=403)
-
         email = request.data.get('email')
         if not email:
             return Response({'detail': 'Email is required.'}, status=400)
@@ -154,42 +268,374 @@ class MemberViewSet(viewsets.ViewSet):
 
             return Response({'detail': f'{email} has been added to the project.'}, status=status.HTTP_200_OK)
 
-        send_mail(
-            'Project Invitation',
-            f'You have been invited to join the project {project.name}. Click the link to join.',
-            'from@example.com',  # Замените на ваш рабочий email
-            [email],
-            fail_silently=False,
-        )
+        # Delivered by the send_outbox worker, so a slow mail server can't hold up the request.
+        queue_project_invite(project, [email])
 
         return Response({'detail': f'Invite sent to {email}.'}, status=status.HTTP_200_OK)
 
+    def parse_bulk_request(self, request, project_pk):
+        project = get_object_or_404(Project, pk=project_pk)
+        user_ids = request.data.get('user_ids') or []
+        emails = request.data.get('emails') or []
+        if not isinstance(user_ids, list) or not isinstance(emails, list):
+            raise ValidationError({'detail': 'user_ids and emails must be lists.'})
+        try:
+            user_ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+        except (TypeError, ValueError):
+            raise ValidationError({'detail': 'user_ids must be integers.'})
+        emails = list(dict.fromkeys(str(email).strip() for email in emails if str(email).strip()))
+        if not user_ids and not emails:
+            raise ValidationError({'detail': 'Provide user_ids or emails.'})
+        if len(user_ids) + len(emails) > MAX_BULK_MEMBERS:
+            raise ValidationError({'detail': f'At most {MAX_BULK_MEMBERS} users per request.'})
+
+        users = User.objects.filter(Q(id__in=user_ids) | Q(email__in=emails)).only('id', 'email')
+        by_id = {user.id: user for user in users}
+        by_email = {user.email: user for user in by_id.values()}
+        # Each item is (result, user or None), in request order.
+        items = [({'user_id': user_id}, by_id.get(user_id)) for user_id in user_ids]
+        items += [({'email': email}, by_email.get(email)) for email in emails]
+        return project, items
+
+    @action(detail=False, methods=['post'], url_path='bulk-add')
+    def bulk_add(self, request, project_pk=None):
+        project, items = self.parse_bulk_request(request, project_pk)
+
+        found_ids = {user.id for _, user in items if user}
+        existing = set(Member.objects.filter(project=project, member_id__in=found_ids).values_list('member_id', flat=True))
+        added = set()
+        invites = []
+        for result, user in items:
+            if user is None:
+                if 'email' in result:
+                    result['status'] = 'invited'
+                    invites.append(result['email'])
+                else:
+                    result['status'] = 'not_found'
+                continue
+            result['user_id'] = user.id
+            if user.id in existing or user.id in added:
+                result['status'] = 'exists'
+            else:
+                result['status'] = 'added'
+                added.add(user.id)
+
+        with transaction.atomic():
+            Member.objects.bulk_create(
+                [Member(project=project, member_id=user_id) for user_id in added], ignore_conflicts=True,
+            )
+            record_changes(project.id, Member, added, ChangeLogEntry.CREATED)
+            if invites:
+                queue_project_invite(project, invites)
+            # bulk_create skips the post_save signal that invalidates cached access lists.
+            if added:
+                bump_project(project.id)
+                for user_id in added:
+                    bump_user(user_id)
+
+        return Response({'results': [result for result, _ in items]}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='bulk-remove')
+    def bulk_remove(self, request, project_pk=None):
+        project, items = self.parse_bulk_request(request, project_pk)
+
+        found_ids = {user.id for _, user in items if user} - {request.user.id}
+        existing = set(Member.objects.filter(project=project, member_id__in=found_ids).values_list('member_id', flat=True))
+        for result, user in items:
+            if user is None:
+                result['status'] = 'not_found'
+                continue
+            result['user_id'] = user.id
+            if user.id == request.user.id:
+                result['status'] = 'forbidden'
+            elif user.id in existing:
+                result['status'] = 'removed'
+            else:
+                result['status'] = 'not_member'
+
+        if existing:
+            Member.objects.filter(project=project, member_id__in=existing).delete()
+
+        return Response({'results': [result for result, _ in items]}, status=status.HTTP_200_OK)
+
 class DocumentViewSet(viewsets.ModelViewSet):
     queryset = Document.objects.all()
     serializer_class = DocumentSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsProjectMember]
+    upload_token_salt = 'document-upload'
+
+    def get_queryset(self):
+        documents = Document.objects.select_related('preview')
+        if self.action == 'list':
+            return documents.filter(project_id__in=project_roles(self.request))
+        return documents
+
+    def with_streaming_upload(self, save, request, *args, **kwargs):
+        storage = Document._meta.get_field('file').storage
+        if not (settings.DOCUMENT_STREAMING_UPLOADS and hasattr(storage, 'create_multipart_upload')):
+            return save(request, *args, **kwargs)
+
+        handler = S3StreamingUploadHandler(request._request, storage=storage)
+        request._request.upload_handlers = [handler]
+        try:
+            return save(request, *args, **kwargs)
+        except Exception:
+            # The bytes were stored while the body was parsed; drop them if no Document points at them.
+            for uploaded in handler.uploaded:
+                storage.delete(uploaded.key)
+            raise
+
+    def create(self, request, *args, **kwargs):
+        return self.with_streaming_upload(super().create, request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        return self.with_streaming_upload(super().update, request, *args, **kwargs)
+
+    def save_upload(self, serializer, upload):
+        """Save with ``upload`` as the file: fills size, type and checksum and takes a blob reference."""
+        content_type = upload.content_type or ''
+        if isinstance(upload, S3UploadedFile):
+            sha256 = upload.sha256
+            blob = claim_blob(sha256, upload.key, upload.size, content_type)
+        else:
+            digest = hashlib.sha256()
+            for chunk in upload.chunks():
+                digest.update(chunk)
+            sha256 = digest.hexdigest()
+            # Known content: only the Document row is written, the bytes are not stored again.
+            blob = reuse_blob(sha256)
+            if blob is None:
+                # Stored before the row so the Document is saved once, already pointing at its blob.
+                field = Document._meta.get_field('file')
+                key = field.storage.save(document_key(upload.name), upload, max_length=field.max_length)
+                # Another upload may have stored the same bytes first, in which case ours is being deleted.
+                blob = claim_blob(sha256, key, upload.size, content_type)
+        return serializer.save(file=blob.key, blob=blob, filename=document_filename(upload.name), size=upload.size,
+                               content_type=content_type, sha256=sha256)
 
     def perform_create(self, serializer):
-        project_id = self.request.data.get("project")
+        require_project_role(self.request, serializer.validated_data['project'].id, UPLOAD_DENIED)
+
+        upload = serializer.validated_data.get('file')
+        if not upload:
+            serializer.save()
+            return
+        with transaction.atomic():
+            self.save_upload(serializer, upload)
+
+    def perform_update(self, serializer):
+        if 'project' in serializer.validated_data:
+            require_project_role(self.request, serializer.validated_data['project'].id, UPLOAD_DENIED)
+
+        upload = serializer.validated_data.get('file')
+        if not upload:
+            serializer.save()
+            return
+        previous_blob, previous_file = serializer.instance.blob_id, serializer.instance.file.name
+        with transaction.atomic():
+            self.save_upload(serializer, upload)
+            if previous_blob:
+                release_blob(previous_blob)
+            elif previous_file:
+                enqueue_deletion([previous_file])
+
+    @action(detail=False, methods=['post'], url_path='upload-url')
+    def upload_url(self, request):
+        project_id = request.data.get('project')
+        name = request.data.get('name')
+        filename = request.data.get('filename') or name
+        if not project_id or not name:
+            return Response({'detail': 'Project and name are required.'}, status=400)
+
+        require_project_role(request, project_id, UPLOAD_DENIED)
         project = get_object_or_404(Project, id=project_id)
 
-        if self.request.user != project.owner and not project.members.filter(member=self.request.user).exists():
-            raise PermissionDenied("You do not have permission to upload documents for this project.")
-
-        serializer.save()
-
-    def destroy(self, request, *args, **kwargs):
-        document = self.get_object()
-        project = document.project
+        sha256 = (request.data.get('sha256') or '').lower()
+        if sha256:
+            document = self.create_from_known_blob(project, name, filename, sha256)
+            if document is not None:
+                return Response({
+                    'deduplicated': True,
+                    'document': self.get_serializer(document).data,
+                }, status=status.HTTP_201_CREATED)
+
+        storage = Document._meta.get_field('file').storage
+        key = document_key(filename)
+        content_type = request.data.get('content_type') or None
+        expire = settings.DOCUMENT_UPLOAD_URL_EXPIRE
+        token = signing.dumps(
+            {'key': key, 'project': project.id, 'name': name, 'user': request.user.id},
+            salt=self.upload_token_salt,
+        )
+        return Response({
+            'method': 'PUT',
+            'url': storage.presigned_put_url(key, content_type=content_type, expire=expire),
+            'headers': {'Content-Type': content_type} if content_type else {},
+            'key': key,
+            'upload_token': token,
+            'expires_in': expire,
+        })
 
-        if request.user != project.owner and not project.members.filter(member=request.user).exists():
-            raise PermissionDenied("You do not have permission to delete this document.")
+    def create_from_known_blob(self, project, name, filename, sha256):
+        # A bare hash is only honoured for content the caller can already read; otherwise knowing
+        # a file's SHA-256 would be enough to obtain a copy of it.
+        accessible = project_roles(self.request)
+        if not Blob.objects.filter(sha256=sha256, documents__project_id__in=accessible).exists():
+            return None
+        with transaction.atomic():
+            blob = reuse_blob(sha256)
+            if blob is None:
+                return None
+            return Document.objects.create(
+                project=project, name=name, filename=document_filename(filename), file=blob.key, blob=blob,
+                size=blob.size, content_type=blob.content_type, sha256=sha256,
+            )
 
-        return super().destroy(request, *args, **kwargs)
+    @action(detail=False, methods=['post'], url_path='complete-upload')
+    def complete_upload(self, request):
+        try:
+            upload = signing.loads(
+                request.data.get('upload_token', ''),
+                salt=self.upload_token_salt,
+                max_age=settings.DOCUMENT_UPLOAD_URL_EXPIRE * 2,
+            )
+        except signing.BadSignature:
+            return Response({'detail': 'Invalid or expired upload token.'}, status=400)
+        if upload['user'] != request.user.id:
+            raise PermissionDenied("This upload was issued to another user.")
+
+        require_project_role(request, upload['project'], UPLOAD_DENIED)
+        project = get_object_or_404(Project, id=upload['project'])
+
+        storage = Document._meta.get_field('file').storage
+        head = storage.head(upload['key'])
+        if head is None:
+            return Response({'detail': 'Uploaded file was not found in storage.'}, status=400)
+
+        document, _ = Document.objects.get_or_create(project=project, file=upload['key'], defaults={
+            'name': upload['name'],
+            'filename': document_filename(upload['key']),
+            'size': head['ContentLength'],
+            'content_type': head.get('ContentType', ''),
+        })
+        serializer = self.get_serializer(document)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
         document = self.get_object()
-        file_handle = document.file.open('rb')
-        response = FileResponse(file_handle, as_attachment=True, filename=document.file.name.split('/')[-1])
-        return response
\ No newline at end of file
+        mode = request.query_params.get('mode')
+        if mode is not None and mode not in DOWNLOAD_MODES:
+            return Response({'detail': f'Unknown download mode. Use one of: {", ".join(DOWNLOAD_MODES)}.'}, status=400)
+        return serve_document(request, document, mode=mode)
+
+    @action(detail=True, methods=['get'])
+    def thumbnail(self, request, pk=None):
+        document = self.get_object()
+        preview = getattr(document, 'preview', None)
+        if preview is None or not preview.thumbnail or preview.source != document.file.name:
+            return Response({'detail': 'No thumbnail for this document.'}, status=status.HTTP_404_NOT_FOUND)
+        return serve_thumbnail(request, preview)
+
+
+class UploadSessionViewSet(mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """Resumable uploads: parts go straight to an S3 multipart upload, Django only keeps the session."""
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+    @property
+    def storage(self):
+        return Document._meta.get_field('file').storage
+
+    def perform_create(self, serializer):
+        require_project_role(self.request, serializer.validated_data['project'].id, UPLOAD_DENIED)
+
+        filename = serializer.validated_data.pop('filename', None) or serializer.validated_data['name']
+        key = document_key(filename)
+        # Refuse up front rather than after every part has been uploaded.
+        if len(key) > Document._meta.get_field('file').max_length:
+            raise ValidationError({'filename': 'Filename is too long.'})
+        content_type = serializer.validated_data.get('content_type') or None
+        upload_id = self.storage.create_multipart_upload(key, content_type=content_type)
+        serializer.save(user=self.request.user, key=key, upload_id=upload_id)
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.data['part_size'] = settings.DOCUMENT_UPLOAD_PART_SIZE
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        session = self.get_object()
+        parts = self.storage.list_parts(session.key, session.upload_id)
+        if parts is None:
+            session.delete()
+            return Response({'detail': 'Upload session has expired.'}, status=status.HTTP_410_GONE)
+
+        data = self.get_serializer(session).data
+        data['part_size'] = settings.DOCUMENT_UPLOAD_PART_SIZE
+        data['parts'] = [
+            {'part_number': p['PartNumber'], 'size': p['Size'], 'etag': p['ETag']} for p in parts
+        ]
+        return Response(data)
+
+    @action(detail=True, methods=['post'])
+    def parts(self, request, pk=None):
+        session = self.get_object()
+        numbers = request.data.get('part_numbers')
+        if not isinstance(numbers, list) or not numbers:
+            return Response({'detail': 'part_numbers must be a non-empty list.'}, status=400)
+        try:
+            numbers = sorted({int(n) for n in numbers})
+        except (TypeError, ValueError):
+            return Response({'detail': 'part_numbers must be integers.'}, status=400)
+        if numbers[0] < 1 or numbers[-1] > MAX_UPLOAD_PARTS:
+            return Response({'detail': f'Part numbers must be between 1 and {MAX_UPLOAD_PARTS}.'}, status=400)
+
+        # Touching the session keeps the reaper away while the client is still working on it.
+        session.save(update_fields=['updated_at'])
+        expire = settings.DOCUMENT_UPLOAD_URL_EXPIRE
+        return Response({
+            'expires_in': expire,
+            'urls': {
+                str(n): self.storage.presigned_part_url(session.key, session.upload_id, n, expire=expire)
+                for n in numbers
+            },
+        })
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        session = self.get_object()
+        require_project_role(request, session.project_id, UPLOAD_DENIED)
+
+        parts = self.storage.list_parts(session.key, session.upload_id)
+        if parts is None:
+            session.delete()
+            return Response({'detail': 'Upload session has expired.'}, status=status.HTTP_410_GONE)
+        if not parts:
+            return Response({'detail': 'No parts have been uploaded.'}, status=400)
+        expected = request.data.get('parts_count')
+        if expected is not None and str(expected) != str(len(parts)):
+            return Response({'detail': f'Expected {expected} parts, storage has {len(parts)}.'}, status=400)
+
+        self.storage.complete_multipart_upload(session.key, session.upload_id, parts)
+        head = self.storage.head(session.key)
+        document = Document.objects.create(
+            project=session.project,
+            name=session.name,
+            filename=document_filename(session.key),
+            file=session.key,
+            size=head['ContentLength'],
+            content_type=head.get('ContentType', ''),
+        )
+        session.delete()
+        return Response(DocumentSerializer(document, context=self.get_serializer_context()).data, status=status.HTTP_201_CREATED)
+
+    def perform_destroy(self, instance):
+        self.storage.abort_multipart_upload(instance.key, instance.upload_id)
+        instance.delete()
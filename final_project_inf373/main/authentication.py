@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+LOCAL_MAX_ENTRIES = 10000
+# Everything else, the password hash included, stays deferred and is loaded only if a view reads it.
+USER_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+
+
+def _user_key(user_id):
+    return f'auth-user-fields:{user_id}'
+
+
+class LocalUserCache:
+    """Per-process LRU of ``user_id -> (expires_at, entry)`` in front of the shared cache."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, entry):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + settings.AUTH_USER_LOCAL_TTL, entry)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > LOCAL_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_users = LocalUserCache()
+
+
+def forget_user(user_id):
+    """Drop the cached user now and again after commit, like ``caching.bump_version``.
+
+    Other processes keep their local copy for up to ``AUTH_USER_LOCAL_TTL`` seconds.
+    """
+    def forget():
+        local_users.discard(user_id)
+        cache.delete(_user_key(user_id))
+
+    forget()
+    transaction.on_commit(forget)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that loads the user from a process-local cache, then Redis, then the database.
+
+    Both levels hold ``(USER_FIELDS values, password fingerprint)`` rather than a ``User``. Each
+    request gets its own instance built from them, so changes a request makes to ``request.user``
+    stay in that request. Entries live for ``AUTH_USER_CACHE_TTL`` seconds and are dropped whenever
+    the user is saved or deleted (see signals). Writes through ``QuerySet.update()`` bypass that
+    and are only picked up when the entry expires.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        entry = local_users.get(user_id)
+        if entry is None:
+            entry = cache.get(_user_key(user_id))
+            if entry is None:
+                entry = self.load_entry(user_id)
+                cache.set(_user_key(user_id), entry, timeout=settings.AUTH_USER_CACHE_TTL)
+            local_users.set(user_id, entry)
+        values, fingerprint = entry
+
+        # A deferred field loads on access and save() only writes the fields that were loaded.
+        user = self.user_model.from_db(router.db_for_read(self.user_model), self.cached_fields, values)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != fingerprint:
+            raise AuthenticationFailed("The user's password has been changed.", code="password_changed")
+        return user
+
+    @property
+    def cached_fields(self):
+        # from_db() expects values in model field order.
+        return [field.attname for field in self.user_model._meta.concrete_fields if field.attname in USER_FIELDS]
+
+    def load_entry(self, user_id):
+        rows = self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list(*self.cached_fields, 'password')
+        row = rows.first()
+        if row is None:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        # Only the hash SimpleJWT embeds in tokens is kept, never the password hash itself.
+        fingerprint = get_md5_hash_password(row[-1]) if api_settings.CHECK_REVOKE_TOKEN else ''
+        return tuple(row[:-1]), fingerprint
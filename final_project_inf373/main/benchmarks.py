@@ -0,0 +1,159 @@
+"""Endpoint benchmarks for ``manage.py benchmark``.
+
+Each endpoint is requested through the test client with an empty cache, so the numbers cover the
+database path. Latency is timed over many requests, queries are counted on every request and
+allocations are measured in a separate tracemalloc pass so tracing does not skew the timings.
+"""
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .models import Document, Project
+from .seeding import seed_scaled
+
+SCALES = {
+    'small': {'projects': 20, 'members': 10, 'comments': 200, 'documents': 20},
+    'medium': {'projects': 100, 'members': 25, 'comments': 2000, 'documents': 100},
+    'large': {'projects': 200, 'members': 50, 'comments': 5000, 'documents': 200},
+}
+
+# The path GET /api/projects/<id>/members/ resolves to ProjectViewSet.project_members.
+ENDPOINTS = {
+    'project-list': lambda target: reverse('project-list'),
+    'project-detail': lambda target: reverse('project-detail', args=[target.project]),
+    'comments-by-project': lambda target: reverse('comment-by-project', args=[target.project]),
+    'project-members': lambda target: reverse('project-project-members', args=[target.project]),
+    'document-download': lambda target: reverse('document-download', args=[target.document]) + '?mode=stream',
+}
+
+# Latency and memory differences below these are noise, whatever the relative change.
+MIN_LATENCY_DELTA_MS = 2
+MIN_MEMORY_DELTA_KIB = 64
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+@dataclass
+class Target:
+    user: object
+    project: int
+    document: int
+
+
+def dataset_key(params):
+    return '{projects}x{members}x{comments}x{documents}'.format(**params)
+
+
+def benchmark_environment():
+    """Local cache, in-memory document storage, no Silk and no Redis."""
+    return override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}},
+        MIDDLEWARE=[m for m in settings.MIDDLEWARE if not m.startswith('silk.')],
+        STORAGES={**settings.STORAGES, 'documents': {'BACKEND': 'django.core.files.storage.InMemoryStorage'}},
+        REALTIME_BROKER='memory',
+    )
+
+
+def prepare(params, seed=0):
+    """Seed the dataset and pick the busiest project, its owner and one of its documents."""
+    projects = params['projects']
+    # alpha=0 gives every project the same team size and the same number of comments and documents.
+    seed_scaled(
+        users=max(params['members'] * 2, projects, 1),
+        projects=projects,
+        comments=projects * params['comments'],
+        documents=projects * params['documents'],
+        members_per_project=params['members'],
+        seed=seed,
+        alpha=0,
+    )
+    project = Project.objects.annotate(comment_count=Count('comment')).order_by('-comment_count', 'pk').first()
+    document = Document.objects.filter(project=project).order_by('pk').first()
+    if document is None:
+        raise BenchmarkError('The dataset needs at least one document per project.')
+    # Only the downloaded document needs content.
+    storage = Document._meta.get_field('file').storage
+    storage.save(document.file.name, ContentFile(b'x' * 64 * 1024))
+    return Target(user=project.owner, project=project.pk, document=document.pk)
+
+
+def request(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise BenchmarkError(f'GET {url} returned {response.status_code}.')
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def measure(client, url, iterations):
+    timings = []
+    queries = 0
+    for _ in range(iterations):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            request(client, url)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = max(queries, len(captured))
+
+    cache.clear()
+    tracemalloc.start()
+    try:
+        request(client, url)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'queries': queries,
+        'memory_kib': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(target, iterations=30, endpoints=None):
+    client = APIClient()
+    client.force_authenticate(user=target.user)
+    results = {}
+    for name in endpoints or ENDPOINTS:
+        url = ENDPOINTS[name](target)
+        request(client, url)  # warm up URL resolution and imports
+        results[name] = measure(client, url, iterations)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of ``results`` against ``baseline`` as messages; queries may never grow."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: {result['queries']} queries, baseline {base['queries']}")
+        p95, base_p95 = result['p95_ms'], base['p95_ms']
+        if p95 > base_p95 * (1 + tolerance) and p95 - base_p95 > MIN_LATENCY_DELTA_MS:
+            regressions.append(f"{name}: p95 {p95} ms, baseline {base_p95} ms")
+        memory, base_memory = result['memory_kib'], base['memory_kib']
+        if memory > base_memory * (1 + tolerance) and memory - base_memory > MIN_MEMORY_DELTA_KIB:
+            regressions.append(f"{name}: {memory} KiB allocated, baseline {base_memory} KiB")
+    return regressions
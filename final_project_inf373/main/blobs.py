@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models import F
+
+from .models import Blob, Document, StorageDeletion
+
+
+def _storage():
+    return Document._meta.get_field('file').storage
+
+
+def enqueue_deletion(keys):
+    """Queue storage keys for removal by ``gc_storage``; rolled back together with the caller's transaction."""
+    StorageDeletion.objects.bulk_create(
+        [StorageDeletion(key=key) for key in keys if key], ignore_conflicts=True,
+    )
+
+
+def claim_blob(sha256, key, size, content_type=''):
+    """Take a reference on the blob for ``sha256``, creating it from the object at ``key``.
+
+    When the content is already stored under another key, the object at ``key`` is a redundant
+    copy and is deleted once the transaction commits. Callers must point their Document at the
+    returned blob's key.
+    """
+    with transaction.atomic():
+        blob, created = Blob.objects.select_for_update().get_or_create(
+            sha256=sha256,
+            defaults={'key': key, 'size': size, 'content_type': content_type, 'ref_count': 1},
+        )
+        if not created:
+            Blob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+            if blob.key != key:
+                storage = _storage()
+                transaction.on_commit(lambda: storage.delete(key))
+    return blob
+
+
+def reuse_blob(sha256):
+    """Take a reference on an existing blob without uploading anything; ``None`` if unknown."""
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(sha256=sha256).first()
+        if blob is not None:
+            Blob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+    return blob
+
+
+def release_blob(blob_id):
+    """Drop one reference; the stored object is queued for removal with the last one."""
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(pk=blob_id).first()
+        if blob is None:
+            return
+        if blob.ref_count > 1:
+            Blob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+            return
+        blob.delete()
+        enqueue_deletion([blob.key])
@@ -0,0 +1,31 @@
+"""Cache backends that count hits and misses for ``/metrics``."""
+from django.core.cache.backends.locmem import LocMemCache as BaseLocMemCache
+from django_redis.cache import RedisCache as BaseRedisCache
+
+from .metrics import record_cache
+
+_missing = object()
+
+
+class InstrumentedCacheMixin:
+    def get(self, key, default=None, version=None, **kwargs):
+        value = super().get(key, _missing, version=version, **kwargs)
+        if value is _missing:
+            record_cache(0, 1)
+            return default
+        record_cache(1, 0)
+        return value
+
+    def get_many(self, keys, version=None, **kwargs):
+        keys = list(keys)
+        values = super().get_many(keys, version=version, **kwargs)
+        record_cache(len(values), len(keys) - len(values))
+        return values
+
+
+class RedisCache(InstrumentedCacheMixin, BaseRedisCache):
+    pass
+
+
+class LocMemCache(InstrumentedCacheMixin, BaseLocMemCache):
+    pass
@@ -0,0 +1,93 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+ACCESS_TIMEOUT = 300
+PAYLOAD_TIMEOUT = 300
+
+
+def _version_key(scope, pk):
+    return f"{scope}-version:{pk}"
+
+
+def _seed():
+    # Versions start from the clock so a counter that was evicted never restarts at a value
+    # that already has cached entries attached to it.
+    return time.time_ns() // 1000
+
+
+def get_version(scope, pk):
+    return get_versions(scope, [pk])[pk]
+
+
+def get_versions(scope, pks):
+    keys = {_version_key(scope, pk): pk for pk in pks}
+    found = cache.get_many(keys)
+    missing = {key: _seed() for key in keys if key not in found}
+    for key, value in missing.items():
+        cache.add(key, value, timeout=None)
+    if missing:
+        # Prefer a value another process added first; if the key was already evicted again, the
+        # fresh seed still can't match anything cached under an older version.
+        found.update({**missing, **cache.get_many(list(missing))})
+    return {keys[key]: value for key, value in found.items()}
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _seed(), timeout=None)
+
+
+def bump_version(scope, pk):
+    """Invalidate everything cached under ``scope``/``pk``.
+
+    The counter is bumped right away and once more after the surrounding transaction commits,
+    so a reader that cached pre-commit rows under the intermediate version is never reused.
+    """
+    if pk is None:
+        return
+    key = _version_key(scope, pk)
+    _incr(key)
+    transaction.on_commit(lambda: _incr(key))
+
+
+def bump_user(user_id):
+    bump_version('user', user_id)
+
+
+def bump_project(project_id):
+    bump_version('project', project_id)
+
+
+def get_project_roles(user):
+    """Map of ``{project_id: 'owner' | 'member'}`` for every project ``user`` can access."""
+    from .models import Project
+
+    cache_key = f"user-roles:{user.id}:{get_version('user', user.id)}"
+    roles = cache.get(cache_key)
+    if roles is None:
+        rows = (
+            Project.objects
+            .filter(Q(owner=user) | Q(members__member=user))
+            .values_list('id', 'owner_id')
+            .distinct()
+        )
+        roles = {pk: 'owner' if owner_id == user.id else 'member' for pk, owner_id in rows}
+        cache.set(cache_key, roles, timeout=ACCESS_TIMEOUT)
+    return roles
+
+
+def get_accessible_project_ids(user):
+    return sorted(get_project_roles(user))
+
+
+def project_list_cache_key(user, project_ids, variant=''):
+    versions = get_versions('project', project_ids)
+    fingerprint = variant + '|' + ','.join(f"{pk}:{versions[pk]}" for pk in project_ids)
+    digest = hashlib.md5(fingerprint.encode()).hexdigest()
+    return f"project-list:{user.id}:{digest}"
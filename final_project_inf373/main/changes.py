@@ -0,0 +1,100 @@
+from django.db import connection, transaction
+
+from .models import ChangeLogEntry, Comment, Document, Member
+from .serializers import CommentSerializer, DocumentSerializer, MemberSerializer
+
+KINDS = {Comment: 'comment', Document: 'document', Member: 'member'}
+MAX_CHANGES = 500
+# First key of the PostgreSQL advisory lock taken per project while its log is written.
+LOCK_NAMESPACE = 0x636c
+
+
+def object_id(instance):
+    # Members are exposed (and addressed in URLs) by their user id.
+    return instance.member_id if isinstance(instance, Member) else instance.pk
+
+
+def lock_log(project_id):
+    """Hold the project's log until commit, so its entry ids become visible in increasing order.
+
+    Ids are drawn from the sequence at INSERT but become visible at COMMIT. Without the lock an
+    entry committed early would move a client's cursor past one still in flight, which that client
+    would then never receive. SQLite already serializes writers.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [LOCK_NAMESPACE, project_id % 2 ** 31])
+
+
+def record_change(instance, action):
+    with transaction.atomic(savepoint=False):
+        lock_log(instance.project_id)
+        return ChangeLogEntry.objects.create(
+            project_id=instance.project_id, kind=KINDS[type(instance)], object_id=object_id(instance), action=action,
+        )
+
+
+def record_changes(project_id, model, object_ids, action):
+    """Log writes that bypass model signals (bulk_create, bulk_update)."""
+    with transaction.atomic(savepoint=False):
+        lock_log(project_id)
+        ChangeLogEntry.objects.bulk_create([
+            ChangeLogEntry(project_id=project_id, kind=KINDS[model], object_id=pk, action=action) for pk in object_ids
+        ])
+
+
+def head(project_id):
+    entry = ChangeLogEntry.objects.filter(project_id=project_id).order_by('-id').values_list('id', flat=True).first()
+    return entry or 0
+
+
+def changes_since(project_id, since, request, limit=None):
+    """Changes after cursor ``since``, one item per object with its current state or a tombstone.
+
+    Reads at most ``limit`` log rows through the (project_id, id) index, plus one query per kind
+    that has live objects, so the cost follows the number of changes rather than project size.
+    """
+    limit = limit or MAX_CHANGES
+    entries = list(
+        ChangeLogEntry.objects.filter(project_id=project_id, id__gt=since)
+        .order_by('id')
+        .values_list('id', 'kind', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}
+    for seq, kind, pk, action in entries:
+        previous = latest.pop((kind, pk), None)
+        if previous and previous['action'] == ChangeLogEntry.CREATED and action == ChangeLogEntry.UPDATED:
+            action = ChangeLogEntry.CREATED
+        latest[(kind, pk)] = {'seq': seq, 'type': kind, 'id': pk, 'action': action}
+
+    wanted = {}
+    for (kind, pk), change in latest.items():
+        if change['action'] != ChangeLogEntry.DELETED:
+            wanted.setdefault(kind, []).append(pk)
+    context = {'request': request}
+    current = {}
+    if 'comment' in wanted:
+        for comment in Comment.objects.filter(project_id=project_id, pk__in=wanted['comment']).select_related('user'):
+            current[('comment', comment.pk)] = CommentSerializer(comment, context=context).data
+    if 'document' in wanted:
+        for document in Document.objects.filter(project_id=project_id, pk__in=wanted['document']).select_related('preview'):
+            current[('document', document.pk)] = DocumentSerializer(document, context=context).data
+    if 'member' in wanted:
+        members = Member.objects.filter(project_id=project_id, member_id__in=wanted['member']).select_related('member', 'project')
+        for member in members:
+            current[('member', member.member_id)] = MemberSerializer(member, context=context).data
+
+    changes = []
+    for key, change in latest.items():
+        if change['action'] != ChangeLogEntry.DELETED:
+            if key not in current:
+                # Deleted by a later write that is beyond this page; its tombstone comes next.
+                continue
+            change['data'] = current[key]
+        changes.append(change)
+    changes.sort(key=lambda change: change['seq'])
+    cursor = entries[-1][0] if entries else since
+    return {'cursor': cursor, 'has_more': has_more, 'changes': changes}
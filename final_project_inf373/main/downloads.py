@@ -0,0 +1,159 @@
+import hashlib
+import os
+import re
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+from .models import document_filename
+
+DOWNLOAD_MODES = ('stream', 'redirect', 'accel')
+CHUNK_SIZE = 64 * 1024
+
+_range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """Parse a single ``bytes=`` range into an inclusive ``(start, end)`` pair.
+
+    Returns ``None`` when the header is missing or unsupported (multiple ranges), in which case
+    the whole file is served as RFC 9110 allows.
+    """
+    match = _range_re.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in header.split(',')]
+    return etag in candidates or f'W/{etag}' in candidates
+
+
+def download_filename(document):
+    """The name ``document`` was uploaded under, never the storage key's, which may be another upload's."""
+    if document.filename:
+        return document.filename
+    name, extension = document.name, os.path.splitext(document.file.name)[1]
+    return document_filename(name if name.endswith(extension) else name + extension)
+
+
+def serve_document(request, document, mode=None):
+    mode = mode or settings.DOCUMENT_DOWNLOAD_MODE
+    storage = document.file.storage
+    filename = download_filename(document)
+
+    if mode == 'redirect' and hasattr(storage, 'presigned_get_url'):
+        return HttpResponseRedirect(storage.presigned_get_url(
+            document.file.name, filename=filename, expire=settings.DOCUMENT_DOWNLOAD_URL_EXPIRE,
+        ))
+
+    if mode == 'accel' and hasattr(storage, 'presigned_get_url'):
+        # The front proxy swaps this response for the object fetched from MinIO, forwarding the
+        # client's Range/If-None-Match headers, so the app only signs the request.
+        url = urlsplit(storage.presigned_get_url(
+            document.file.name, filename=filename, expire=settings.DOCUMENT_DOWNLOAD_URL_EXPIRE, public=False,
+        ))
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = f'{url.path}?{url.query}'
+        return response
+
+    if hasattr(storage, 'get_object'):
+        return _stream_from_s3(request, storage, document.file.name, filename)
+    return _stream_from_storage(request, document.file, filename)
+
+
+def serve_thumbnail(request, preview):
+    """Stream a preview thumbnail; revalidated with its ETag because the URL outlives the file."""
+    thumbnail = preview.thumbnail
+    filename = thumbnail.name.split('/')[-1]
+    if hasattr(thumbnail.storage, 'get_object'):
+        response = _stream_from_s3(request, thumbnail.storage, thumbnail.name, filename)
+    else:
+        response = _stream_from_storage(request, thumbnail, filename)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _stream_from_s3(request, storage, name, filename):
+    head = storage.head(name)
+    if head is None:
+        return HttpResponse(status=404)
+    size = head['ContentLength']
+    etag = head['ETag']
+    content_type = head.get('ContentType') or 'application/octet-stream'
+
+    def body_for(byte_range):
+        return storage.get_object(name, byte_range=byte_range)['Body'].iter_chunks(CHUNK_SIZE)
+
+    return _ranged_response(request, size, etag, content_type, filename, body_for)
+
+
+def _stream_from_storage(request, field_file, filename):
+    size = field_file.size
+    etag = '"%s"' % hashlib.md5(f'{field_file.name}:{size}'.encode()).hexdigest()
+
+    def body_for(byte_range):
+        handle = field_file.open('rb')
+        if byte_range is None:
+            return handle
+        start, end = byte_range
+        handle.seek(start)
+        return iter([handle.read(end - start + 1)])
+
+    return _ranged_response(request, size, etag, 'application/octet-stream', filename, body_for)
+
+
+def _ranged_response(request, size, etag, content_type, filename, body_for):
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    range_header = request.headers.get('Range')
+    if range_header and request.headers.get('If-Range') not in (None, etag):
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        body = body_for(None)
+        if hasattr(body, 'read'):
+            response = FileResponse(body, content_type=content_type)
+        else:
+            response = StreamingHttpResponse(body, content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(body_for(byte_range), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
@@ -0,0 +1,48 @@
+import hashlib
+from functools import wraps
+
+from rest_framework.response import Response
+
+from .caching import get_version
+from .downloads import etag_matches
+from .permissions import project_role
+
+
+def project_etag(request, project_id):
+    """Strong ETag for a per-project resource as seen by ``request.user``.
+
+    Built from the project's version counter, which every Project, Member, Document and Comment
+    write bumps, so it changes whenever anything the response could contain changes.
+    """
+    version = get_version('project', int(project_id))
+    fingerprint = f"{request.path}?{request.META.get('QUERY_STRING', '')}|{request.META.get('HTTP_ACCEPT', '')}|{request.user.id}|{version}"
+    return '"%s"' % hashlib.md5(fingerprint.encode()).hexdigest()
+
+
+def conditional_on_project(kwarg):
+    """Answer ``If-None-Match`` with 304 before the view touches the database.
+
+    ``kwarg`` names the URL keyword holding the project id. Requests from users without a role
+    in the project fall through to the view so it can produce the usual 403/404.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            project_id = kwargs.get(kwarg)
+            if project_role(request, project_id) is None:
+                return view_method(self, request, *args, **kwargs)
+
+            # Read the version before the view runs: a concurrent write can only make the ETag
+            # older than the body, which costs the client one extra full response later.
+            etag = project_etag(request, project_id)
+            if etag_matches(request.headers.get('If-None-Match'), etag):
+                response = Response(status=304)
+            else:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
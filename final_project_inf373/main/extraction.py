@@ -0,0 +1,157 @@
+"""Text extraction for document search.
+
+Objects are read from storage in chunks: plain text is decoded incrementally and the read stops
+once ``DOCUMENT_TEXT_MAX_CHARS`` characters are collected. PDF and Office files need random
+access, so they are spooled to a temporary file (in memory up to ``SPOOL_MEMORY``, on disk after
+that) and skipped above ``DOCUMENT_TEXT_MAX_SOURCE_BYTES``. Their extractors are optional and the
+formats are reported as unsupported when ``pypdf`` / ``python-docx`` are not installed.
+"""
+import codecs
+import mimetypes
+import os
+import tempfile
+
+from django.conf import settings
+
+from .models import DocumentText
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+try:
+    import docx
+except ImportError:
+    docx = None
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_MEMORY = 8 * 1024 * 1024
+
+TEXT_EXTENSIONS = {'.txt', '.text', '.md', '.markdown', '.csv', '.tsv', '.log'}
+DOCX_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def iter_chunks(storage, name):
+    """Yield the object's bytes in ``CHUNK_SIZE`` pieces; closing the generator stops the download."""
+    if hasattr(storage, 'get_object'):
+        body = storage.get_object(name)['Body']
+        try:
+            yield from body.iter_chunks(CHUNK_SIZE)
+        finally:
+            body.close()
+    else:
+        with storage.open(name, 'rb') as file:
+            while chunk := file.read(CHUNK_SIZE):
+                yield chunk
+
+
+class TextCollector:
+    """Accumulates text up to the configured limit and remembers whether anything was cut."""
+
+    def __init__(self, limit=None):
+        self.limit = limit or settings.DOCUMENT_TEXT_MAX_CHARS
+        self.parts = []
+        self.length = 0
+        self.truncated = False
+
+    @property
+    def full(self):
+        return self.length >= self.limit
+
+    def add(self, text):
+        # PostgreSQL text columns reject NUL characters.
+        text = text.replace('\x00', '')
+        if self.length + len(text) > self.limit:
+            text = text[:self.limit - self.length]
+            self.truncated = True
+        self.parts.append(text)
+        self.length += len(text)
+
+    def text(self):
+        return ''.join(self.parts)
+
+
+def extract_plain(storage, name, collector):
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    chunks = iter_chunks(storage, name)
+    try:
+        for chunk in chunks:
+            collector.add(decoder.decode(chunk))
+            if collector.full:
+                collector.truncated = True
+                return
+        collector.add(decoder.decode(b'', final=True))
+    finally:
+        chunks.close()
+
+
+def spooled(storage, name):
+    limit = settings.DOCUMENT_TEXT_MAX_SOURCE_BYTES
+    file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY)
+    size = 0
+    chunks = iter_chunks(storage, name)
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            if size > limit:
+                file.close()
+                raise ExtractionError(f'File is larger than {limit} bytes.')
+            file.write(chunk)
+    finally:
+        chunks.close()
+    file.seek(0)
+    return file
+
+
+def extract_pdf(storage, name, collector):
+    with spooled(storage, name) as file:
+        for page in pypdf.PdfReader(file).pages:
+            collector.add((page.extract_text() or '') + '\n')
+            if collector.full:
+                return
+
+
+def extract_docx(storage, name, collector):
+    with spooled(storage, name) as file:
+        for paragraph in docx.Document(file).paragraphs:
+            collector.add(paragraph.text + '\n')
+            if collector.full:
+                return
+
+
+def extractor_for(document):
+    """The extractor function for ``document``'s format, or ``None`` if it can't be read here."""
+    extension = os.path.splitext(document.name or document.file.name)[1].lower()
+    content_type = (document.content_type or mimetypes.guess_type(document.name)[0] or '').split(';')[0]
+    if extension in TEXT_EXTENSIONS or content_type.startswith('text/'):
+        return extract_plain
+    if extension == '.pdf' or content_type == 'application/pdf':
+        return extract_pdf if pypdf is not None else None
+    if extension == '.docx' or content_type == DOCX_TYPE:
+        return extract_docx if docx is not None else None
+    return None
+
+
+def extract_text(document, storage):
+    """Read ``document``'s file and return an unsaved :class:`DocumentText`. Never raises."""
+    result = DocumentText(document=document, source=document.file.name)
+    extractor = extractor_for(document)
+    if extractor is None:
+        result.status = DocumentText.UNSUPPORTED
+        return result
+    collector = TextCollector()
+    try:
+        extractor(storage, document.file.name, collector)
+    except Exception as exc:
+        result.status = DocumentText.FAILED
+        result.error = f'{type(exc).__name__}: {exc}'[:1000]
+        return result
+    result.status = DocumentText.DONE
+    result.content = collector.text()
+    result.truncated = collector.truncated
+    return result
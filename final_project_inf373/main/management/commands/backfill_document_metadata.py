@@ -0,0 +1,93 @@
+import hashlib
+
+from django.db.models import Q
+
+from main.blobs import claim_blob, release_blob
+from main.caching import bump_project
+from main.changes import record_changes
+from main.management.documents import DocumentBatchCommand
+from main.models import ChangeLogEntry, Document, document_filename
+
+UPDATED = 'updated'
+MISSING = 'missing'
+
+
+def pending_documents(checksums=False):
+    """Documents with no metadata yet, plus, with ``checksums``, documents never hashed or deduplicated.
+
+    Presigned and resumable uploads go straight to storage, so they arrive with size and content
+    type but without a checksum.
+    """
+    pending = Q(size__isnull=True)
+    if checksums:
+        pending |= Q(sha256='', blob__isnull=True)
+    return Document.objects.exclude(file='').exclude(file__isnull=True).filter(pending).order_by('pk')
+
+
+class Command(DocumentBatchCommand):
+    help = (
+        "Fill in size, content type and upload time of existing documents from storage HEAD requests; "
+        "with --checksums also hash unhashed documents and share their storage with identical ones."
+    )
+    default_workers = 16
+    default_batch_size = 500
+    workers_help = 'Concurrent storage requests.'
+    outcomes = (UPDATED, MISSING)
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--checksums', action='store_true',
+                            help='Also stream each object to compute its SHA-256 (reads every byte).')
+
+    def summary(self, counts):
+        return self.style.SUCCESS(
+            f"Backfilled {counts[UPDATED]} documents; {counts[MISSING]} files were missing from storage."
+        )
+
+    def batch_saved(self, counts):
+        self.stdout.write(f"Updated {counts[UPDATED]} documents so far...")
+
+    def pending(self, options):
+        return pending_documents(options['checksums'])
+
+    def process(self, document, storage, options):
+        head = storage.head(document.file.name)
+        if head is None:
+            return document, None, None
+        digest = None
+        if options['checksums'] and not document.sha256:
+            digest = hashlib.sha256()
+            for chunk in storage.get_object(document.file.name)['Body'].iter_chunks(1024 * 1024):
+                digest.update(chunk)
+        return document, head, digest
+
+    def save(self, results, options):
+        changed = []
+        missing = 0
+        for document, head, digest in results:
+            if head is None:
+                missing += 1
+                continue
+            key = document.file.name
+            fields = {'size': head['ContentLength'], 'content_type': head.get('ContentType', '')}
+            if document.size is None:
+                fields['uploaded_at'] = head['LastModified']
+            blob = None
+            if digest is not None:
+                sha256 = digest.hexdigest()
+                blob = claim_blob(sha256, key, fields['size'], fields['content_type'])
+                fields.update(sha256=sha256, blob=blob, file=blob.key)
+                if not document.filename:
+                    # The key may now be another document's, so keep this one's name.
+                    fields['filename'] = document_filename(key)
+            # Skip documents deleted or given a new file while they were being read.
+            if Document.objects.filter(pk=document.pk, file=key).update(**fields):
+                changed.append(document)
+            elif blob is not None:
+                release_blob(blob.pk)
+        # update() skips model signals, so invalidate cached payloads and log the changes here.
+        for project_id in {document.project_id for document in changed}:
+            bump_project(project_id)
+            record_changes(project_id, Document,
+                           [d.pk for d in changed if d.project_id == project_id], ChangeLogEntry.UPDATED)
+        return {UPDATED: len(changed), MISSING: missing}
@@ -0,0 +1,68 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from main.benchmarks import ENDPOINTS, SCALES, benchmark_environment, compare, dataset_key, prepare, run_benchmarks
+
+BASELINE_PATH = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and measure p50/p95 latency, query count and allocated memory "
+        "per endpoint, failing on regressions against the stored baseline. "
+        "Use DJANGO_SETTINGS_MODULE=final_project.settings_benchmark to run on SQLite."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small')
+        for name in ('projects', 'members', 'comments', 'documents'):
+            parser.add_argument(f'--{name}', type=int, help=f'Override the number of {name} (per project) for the scale.')
+        parser.add_argument('--endpoint', action='append', choices=ENDPOINTS, help='Only run this endpoint; repeatable.')
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+        parser.add_argument('--update-baseline', action='store_true', help='Store these results as the new baseline.')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Allowed relative growth of p95 latency and memory; query counts may not grow at all.')
+
+    def handle(self, *args, **options):
+        params = {**SCALES[options['scale']]}
+        params.update({name: options[name] for name in params if options[name] is not None})
+        key = dataset_key(params)
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            with benchmark_environment():
+                self.stdout.write(f"Seeding {key} (projects x members x comments x documents)...")
+                target = prepare(params, seed=options['seed'])
+                results = run_benchmarks(target, options['iterations'], options['endpoint'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f"{'endpoint':<22}{'p50 ms':>10}{'p95 ms':>10}{'queries':>10}{'memory KiB':>12}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<22}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['queries']:>10}{result['memory_kib']:>12}"
+            )
+
+        baselines = json.loads(options['baseline'].read_text()) if options['baseline'].exists() else {}
+        if options['update_baseline']:
+            baselines[key] = {**baselines.get(key, {}), **results}
+            options['baseline'].parent.mkdir(parents=True, exist_ok=True)
+            options['baseline'].write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Baseline for {key} written to {options['baseline']}."))
+            return
+        if key not in baselines:
+            self.stdout.write(self.style.WARNING(f"No baseline for {key}; run with --update-baseline to record one."))
+            return
+
+        regressions = compare(results, baselines[key], options['tolerance'])
+        if regressions:
+            raise CommandError("Benchmark regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regressions against the {key} baseline."))
@@ -0,0 +1,39 @@
+from collections import Counter
+
+from django.db.models import F, Q
+
+from main.extraction import extract_text
+from main.management.documents import DocumentBatchCommand
+from main.models import Document, DocumentText
+
+
+def pending_documents(retry_failed=False):
+    """Documents with a file whose text is missing or was extracted from a different file."""
+    stale = Q(text__isnull=True) | ~Q(text__source=F('file'))
+    if retry_failed:
+        stale |= Q(text__status=DocumentText.FAILED)
+    return Document.objects.exclude(file='').exclude(file__isnull=True).filter(stale).order_by('pk')
+
+
+class Command(DocumentBatchCommand):
+    help = "Extract searchable text from uploaded documents with a pool of storage readers."
+    workers_help = 'Documents downloaded and parsed concurrently.'
+    outcomes = (DocumentText.DONE, DocumentText.UNSUPPORTED, DocumentText.FAILED)
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--retry-failed', action='store_true', help='Extract documents that failed before again.')
+
+    def pending(self, options):
+        return pending_documents(options['retry_failed'])
+
+    def process(self, document, storage, options):
+        return extract_text(document, storage)
+
+    def save(self, results, options):
+        # Skip documents deleted or given a new file while they were being read.
+        current = set(Document.objects.filter(pk__in=[r.document_id for r in results]).values_list('pk', 'file'))
+        results = [r for r in results if (r.document_id, r.source) in current]
+        DocumentText.objects.filter(document_id__in=[r.document_id for r in results]).delete()
+        DocumentText.objects.bulk_create(results)
+        return Counter(r.status for r in results)
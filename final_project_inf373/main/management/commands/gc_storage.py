@@ -0,0 +1,101 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.models import Blob, Document, DocumentPreview, StorageDeletion
+from main.utils import batched
+
+BATCH_SIZE = 1000
+
+
+def referenced_keys(keys):
+    """The subset of ``keys`` still pointed at by a Document, Blob or DocumentPreview row."""
+    referenced = set(Document.objects.filter(file__in=keys).values_list('file', flat=True))
+    referenced.update(Blob.objects.filter(key__in=keys).values_list('key', flat=True))
+    referenced.update(DocumentPreview.objects.filter(thumbnail__in=keys).values_list('thumbnail', flat=True))
+    return referenced
+
+
+class Command(BaseCommand):
+    help = "Delete stored documents that no database row points at, using batched multi-object deletes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted without deleting it.')
+        parser.add_argument('--grace', type=float, default=24,
+                            help='Hours an unreferenced object is left alone (presigned uploads awaiting completion).')
+        parser.add_argument('--queue-only', action='store_true', help='Only drain the deletion queue, skip the bucket scan.')
+        parser.add_argument('--loop', type=float, default=0, help='Keep running, sleeping this many seconds between passes.')
+
+    def handle(self, *args, **options):
+        while True:
+            self.collect(options)
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
+
+    def collect(self, options):
+        storage = Document._meta.get_field('file').storage
+        dry_run = options['dry_run']
+        prefix = 'Would delete' if dry_run else 'Deleted'
+
+        started = time.monotonic()
+        queued, skipped, failed = self.drain_queue(storage, dry_run)
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"Queue: {prefix.lower()} {queued} objects, {skipped} still referenced, {failed} failed "
+            f"in {elapsed:.1f}s ({queued / elapsed if elapsed else 0:.0f} objects/s)."
+        )
+        if options['queue_only']:
+            return
+
+        started = time.monotonic()
+        listed, orphans, orphan_bytes, failed = self.sweep(storage, timedelta(hours=options['grace']), dry_run)
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"Scan: listed {listed} objects, {prefix.lower()} {orphans} orphans ({orphan_bytes} bytes), {failed} failed "
+            f"in {elapsed:.1f}s ({listed / elapsed if elapsed else 0:.0f} keys/s)."
+        )
+
+    def drain_queue(self, storage, dry_run):
+        deleted = skipped = failed = 0
+        last_pk = 0
+        while True:
+            batch = list(StorageDeletion.objects.filter(pk__gt=last_pk).order_by('pk')[:BATCH_SIZE])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            keys = [entry.key for entry in batch]
+            # A key may have been referenced again since it was queued.
+            live = referenced_keys(keys)
+            doomed = [key for key in keys if key not in live]
+            skipped += len(live)
+            if dry_run:
+                deleted += len(doomed)
+                continue
+            errors = set(storage.delete_objects(doomed)) if doomed else set()
+            failed += len(errors)
+            deleted += len(doomed) - len(errors)
+            StorageDeletion.objects.filter(pk__in=[entry.pk for entry in batch if entry.key not in errors]).delete()
+        return deleted, skipped, failed
+
+    def sweep(self, storage, grace, dry_run):
+        cutoff = timezone.now() - grace
+        listed = orphans = orphan_bytes = failed = 0
+        for page in batched(storage.list_objects('documents/'), BATCH_SIZE):
+            listed += len(page)
+            candidates = {obj['Key']: obj for obj in page if obj['LastModified'] < cutoff}
+            live = referenced_keys(list(candidates)) if candidates else set()
+            doomed = [key for key in candidates if key not in live]
+            if not doomed:
+                continue
+            errors = set() if dry_run else set(storage.delete_objects(doomed))
+            failed += len(errors)
+            for key in doomed:
+                if key not in errors:
+                    orphans += 1
+                    orphan_bytes += candidates[key]['Size']
+                    if dry_run:
+                        self.stdout.write(f"  {key}")
+        return listed, orphans, orphan_bytes, failed
@@ -0,0 +1,50 @@
+from collections import Counter
+
+from django.db.models import F, Q
+
+from main.blobs import enqueue_deletion
+from main.caching import bump_project
+from main.changes import record_changes
+from main.management.documents import DocumentBatchCommand
+from main.models import ChangeLogEntry, Document, DocumentPreview
+from main.previews import make_preview
+
+
+def pending_documents(retry_failed=False):
+    """Documents with a file whose preview is missing or was made from a different file."""
+    stale = Q(preview__isnull=True) | ~Q(preview__source=F('file'))
+    if retry_failed:
+        stale |= Q(preview__status=DocumentPreview.FAILED)
+    return Document.objects.exclude(file='').exclude(file__isnull=True).filter(stale).order_by('pk')
+
+
+class Command(DocumentBatchCommand):
+    help = "Make thumbnails and text snippets for new documents with a pool of storage readers."
+    default_batch_size = 100
+    outcomes = (DocumentPreview.DONE, DocumentPreview.UNSUPPORTED, DocumentPreview.FAILED)
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--retry-failed', action='store_true', help='Process documents that failed before again.')
+
+    def pending(self, options):
+        return pending_documents(options['retry_failed'])
+
+    def process(self, document, storage, options):
+        return make_preview(document, storage)
+
+    def save(self, previews, options):
+        current = set(Document.objects.filter(pk__in=[p.document_id for p in previews]).values_list('pk', 'file'))
+        dropped = [p for p in previews if (p.document_id, p.source) not in current]
+        previews = [p for p in previews if (p.document_id, p.source) in current]
+        # Deleting old previews queues their thumbnails for gc_storage (see signals).
+        DocumentPreview.objects.filter(document_id__in=[p.document_id for p in previews]).delete()
+        DocumentPreview.objects.bulk_create(previews)
+        enqueue_deletion([p.thumbnail.name for p in dropped if p.thumbnail])
+        # Serialized documents embed their preview, so cached payloads and ETags must move on.
+        for project_id in {p.document.project_id for p in previews}:
+            bump_project(project_id)
+            record_changes(project_id, Document,
+                           [p.document_id for p in previews if p.document.project_id == project_id],
+                           ChangeLogEntry.UPDATED)
+        return Counter(p.status for p in previews)
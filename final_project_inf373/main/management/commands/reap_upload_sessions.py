@@ -0,0 +1,42 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.models import Document, UploadSession
+
+
+class Command(BaseCommand):
+    help = "Abort abandoned resumable uploads so incomplete multipart uploads don't pile up in the bucket."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=float, default=24, help='Hours of inactivity before a session is reaped.')
+        parser.add_argument('--loop', type=float, default=0, help='Keep running, sleeping this many seconds between passes.')
+
+    def handle(self, *args, **options):
+        while True:
+            self.reap(timedelta(hours=options['max_age']))
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
+
+    def reap(self, max_age):
+        storage = Document._meta.get_field('file').storage
+        cutoff = timezone.now() - max_age
+
+        sessions = 0
+        for session in UploadSession.objects.filter(updated_at__lt=cutoff).iterator():
+            storage.abort_multipart_upload(session.key, session.upload_id)
+            session.delete()
+            sessions += 1
+
+        # Uploads whose session row is already gone (e.g. the project was deleted).
+        known = set(UploadSession.objects.values_list('upload_id', flat=True))
+        orphans = 0
+        for upload in storage.list_multipart_uploads('documents/'):
+            if upload['UploadId'] not in known and upload['Initiated'] < cutoff:
+                storage.abort_multipart_upload(upload['Key'], upload['UploadId'])
+                orphans += 1
+
+        self.stdout.write(f"Reaped {sessions} sessions and {orphans} orphaned multipart uploads.")
@@ -0,0 +1,60 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import User
+from main.seeding import BATCH_SIZE, seed_scaled
+
+# Totals at --scale 1; --scale 100 gives 10M comments.
+BASE = {'users': 2000, 'projects': 500, 'comments': 100_000, 'documents': 5000}
+
+
+class Command(BaseCommand):
+    help = "Fill the database with synthetic users, projects, members, comments and documents at a given scale."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1, help='Multiplier for the default totals (%s).' % ', '.join(
+            f'{count} {name}' for name, count in BASE.items()))
+        for name in BASE:
+            parser.add_argument(f'--{name}', type=int, help=f'Exact number of {name}, overriding --scale.')
+        parser.add_argument('--members-per-project', type=int, default=5, help='Average team size.')
+        parser.add_argument('--alpha', type=float, default=1.0, help='Power-law exponent; higher means more skew.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--prefix', default='seed', help='Username prefix, so several datasets can coexist.')
+        parser.add_argument('--files', action='store_true', help='Also upload a small text file per document.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE * 5)
+        parser.add_argument('--no-copy', action='store_true', help='Use bulk_create even on PostgreSQL.')
+
+    def handle(self, *args, **options):
+        totals = {name: options[name] if options[name] is not None else int(count * options['scale'])
+                  for name, count in BASE.items()}
+        if totals['users'] < 1 or totals['projects'] < 1:
+            raise CommandError("Need at least one user and one project.")
+        if User.objects.filter(username__startswith=f"{options['prefix']}-user-").exists():
+            raise CommandError(f"Users with prefix {options['prefix']!r} already exist; pick another --prefix.")
+
+        self.stdout.write("Seeding " + ', '.join(f"{count} {name}" for name, count in totals.items()) + "...")
+        started = time.monotonic()
+        last = [started]
+
+        def progress(label, count):
+            now = time.monotonic()
+            elapsed = now - last[0]
+            last[0] = now
+            self.stdout.write(f"  {label}: {count} rows in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f} rows/s)")
+
+        seed_scaled(
+            **totals,
+            members_per_project=options['members_per_project'],
+            seed=options['seed'],
+            alpha=options['alpha'],
+            files=options['files'],
+            prefix=options['prefix'],
+            batch_size=options['batch_size'],
+            copy=not options['no_copy'],
+            progress=progress,
+        )
+        # Seeding skips model signals, so cached payloads don't know about the new rows.
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.monotonic() - started:.1f}s."))
@@ -0,0 +1,89 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from main.models import OutboxEmail
+
+MAX_BACKOFF = 60 * 60
+
+
+def backoff(attempts):
+    """Seconds to wait before the next try: 30s, 1m, 2m, ... capped at an hour."""
+    return min(30 * 2 ** (attempts - 1), MAX_BACKOFF)
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbox emails in batches over a single mail connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=settings.OUTBOX_MAX_ATTEMPTS,
+                            help='Give up on a message after this many failed deliveries.')
+        parser.add_argument('--loop', type=float, default=0, help='Keep running, sleeping this many seconds between passes.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = self.drain(options['batch_size'], options['max_attempts'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(f"Sent {sent} emails, {failed} failed and will be retried.")
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
+
+    def drain(self, batch_size, max_attempts):
+        sent = failed = 0
+        connection = get_connection()
+        try:
+            while True:
+                with transaction.atomic():
+                    # skip_locked lets several workers share the queue on Postgres.
+                    batch = list(
+                        OutboxEmail.objects.select_for_update(skip_locked=True)
+                        .filter(sent_at__isnull=True, attempts__lt=max_attempts, next_attempt_at__lte=timezone.now())
+                        .order_by('next_attempt_at', 'pk')[:batch_size]
+                    )
+                    if not batch:
+                        break
+                    batch_sent, batch_failed = self.deliver(connection, batch)
+                sent += batch_sent
+                failed += batch_failed
+        finally:
+            connection.close()
+        return sent, failed
+
+    def deliver(self, connection, batch):
+        sent = []
+        failed = []
+        now = timezone.now()
+        try:
+            connection.open()
+        except Exception as e:
+            for email in batch:
+                self.fail(email, e, now)
+            OutboxEmail.objects.bulk_update(batch, ['attempts', 'next_attempt_at', 'last_error'])
+            return 0, len(batch)
+
+        for email in batch:
+            message = EmailMessage(email.subject, email.body, email.from_email, [email.recipient], connection=connection)
+            try:
+                message.send()
+            except Exception as e:
+                self.fail(email, e, now)
+                failed.append(email)
+            else:
+                email.sent_at = now
+                email.attempts += 1
+                sent.append(email)
+        OutboxEmail.objects.bulk_update(sent, ['sent_at', 'attempts'])
+        OutboxEmail.objects.bulk_update(failed, ['attempts', 'next_attempt_at', 'last_error'])
+        return len(sent), len(failed)
+
+    def fail(self, email, error, now):
+        email.attempts += 1
+        email.next_attempt_at = now + timedelta(seconds=backoff(email.attempts))
+        email.last_error = f'{type(error).__name__}: {error}'
@@ -0,0 +1,71 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.models import Document
+
+
+class DocumentBatchCommand(BaseCommand):
+    """Base for commands that work through pending documents with a pool of storage readers.
+
+    Subclasses provide ``pending``, ``process`` and ``save``. Batches are read by primary key, the
+    pool runs ``process`` on every document of a batch, and ``save`` writes the results in one
+    transaction and returns what to add to the pass's counts.
+    """
+    default_workers = 8
+    default_batch_size = 200
+    workers_help = 'Documents processed concurrently.'
+    outcomes = ()
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=self.default_workers, help=self.workers_help)
+        parser.add_argument('--batch-size', type=int, default=self.default_batch_size)
+        parser.add_argument('--loop', type=float, default=0, help='Keep running, sleeping this many seconds between passes.')
+
+    def handle(self, *args, **options):
+        while True:
+            counts = self.run_pass(options)
+            if any(counts.values()) or not options['loop']:
+                self.stdout.write(self.summary(counts))
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
+
+    def run_pass(self, options):
+        storage = Document._meta.get_field('file').storage
+        counts = dict.fromkeys(self.outcomes, 0)
+        pending = self.pending(options)
+        last_pk = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(pending.filter(pk__gt=last_pk)[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                # Workers only talk to storage; all database writes happen here.
+                results = list(pool.map(lambda document: self.process(document, storage, options), batch))
+                with transaction.atomic():
+                    for outcome, count in self.save(results, options).items():
+                        counts[outcome] += count
+                self.batch_saved(counts)
+        return counts
+
+    def batch_saved(self, counts):
+        """Called with the running counts after each batch, for progress output."""
+
+    def summary(self, counts):
+        return ', '.join(f"{outcome} {count}" for outcome, count in counts.items()) + '.'
+
+    def pending(self, options):
+        """Documents still to process, ordered by primary key."""
+        raise NotImplementedError
+
+    def process(self, document, storage, options):
+        """Read one document from storage; runs in a worker thread, so no database access."""
+        raise NotImplementedError
+
+    def save(self, results, options):
+        """Write a batch of ``process`` results and return ``{outcome: count}``."""
+        raise NotImplementedError
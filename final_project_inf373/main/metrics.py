@@ -0,0 +1,234 @@
+"""Request, database, cache and storage metrics in Prometheus text format.
+
+Observations are added to a per-process registry under a lock; nothing leaves the process on
+the request path. Every ``METRICS_FLUSH_INTERVAL`` seconds the accumulated deltas are added to a
+Redis hash with one pipelined round trip, so ``/metrics`` on any worker reports the totals of
+all of them. Histograms are stored as their cumulative ``_bucket``/``_sum``/``_count`` counters.
+"""
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+REDIS_KEY = 'metrics'
+
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by view, method and status.'),
+    'db_queries_total': ('counter', 'SQL queries executed, by view.'),
+    'db_query_duration_seconds_total': ('counter', 'Time spent executing SQL, by view.'),
+    'cache_requests_total': ('counter', 'Cache reads by result.'),
+    'storage_request_duration_seconds': ('histogram', 'Object storage API calls by operation.'),
+}
+
+_le_re = re.compile(r'le="([^"]+)"')
+
+
+def series(name, labels):
+    if not labels:
+        return name
+    pairs = ','.join('%s="%s"' % (key, str(value).replace('\\', r'\\').replace('"', r'\"')) for key, value in labels.items())
+    return f'{name}{{{pairs}}}'
+
+
+class Registry:
+    """Counter deltas accumulated since the last flush."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(float)
+        self.last_flush = time.monotonic()
+
+    def inc(self, name, amount=1, **labels):
+        key = series(name, labels)
+        with self._lock:
+            self._pending[key] += amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        keys = [series(f'{name}_bucket', {**labels, 'le': le}) for le in buckets if value <= le]
+        keys.append(series(f'{name}_bucket', {**labels, 'le': '+Inf'}))
+        with self._lock:
+            for key in keys:
+                self._pending[key] += 1
+            self._pending[series(f'{name}_count', labels)] += 1
+            self._pending[series(f'{name}_sum', labels)] += value
+
+    def drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(float)
+            self.last_flush = time.monotonic()
+        return pending
+
+    def restore(self, pending):
+        with self._lock:
+            for key, amount in pending.items():
+                self._pending[key] += amount
+
+
+class MemorySink:
+    """Totals for this process only; used by tests and single-process setups."""
+
+    def __init__(self):
+        self._totals = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def add(self, deltas):
+        with self._lock:
+            for key, amount in deltas.items():
+                self._totals[key] += amount
+
+    def read(self):
+        with self._lock:
+            return dict(self._totals)
+
+
+class RedisSink:
+    """Totals of every process, kept in one Redis hash."""
+
+    def __init__(self, url):
+        self.url = url
+        self._client = None
+
+    @property
+    def client(self):
+        import redis
+
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url, socket_connect_timeout=2, socket_timeout=2)
+        return self._client
+
+    def add(self, deltas):
+        pipeline = self.client.pipeline(transaction=False)
+        for key, amount in deltas.items():
+            pipeline.hincrbyfloat(REDIS_KEY, key, amount)
+        pipeline.execute()
+
+    def read(self):
+        return {key.decode(): float(value) for key, value in self.client.hgetall(REDIS_KEY).items()}
+
+
+registry = Registry()
+_sink = None
+
+
+def get_sink():
+    global _sink
+    if _sink is None:
+        if settings.METRICS_BACKEND == 'memory':
+            _sink = MemorySink()
+        else:
+            _sink = RedisSink(settings.METRICS_REDIS_URL)
+    return _sink
+
+
+def flush():
+    pending = registry.drain()
+    if not pending:
+        return
+    try:
+        get_sink().add(pending)
+    except Exception:
+        # Keep the deltas for the next attempt rather than losing them.
+        registry.restore(pending)
+        logger.warning("Could not flush metrics", exc_info=True)
+
+
+def maybe_flush():
+    if time.monotonic() - registry.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def _sort_key(key):
+    match = _le_re.search(key)
+    le = match.group(1) if match else None
+    base = _le_re.sub('', key) if match else key
+    return base, float('inf') if le == '+Inf' else float(le or 0)
+
+
+def _format(value):
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render():
+    """Flush this process and return every worker's totals in Prometheus text format."""
+    flush()
+    values = get_sink().read()
+    families = defaultdict(list)
+    for key, value in values.items():
+        name = key.split('{', 1)[0]
+        for suffix in ('_bucket', '_count', '_sum'):
+            if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+                name = name[:-len(suffix)]
+        families[name].append((key, value))
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        if name not in families:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for key, value in sorted(families[name], key=lambda item: _sort_key(item[0])):
+            lines.append(f'{key} {_format(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def record_cache(hits, misses):
+    if hits:
+        registry.inc('cache_requests_total', hits, result='hit')
+    if misses:
+        registry.inc('cache_requests_total', misses, result='miss')
+
+
+def instrument_boto_session(session):
+    """Time every API call made by clients created from ``session``."""
+    def before_call(context, **kwargs):
+        context['metrics_started'] = time.perf_counter()
+
+    def after_call(model, context, **kwargs):
+        started = context.pop('metrics_started', None)
+        if started is not None:
+            registry.observe('storage_request_duration_seconds', time.perf_counter() - started, operation=model.name)
+
+    session.events.register('before-call.s3', before_call)
+    session.events.register('after-call.s3', after_call)
+    session.events.register('after-call-error.s3', after_call)
+    return session
+
+
+class MetricsMiddleware:
+    """Records latency, status and SQL work for every request; meant to sit first in MIDDLEWARE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = {'queries': 0, 'seconds': 0.0}
+
+        def count_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                stats['queries'] += 1
+                stats['seconds'] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        registry.observe('http_request_duration_seconds', elapsed,
+                         view=view, method=request.method, status=response.status_code)
+        if stats['queries']:
+            registry.inc('db_queries_total', stats['queries'], view=view)
+            registry.inc('db_query_duration_seconds_total', stats['seconds'], view=view)
+        maybe_flush()
+        return response
@@ -0,0 +1,66 @@
+from django.db import migrations
+
+# Full-text indexes live outside the models because each database needs its own kind.
+
+POSTGRES_FORWARD = [
+    "ALTER TABLE main_comment ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(text, ''))) STORED",
+    "CREATE INDEX comment_search_idx ON main_comment USING GIN (search_vector)",
+    "ALTER TABLE main_document ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(name, ''))) STORED",
+    "CREATE INDEX document_search_idx ON main_document USING GIN (search_vector)",
+]
+
+POSTGRES_BACKWARD = [
+    "ALTER TABLE main_comment DROP COLUMN search_vector",
+    "ALTER TABLE main_document DROP COLUMN search_vector",
+]
+
+
+def sqlite_fts(table, column):
+    """External-content FTS5 table kept in sync with ``table`` by triggers.
+
+    SQLite migrations that rebuild ``table`` drop its triggers; such a migration has to recreate them.
+    """
+    fts = f'{table}_fts'
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({column}, content='{table}', content_rowid='id')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+SQLITE_FORWARD = sqlite_fts('main_comment', 'text') + sqlite_fts('main_document', 'name')
+
+SQLITE_BACKWARD = [
+    f"DROP TRIGGER {fts}_{suffix}" for fts in ('main_comment_fts', 'main_document_fts') for suffix in ('ai', 'ad', 'au')
+] + [
+    f"DROP TABLE {fts}" for fts in ('main_comment_fts', 'main_document_fts')
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_change_log'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2 on 2026-10-18 10:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Same scheme as 0014_search_index, keyed by document_id instead of id.
+
+POSTGRES_FORWARD = [
+    "ALTER TABLE main_documenttext ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED",
+    "CREATE INDEX documenttext_search_idx ON main_documenttext USING GIN (search_vector)",
+]
+
+POSTGRES_BACKWARD = [
+    "ALTER TABLE main_documenttext DROP COLUMN search_vector",
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE main_documenttext_fts USING fts5(content, content='main_documenttext', content_rowid='document_id')",
+    "CREATE TRIGGER main_documenttext_fts_ai AFTER INSERT ON main_documenttext BEGIN "
+    "INSERT INTO main_documenttext_fts(rowid, content) VALUES (new.document_id, new.content); END",
+    "CREATE TRIGGER main_documenttext_fts_ad AFTER DELETE ON main_documenttext BEGIN "
+    "INSERT INTO main_documenttext_fts(main_documenttext_fts, rowid, content) VALUES ('delete', old.document_id, old.content); END",
+    "CREATE TRIGGER main_documenttext_fts_au AFTER UPDATE OF content ON main_documenttext BEGIN "
+    "INSERT INTO main_documenttext_fts(main_documenttext_fts, rowid, content) VALUES ('delete', old.document_id, old.content); "
+    "INSERT INTO main_documenttext_fts(rowid, content) VALUES (new.document_id, new.content); END",
+]
+
+SQLITE_BACKWARD = [
+    f"DROP TRIGGER main_documenttext_fts_{suffix}" for suffix in ('ai', 'ad', 'au')
+] + [
+    "DROP TABLE main_documenttext_fts",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentText',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text', serialize=False, to='main.document')),
+                ('source', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('done', 'Done'), ('unsupported', 'Unsupported'), ('failed', 'Failed')], max_length=16)),
+                ('content', models.TextField(blank=True)),
+                ('truncated', models.BooleanField(default=False)),
+                ('error', models.TextField(blank=True)),
+                ('extracted_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 10:49
+
+import django.db.models.deletion
+import final_project.storages
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_document_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentPreview',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='preview', serialize=False, to='main.document')),
+                ('source', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('done', 'Done'), ('unsupported', 'Unsupported'), ('failed', 'Failed')], max_length=16)),
+                ('thumbnail', models.FileField(blank=True, storage=final_project.storages.MinIOStorage(), upload_to='previews/')),
+                ('snippet', models.TextField(blank=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2 on 2026-10-18 11:56
+
+import final_project.storages
+from django.db import migrations, models
+
+# Widening these columns makes SQLite rebuild main_document and main_documenttext, which drops the
+# full-text triggers from 0014_search_index and 0015_document_text; they are recreated here.
+TRIGGERS = [
+    ('main_document', 'main_document_fts', 'id', 'name'),
+    ('main_documenttext', 'main_documenttext_fts', 'document_id', 'content'),
+]
+
+
+def restore_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, fts, rowid, column in TRIGGERS:
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+        schema_editor.execute(
+            f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {column}) VALUES (new.{rowid}, new.{column}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.{rowid}, old.{column}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.{rowid}, old.{column}); "
+            f"INSERT INTO {fts}(rowid, {column}) VALUES (new.{rowid}, new.{column}); END"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_document_preview'),
+    ]
+
+    operations = [
+        # Unapplying rebuilds the tables again, so the triggers are restored at both ends.
+        migrations.RunPython(migrations.RunPython.noop, restore_triggers),
+        migrations.AlterField(
+            model_name='document',
+            name='file',
+            field=models.FileField(blank=True, max_length=1024, null=True, storage=final_project.storages.MinIOStorage(), upload_to='documents/'),
+        ),
+        migrations.AlterField(
+            model_name='documentpreview',
+            name='source',
+            field=models.CharField(max_length=1024),
+        ),
+        migrations.AlterField(
+            model_name='documenttext',
+            name='source',
+            field=models.CharField(max_length=1024),
+        ),
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
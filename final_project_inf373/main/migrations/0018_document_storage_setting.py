@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 12:06
+
+import final_project.storages
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_document_key_length'),
+    ]
+
+    operations = [
+        # Only the storage changes, which is not stored in the database. Running the AlterFields
+        # against it would make SQLite rebuild main_document and drop its full-text triggers.
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='document',
+                name='file',
+                field=models.FileField(blank=True, max_length=1024, null=True, storage=final_project.storages.get_document_storage, upload_to='documents/'),
+            ),
+            migrations.AlterField(
+                model_name='documentpreview',
+                name='thumbnail',
+                field=models.FileField(blank=True, storage=final_project.storages.get_document_storage, upload_to='previews/'),
+            ),
+        ]),
+    ]
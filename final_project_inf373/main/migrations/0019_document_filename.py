@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-18 12:10
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+from main.models import document_filename
+from main.utils import batched
+
+# Adding the column rebuilds main_document on SQLite, which drops its full-text triggers.
+restore_triggers = import_module('main.migrations.0017_document_key_length').restore_triggers
+
+
+def fill_filenames(apps, schema_editor):
+    # A document without a blob still has the key it was uploaded under. Deduplicated ones may not,
+    # so they are left blank and download under their display name.
+    Document = apps.get_model('main', 'Document')
+    documents = Document.objects.filter(blob__isnull=True).exclude(file='').exclude(file__isnull=True).only('file')
+    for batch in batched(documents.iterator(chunk_size=1000), 1000):
+        for document in batch:
+            document.filename = document_filename(document.file.name)
+        Document.objects.bulk_update(batch, ['filename'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_document_storage_setting'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_triggers),
+        migrations.AddField(
+            model_name='document',
+            name='filename',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+        migrations.RunPython(fill_filenames, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,36 @@
+import os
+import uuid
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from final_project.storages import MinIOStorage
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+from final_project.storages import get_document_storage
+
+
+# Longest storage key any model stores; document_key never produces more.
+KEY_MAX_LENGTH = 1024
+
+
+FILENAME_MAX_LENGTH = 255
+
+
+def _shorten(name, length):
+    if len(name) <= length:
+        return name
+    stem, ext = os.path.splitext(name)
+    return stem[:length - len(ext)] + ext
+
+
+def document_filename(filename):
+    """Name a document is downloaded under: the uploaded file's base name, made safe and short enough."""
+    return _shorten(get_valid_filename(os.path.basename(filename)), FILENAME_MAX_LENGTH)
+
+
+def document_key(filename):
+    """Storage key for a new document upload; the random prefix keeps same-named files apart."""
+    prefix = f"documents/{uuid.uuid4().hex}/"
+    return prefix + _shorten(get_valid_filename(os.path.basename(filename)), KEY_MAX_LENGTH - len(prefix))
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
@@ -14,14 +44,118 @@ class Project(models.Model):
     def __str__(self):
         return self.project_name
 
+class Blob(models.Model):
+    """Stored file content shared by every Document with the same SHA-256."""
+    sha256 = models.CharField(max_length=64, unique=True)
+    key = models.CharField(max_length=KEY_MAX_LENGTH, unique=True)
+    size = models.BigIntegerField()
+    content_type = models.CharField(max_length=255, blank=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
 class Document(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='documents')
-    file = models.FileField(storage=MinIOStorage(), upload_to='documents/', blank=True, null=True)
+    file = models.FileField(storage=get_document_storage, upload_to='documents/', max_length=KEY_MAX_LENGTH, blank=True, null=True)
     name = models.CharField(max_length=255)
+    # Deduplicated documents share one storage key, so the key's own name may be another upload's.
+    filename = models.CharField(max_length=FILENAME_MAX_LENGTH, blank=True)
+    size = models.BigIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=255, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)
+    uploaded_at = models.DateTimeField(default=timezone.now)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, related_name='documents')
 
     def __str__(self):
         return self.name
 
+class DocumentText(models.Model):
+    """Text extracted from a document's file by ``extract_document_text``; indexed for search.
+
+    ``source`` is the storage key the text came from, so a document whose file is replaced is
+    picked up again by the next pass.
+    """
+    DONE = 'done'
+    UNSUPPORTED = 'unsupported'
+    FAILED = 'failed'
+    STATUSES = [(DONE, 'Done'), (UNSUPPORTED, 'Unsupported'), (FAILED, 'Failed')]
+
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, primary_key=True, related_name='text')
+    source = models.CharField(max_length=KEY_MAX_LENGTH)
+    status = models.CharField(max_length=16, choices=STATUSES)
+    content = models.TextField(blank=True)
+    truncated = models.BooleanField(default=False)
+    error = models.TextField(blank=True)
+    extracted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.document_id} ({self.status})"
+
+class DocumentPreview(models.Model):
+    """Lightweight derivatives of a document, made by ``generate_previews``.
+
+    Thumbnails live under ``previews/`` in the documents bucket; ``source`` works as on
+    :class:`DocumentText`.
+    """
+    DONE = 'done'
+    UNSUPPORTED = 'unsupported'
+    FAILED = 'failed'
+    STATUSES = [(DONE, 'Done'), (UNSUPPORTED, 'Unsupported'), (FAILED, 'Failed')]
+
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, primary_key=True, related_name='preview')
+    source = models.CharField(max_length=KEY_MAX_LENGTH)
+    status = models.CharField(max_length=16, choices=STATUSES)
+    thumbnail = models.FileField(storage=get_document_storage, upload_to='previews/', blank=True)
+    snippet = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.document_id} ({self.status})"
+
+class UploadSession(models.Model):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='upload_sessions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    name = models.CharField(max_length=255)
+    key = models.CharField(max_length=KEY_MAX_LENGTH)
+    upload_id = models.CharField(max_length=1024)
+    content_type = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.key})"
+
+class StorageDeletion(models.Model):
+    """A storage key waiting to be removed in a batch by ``gc_storage``."""
+    key = models.CharField(max_length=KEY_MAX_LENGTH, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+class OutboxEmail(models.Model):
+    """An email committed together with the change that caused it and sent later by ``send_outbox``."""
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipient = models.EmailField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at'], condition=models.Q(sent_at__isnull=True), name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient}"
+
 class Member(models.Model):
     member = models.ForeignKey(User, on_delete=models.CASCADE, related_name='memberships')
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='members')
@@ -39,10 +173,41 @@ class Comment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     project = models.ForeignKey(Project, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'created_at'], name='comment_project_created_idx'),
+            models.Index(fields=['user', 'created_at'], name='comment_user_created_idx'),
+        ]
+
     @property
     def username(self):
         return self.user.username
 
     @property
     def project_name(self):
-        return self.project.project_name
\ No newline at end of file
+        return self.project.project_name
+
+class ChangeLogEntry(models.Model):
+    """One row per Comment/Document/Member write; the primary key is the project's sync cursor."""
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTIONS = [(CREATED, 'Created'), (UPDATED, 'Updated'), (DELETED, 'Deleted')]
+
+    id = models.BigAutoField(primary_key=True)
+    # A plain column rather than a foreign key: entries are written while a project's children are
+    # cascade-deleted, and are cleared together with the project.
+    project_id = models.BigIntegerField()
+    kind = models.CharField(max_length=16)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=8, choices=ACTIONS)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project_id', 'id'], name='changelog_project_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.kind} {self.object_id} {self.action}"
+
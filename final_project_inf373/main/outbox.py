@@ -0,0 +1,19 @@
+from django.conf import settings
+
+from .models import OutboxEmail
+
+
+def queue_email(subject, body, recipients, from_email=None):
+    """Write one outbox row per recipient; they are sent only if the surrounding transaction commits."""
+    return OutboxEmail.objects.bulk_create([
+        OutboxEmail(subject=subject, body=body, from_email=from_email or settings.DEFAULT_FROM_EMAIL, recipient=recipient)
+        for recipient in recipients
+    ])
+
+
+def queue_project_invite(project, emails):
+    return queue_email(
+        'Project Invitation',
+        f'You have been invited to join the project {project.project_name}. Click the link to join.',
+        emails,
+    )
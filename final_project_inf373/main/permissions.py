@@ -0,0 +1,65 @@
+from django.http import Http404
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import BasePermission
+
+from .caching import get_project_roles
+from .models import Project
+
+OWNER = 'owner'
+MEMBER = 'member'
+
+
+def project_roles(request):
+    """The user's ``{project_id: role}`` map, loaded at most once per request."""
+    roles = getattr(request, '_project_roles', None)
+    if roles is None:
+        roles = get_project_roles(request.user)
+        request._project_roles = roles
+    return roles
+
+
+def project_role(request, project_id):
+    try:
+        return project_roles(request).get(int(project_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def require_project_role(request, project_id, message, owner=False):
+    """Return the user's role in the project or raise 403 (404 if the project does not exist)."""
+    role = project_role(request, project_id)
+    if role == OWNER or (role == MEMBER and not owner):
+        return role
+    # Only the failure path touches the database, to tell a missing project from a forbidden one.
+    try:
+        exists = Project.objects.filter(pk=int(project_id)).exists()
+    except (TypeError, ValueError):
+        exists = False
+    if not exists:
+        raise Http404('No Project matches the given query.')
+    raise PermissionDenied(message)
+
+
+def get_project_id(obj):
+    return obj.pk if isinstance(obj, Project) else obj.project_id
+
+
+class IsProjectMember(BasePermission):
+    """Owner or member of the project named in the URL (``project_pk``) or owning the object."""
+    owner_only = False
+    message = 'You do not have permission to access this project.'
+
+    def has_permission(self, request, view):
+        project_pk = view.kwargs.get('project_pk')
+        if project_pk is not None:
+            require_project_role(request, project_pk, self.message, owner=self.owner_only)
+        return True
+
+    def has_object_permission(self, request, view, obj):
+        require_project_role(request, get_project_id(obj), self.message, owner=self.owner_only)
+        return True
+
+
+class IsProjectOwner(IsProjectMember):
+    owner_only = True
+    message = 'Only the project owner can do this.'
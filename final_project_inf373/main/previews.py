@@ -0,0 +1,67 @@
+"""Thumbnails and text snippets shown in document lists instead of the original files.
+
+Snippets reuse the text extractors with a small character limit, so plain text only costs the
+first chunk of the object. Thumbnails need Pillow; without it images get a snippet-less
+``unsupported`` preview.
+"""
+import hashlib
+import io
+import mimetypes
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .extraction import TextCollector, extractor_for, spooled
+from .models import DocumentPreview
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+THUMBNAIL_FORMAT = 'JPEG'
+
+
+def is_image(document):
+    content_type = document.content_type or mimetypes.guess_type(document.name)[0] or ''
+    return content_type.startswith('image/') and content_type != 'image/svg+xml'
+
+
+def thumbnail_key(document):
+    digest = hashlib.sha256(document.file.name.encode()).hexdigest()[:16]
+    return f'previews/{document.pk}/{digest}.jpg'
+
+
+def make_thumbnail(storage, document):
+    """Store a JPEG no larger than ``DOCUMENT_PREVIEW_SIZE`` on each side and return its key."""
+    size = settings.DOCUMENT_PREVIEW_SIZE
+    with spooled(storage, document.file.name) as file, Image.open(file) as image:
+        # Lets the JPEG decoder skip detail it would throw away anyway.
+        image.draft('RGB', (size, size))
+        image.thumbnail((size, size))
+        output = io.BytesIO()
+        image.convert('RGB').save(output, THUMBNAIL_FORMAT, quality=80)
+    thumbnails = DocumentPreview._meta.get_field('thumbnail').storage
+    return thumbnails.save(thumbnail_key(document), ContentFile(output.getvalue()))
+
+
+def make_preview(document, storage):
+    """Build an unsaved :class:`DocumentPreview`, uploading its thumbnail. Never raises."""
+    preview = DocumentPreview(document=document, source=document.file.name)
+    extractor = extractor_for(document)
+    try:
+        if is_image(document) and Image is not None:
+            preview.thumbnail = make_thumbnail(storage, document)
+        elif extractor is not None:
+            collector = TextCollector(limit=settings.DOCUMENT_PREVIEW_SNIPPET_CHARS)
+            extractor(storage, document.file.name, collector)
+            preview.snippet = collector.text().strip()
+        else:
+            preview.status = DocumentPreview.UNSUPPORTED
+            return preview
+    except Exception as exc:
+        preview.status = DocumentPreview.FAILED
+        preview.error = f'{type(exc).__name__}: {exc}'[:1000]
+        return preview
+    preview.status = DocumentPreview.DONE
+    return preview
@@ -0,0 +1,11 @@
+import random
+
+from django.conf import settings
+
+
+def should_profile(request):
+    """Silk's SILKY_INTERCEPT_FUNC: a random sample of requests, or any carrying the trigger token."""
+    token = settings.SILK_TRIGGER_TOKEN
+    if token and request.headers.get('X-Silk-Profile') == token:
+        return True
+    return random.random() < settings.SILK_SAMPLE_RATE
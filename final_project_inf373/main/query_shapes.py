@@ -0,0 +1,132 @@
+"""Repeated-query (N+1) detection for development and CI.
+
+SQL is grouped by shape, meaning the statement with literals and ``IN`` lists collapsed. Each
+shape remembers the innermost frame of project code that ran it. A shape executed more than
+``QUERY_SHAPE_THRESHOLD`` times in one request is almost always a per-row lookup in a loop or
+serializer.
+
+``QueryShapeMiddleware`` applies the check to every request (``QUERY_SHAPE_MODE``: ``off``,
+``log`` or ``raise``); tests use :func:`assert_no_repeated_queries`.
+"""
+import logging
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_in_list_re = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)', re.IGNORECASE)
+_string_re = re.compile(r"'(?:[^']|'')*'")
+_number_re = re.compile(r'\b\d+(?:\.\d+)?\b')
+_space_re = re.compile(r'\s+')
+_transaction_re = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT|BEGIN|COMMIT)\b', re.IGNORECASE)
+
+_db_utils = os.path.join('django', 'db', 'backends', 'utils.py')
+
+
+class RepeatedQueriesError(Exception):
+    pass
+
+
+def normalize(sql):
+    sql = _in_list_re.sub('IN (...)', sql)
+    sql = _string_re.sub('?', sql)
+    sql = _number_re.sub('?', sql)
+    return _space_re.sub(' ', sql).strip()
+
+
+def origin():
+    """``path:line in function`` of the innermost project frame outside Django and libraries."""
+    base = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    # Skip other execute wrappers (metrics, tests) that sit between Django's cursor and the caller.
+    while frame is not None and not frame.f_code.co_filename.endswith(_db_utils):
+        frame = frame.f_back
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base) and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, base)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+@dataclass
+class Repeat:
+    shape: str
+    count: int
+    origins: list
+
+    def __str__(self):
+        where = ', '.join(f'{place} ({count}x)' for place, count in self.origins)
+        return f'{self.count}x {self.shape[:300]}\n    from {where}'
+
+
+class QueryShapeRecorder:
+    """Context manager recording the shape and origin of every query on every connection."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.origins = defaultdict(Counter)
+        self._stack = ExitStack()
+
+    def __enter__(self):
+        for alias in connections:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc):
+        return self._stack.__exit__(*exc)
+
+    def __call__(self, execute, sql, params, many, context):
+        if not _transaction_re.match(sql):
+            shape = normalize(sql)
+            self.counts[shape] += 1
+            self.origins[shape][origin()] += 1
+        return execute(sql, params, many, context)
+
+    def repeats(self, threshold=None):
+        threshold = settings.QUERY_SHAPE_THRESHOLD if threshold is None else threshold
+        return [
+            Repeat(shape, count, self.origins[shape].most_common(3))
+            for shape, count in self.counts.most_common() if count > threshold
+        ]
+
+
+def format_report(label, repeats):
+    return f'{label}: {len(repeats)} repeated query shape(s)\n  ' + '\n  '.join(str(repeat) for repeat in repeats)
+
+
+@contextmanager
+def assert_no_repeated_queries(threshold=None, label='block'):
+    """Fail with the offending shapes and their origins if any shape runs more than ``threshold`` times."""
+    with QueryShapeRecorder() as recorder:
+        yield recorder
+    repeats = recorder.repeats(threshold)
+    if repeats:
+        raise AssertionError(format_report(label, repeats))
+
+
+class QueryShapeMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = settings.QUERY_SHAPE_MODE
+        if mode == 'off':
+            return self.get_response(request)
+        with QueryShapeRecorder() as recorder:
+            response = self.get_response(request)
+        repeats = recorder.repeats()
+        if repeats:
+            report = format_report(f'{request.method} {request.path}', repeats)
+            if mode == 'raise':
+                raise RepeatedQueriesError(report)
+            logger.warning(report)
+            response['X-Repeated-Queries'] = str(len(repeats))
+        return response
@@ -0,0 +1,209 @@
+"""Per-project push events over WebSocket.
+
+Django code publishes with :func:`publish_event` once the surrounding transaction commits. Every
+ASGI worker process holds one Redis pattern subscription and fans events out to its own sockets,
+so an event reaches every connected client whichever process served the write.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from .authentication import CachedJWTAuthentication
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'project-events:'
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_FOUND = 4404
+
+
+class InMemoryBroker:
+    """Delivers events to sockets in this process only; used by tests and single-process setups."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, project_id, event):
+        self._deliver(project_id, event)
+
+    def _deliver(self, project_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(project_id, ()))
+        for loop, queue in subscribers:
+            # publish() runs in Django's sync threads, the queues belong to the ASGI event loop.
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    async def subscribe(self, project_id):
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers[project_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    async def unsubscribe(self, project_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(project_id, set())
+            subscribers.discard((asyncio.get_running_loop(), queue))
+            if not subscribers:
+                self._subscribers.pop(project_id, None)
+
+
+class RedisBroker(InMemoryBroker):
+    """Publishes to Redis; each process listens on ``project-events:*`` and delivers locally."""
+
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self._client = None
+        self._listener = None
+
+    def publish(self, project_id, event):
+        import redis
+
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url, socket_connect_timeout=2, socket_timeout=2)
+        self._client.publish(f'{CHANNEL_PREFIX}{project_id}', json.dumps(event))
+
+    async def subscribe(self, project_id):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return await super().subscribe(project_id)
+
+    async def _listen(self):
+        import redis.asyncio
+
+        while True:
+            client = redis.asyncio.Redis.from_url(self.url)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+                    async for message in pubsub.listen():
+                        if message['type'] != 'pmessage':
+                            continue
+                        project_id = int(message['channel'].decode().removeprefix(CHANNEL_PREFIX))
+                        self._deliver(project_id, json.loads(message['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Realtime subscription to Redis failed, reconnecting")
+                await asyncio.sleep(1)
+            finally:
+                await client.aclose()
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        if settings.REALTIME_BROKER == 'memory':
+            _broker = InMemoryBroker()
+        else:
+            _broker = RedisBroker(settings.REALTIME_REDIS_URL)
+    return _broker
+
+
+@receiver(setting_changed)
+def reset_broker(*, setting, **kwargs):
+    global _broker
+    if setting in ('REALTIME_BROKER', 'REALTIME_REDIS_URL'):
+        _broker = None
+
+
+def publish_event(project_id, event):
+    """Push ``event`` to the project's sockets after commit. Best effort: the change feed is the record."""
+    def send():
+        try:
+            get_broker().publish(project_id, event)
+        except Exception:
+            logger.exception("Could not publish realtime event for project %s", project_id)
+
+    transaction.on_commit(send)
+
+
+@sync_to_async
+def authenticate(token, project_id):
+    """Return ``(user, expires_at, close_code)``; the same SimpleJWT validation as the REST API."""
+    auth = CachedJWTAuthentication()
+    try:
+        validated = auth.get_validated_token(token)
+        user = auth.get_user(validated)
+    except (InvalidToken, AuthenticationFailed):
+        return None, None, CLOSE_UNAUTHORIZED
+    if not can_access(user, project_id):
+        return None, None, CLOSE_FORBIDDEN
+    return user, validated['exp'], None
+
+
+def can_access(user, project_id):
+    from .caching import get_project_roles
+
+    return project_id in get_project_roles(user)
+
+
+def parse_path(path):
+    parts = path.strip('/').split('/')
+    if len(parts) == 3 and parts[:2] == ['ws', 'projects'] and parts[2].isdigit():
+        return int(parts[2])
+    return None
+
+
+async def project_events_app(scope, receive, send):
+    """Raw ASGI WebSocket endpoint: ``/ws/projects/<id>/?token=<access token>``."""
+    project_id = parse_path(scope['path'])
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token', [''])[0]
+
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if project_id is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    user, expires_at, close_code = await authenticate(token, project_id)
+    if user is None:
+        await send({'type': 'websocket.close', 'code': close_code})
+        return
+
+    broker = get_broker()
+    queue = await broker.subscribe(project_id)
+    await send({'type': 'websocket.accept'})
+    receiving = asyncio.ensure_future(receive())
+    try:
+        while True:
+            remaining = expires_at - time.time()
+            if remaining <= 0:
+                # Clients reconnect with a refreshed token.
+                await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+                return
+            event = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({receiving, event}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if event in done:
+                # Membership may have been revoked or the project deleted since the socket opened;
+                # the role map is cached per user version, so this is a cache read per event.
+                if not await sync_to_async(can_access)(user, project_id):
+                    await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+                    return
+                await send({'type': 'websocket.send', 'text': json.dumps(event.result())})
+            else:
+                event.cancel()
+            if receiving in done:
+                if receiving.result()['type'] == 'websocket.disconnect':
+                    return
+                # Clients have nothing to say on this channel; ignore pings and other frames.
+                receiving = asyncio.ensure_future(receive())
+    finally:
+        receiving.cancel()
+        await broker.unsubscribe(project_id, queue)
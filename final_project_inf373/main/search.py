@@ -0,0 +1,92 @@
+import re
+
+from django.db import connection
+
+from .models import Comment, Document, DocumentText
+
+MAX_RESULTS = 50
+
+_word_re = re.compile(r'\w+', re.UNICODE)
+
+
+def _join(key, scope):
+    """Join ``scope`` (the table carrying ``project_id``) when the indexed table has no such column."""
+    return f"JOIN {scope} s ON s.id = t.{key}" if scope else ''
+
+
+def _project_column(scope):
+    return 's.project_id' if scope else 't.project_id'
+
+
+class PostgresSearch:
+    """Generated ``tsvector`` columns with GIN indexes, ranked with ``ts_rank``."""
+
+    def ids(self, table, query, project_ids, limit, key='id', scope=None):
+        sql = (
+            f"SELECT t.{key}, ts_rank(t.search_vector, q) AS rank "
+            f"FROM {table} t {_join(key, scope)}, websearch_to_tsquery('simple', %s) q "
+            f"WHERE t.search_vector @@ q AND {_project_column(scope)} = ANY(%s) "
+            f"ORDER BY rank DESC, t.{key} DESC LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [query, list(project_ids), limit])
+            return cursor.fetchall()
+
+
+class SQLiteSearch:
+    """FTS5 external-content tables, ranked with ``bm25`` (lower is better, so it is negated)."""
+
+    def ids(self, table, query, project_ids, limit, key='id', scope=None):
+        # Quote every word so user input can't use FTS5 syntax; the last word matches as a prefix.
+        words = _word_re.findall(query)
+        if not words:
+            return []
+        match = ' '.join('"%s"' % word for word in words) + '*'
+        placeholders = ','.join(['%s'] * len(project_ids))
+        sql = (
+            f"SELECT t.{key}, -bm25({table}_fts) AS rank "
+            f"FROM {table}_fts JOIN {table} t ON t.{key} = {table}_fts.rowid {_join(key, scope)} "
+            f"WHERE {table}_fts MATCH %s AND {_project_column(scope)} IN ({placeholders}) "
+            f"ORDER BY rank DESC, t.{key} DESC LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [match, *project_ids, limit])
+            return cursor.fetchall()
+
+
+def get_backend():
+    if connection.vendor == 'postgresql':
+        return PostgresSearch()
+    if connection.vendor == 'sqlite':
+        return SQLiteSearch()
+    raise NotImplementedError(f"Full-text search is not set up for {connection.vendor}.")
+
+
+def _ranked(queryset, rows):
+    objects = queryset.in_bulk([pk for pk, _ in rows])
+    results = []
+    for pk, rank in rows:
+        if pk in objects:
+            objects[pk].rank = rank
+            results.append(objects[pk])
+    return results
+
+
+def search_comments(query, project_ids, limit=MAX_RESULTS):
+    if not project_ids:
+        return []
+    rows = get_backend().ids(Comment._meta.db_table, query, project_ids, limit)
+    return _ranked(Comment.objects.select_related('user'), rows)
+
+
+def search_documents(query, project_ids, limit=MAX_RESULTS):
+    """Documents whose name or extracted text matches, best rank first."""
+    if not project_ids:
+        return []
+    backend = get_backend()
+    ranks = dict(backend.ids(Document._meta.db_table, query, project_ids, limit))
+    for pk, rank in backend.ids(DocumentText._meta.db_table, query, project_ids, limit,
+                                key='document_id', scope=Document._meta.db_table):
+        ranks[pk] = max(rank, ranks.get(pk, rank))
+    rows = sorted(ranks.items(), key=lambda row: (row[1], row[0]), reverse=True)[:limit]
+    return _ranked(Document.objects.select_related('preview'), rows)
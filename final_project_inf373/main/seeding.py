@@ -0,0 +1,210 @@
+"""Synthetic datasets for benchmarks and local load testing.
+
+Rows are written with ``bulk_create``, multi-row INSERTs or ``COPY`` on PostgreSQL, so model
+signals (cache versions, change log, realtime events) do not fire; seed into a fresh database or
+clear the cache afterwards.
+"""
+import random
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Comment, Document, Member, Project, User
+from .utils import batched
+
+BATCH_SIZE = 1000
+
+WORDS = (
+    'concrete', 'steel', 'crane', 'permit', 'foundation', 'scaffold', 'rebar', 'inspection', 'delivery',
+    'schedule', 'budget', 'drawing', 'survey', 'drainage', 'facade', 'roof', 'window', 'electrical',
+    'plumbing', 'handover', 'snag', 'contract', 'invoice', 'site', 'crew', 'formwork', 'pour', 'beam',
+)
+
+
+@dataclass
+class SeedResult:
+    users: int = 0
+    projects: int = 0
+    members: int = 0
+    comments: int = 0
+    documents: int = 0
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+class InsertWriter:
+    """Writes ``(field, ...)`` tuples with batched multi-row INSERTs.
+
+    Values are stored exactly as given, so generated ``auto_now_add`` timestamps are kept.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def write(self, model, fields, rows):
+        model_fields = [model._meta.get_field(name) for name in fields]
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in model_fields)
+        row_sql = '(' + ', '.join(['%s'] * len(fields)) + ')'
+        # SQLite caps the number of parameters per statement.
+        size = connection.ops.bulk_batch_size(model_fields, [None] * self.batch_size)
+        written = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            for batch in batched(rows, size):
+                params = [field.get_db_prep_save(value, connection)
+                          for row in batch for field, value in zip(model_fields, row)]
+                cursor.execute(f'INSERT INTO {table} ({columns}) VALUES {", ".join([row_sql] * len(batch))}', params)
+                written += len(batch)
+        return written
+
+
+class CopyWriter:
+    """Streams rows through PostgreSQL ``COPY ... FROM STDIN``, several times faster than INSERTs."""
+
+    def write(self, model, fields, rows):
+        columns = ', '.join(model._meta.get_field(name).column for name in fields)
+        written = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            with cursor.cursor.copy(f'COPY {model._meta.db_table} ({columns}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+                    written += 1
+        return written
+
+
+def get_writer(batch_size=BATCH_SIZE, copy=True):
+    if copy and connection.vendor == 'postgresql':
+        return CopyWriter()
+    return InsertWriter(batch_size)
+
+
+def power_law_counts(total, buckets, rng, alpha=1.0):
+    """Split ``total`` over ``buckets`` with Zipf-like sizes: a few huge buckets, a long tail of small ones."""
+    if buckets <= 0:
+        return []
+    weights = [rank ** -alpha for rank in range(1, buckets + 1)]
+    rng.shuffle(weights)
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    for i in rng.sample(range(buckets), total - sum(counts)):
+        counts[i] += 1
+    return counts
+
+
+def pick_distinct(rng, population, cum_weights, size):
+    """``size`` distinct items, favouring heavy ones; falls back to uniform sampling for big picks."""
+    if size * 2 >= len(population):
+        return rng.sample(population, size)
+    chosen = set()
+    for _ in range(5):
+        chosen.update(rng.choices(population, cum_weights=cum_weights, k=size - len(chosen)))
+        if len(chosen) >= size:
+            break
+    if len(chosen) < size:
+        chosen.update(rng.sample([item for item in population if item not in chosen], size - len(chosen)))
+    return list(chosen)[:size]
+
+
+def cumulative(weights):
+    total = 0
+    result = []
+    for weight in weights:
+        total += weight
+        result.append(total)
+    return result
+
+
+def seed_scaled(users, projects, comments, documents, members_per_project=5, seed=0, alpha=1.0, files=False,
+                prefix='seed', batch_size=BATCH_SIZE, copy=True, progress=None):
+    """Generate a production-shaped dataset of the given totals.
+
+    Comments and documents per project follow a power law, and so does how many projects a user
+    belongs to: a handful of busy users and projects, a long tail of quiet ones. Everything is
+    generated as a stream, so memory stays flat however many comments are requested. ``alpha=0``
+    spreads everything evenly, with exactly ``members_per_project`` people on every team.
+    """
+    rng = random.Random(seed)
+    writer = get_writer(batch_size, copy)
+    report = progress or (lambda label, count: None)
+    result = SeedResult()
+    # Seeded accounts can't log in; benchmarks authenticate them directly.
+    password = make_password(None)
+
+    created = User.objects.bulk_create(
+        [User(username=f'{prefix}-user-{i}', email=f'{prefix}-user-{i}@example.com', password=password) for i in range(users)],
+        batch_size=batch_size,
+    )
+    user_ids = [user.pk for user in created]
+    user_weights = cumulative(power_law_counts(users * 100, users, rng, alpha))
+    result.users = len(user_ids)
+    report('users', result.users)
+
+    owners = rng.choices(user_ids, cum_weights=user_weights, k=projects)
+    created = Project.objects.bulk_create(
+        [Project(project_name=f'{sentence(rng, 2)[:-1]} {i}', owner_id=owner) for i, owner in enumerate(owners)],
+        batch_size=batch_size,
+    )
+    project_ids = [project.pk for project in created]
+    result.projects = len(project_ids)
+    report('projects', result.projects)
+
+    team_sizes = power_law_counts(max(projects * (members_per_project - 1), 0), projects, rng, alpha)
+    teams = {}
+
+    def memberships():
+        for project_id, owner, extra in zip(project_ids, owners, team_sizes):
+            others = pick_distinct(rng, user_ids, user_weights, min(extra + 1, users))
+            team = [owner] + [user for user in others if user != owner][:extra]
+            teams[project_id] = team
+            for user in team:
+                yield user, project_id, user == owner
+
+    result.members = writer.write(Member, ('member_id', 'project_id', 'is_owner'), memberships())
+    report('members', result.members)
+
+    # Drawing from a fixed pool keeps text generation off the critical path for millions of rows.
+    texts = [sentence(rng, rng.randint(4, 30)) for _ in range(10_000)]
+    now = timezone.now()
+    span = timedelta(days=730).total_seconds()
+
+    def comment_rows():
+        for project_id, count in zip(project_ids, power_law_counts(comments, projects, rng, alpha)):
+            team = teams[project_id]
+            for _ in range(count):
+                created_at = now - timedelta(seconds=rng.random() * span)
+                yield rng.choice(texts), created_at, rng.choice(team), project_id
+
+    result.comments = writer.write(Comment, ('text', 'created_at', 'user_id', 'project_id'), comment_rows())
+    report('comments', result.comments)
+
+    uploads = []
+
+    def document_rows():
+        for project_id, count in zip(project_ids, power_law_counts(documents, projects, rng, alpha)):
+            for i in range(count):
+                name = f'{rng.choice(WORDS)}-{i}.txt'
+                key = f'documents/{rng.getrandbits(128):032x}/{name}'
+                body = rng.choice(texts).encode()
+                if files:
+                    uploads.append((key, body))
+                yield project_id, name, name, key, len(body), 'text/plain', '', now - timedelta(seconds=rng.random() * span)
+
+    result.documents = writer.write(
+        Document, ('project_id', 'name', 'filename', 'file', 'size', 'content_type', 'sha256', 'uploaded_at'), document_rows(),
+    )
+    report('documents', result.documents)
+
+    if uploads:
+        storage = Document._meta.get_field('file').storage
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            for batch in batched(uploads, batch_size):
+                list(pool.map(lambda upload: storage.save(upload[0], ContentFile(upload[1])), batch))
+        report('files', len(uploads))
+    return result
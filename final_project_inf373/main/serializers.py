@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Project, Document, Comment, Member, User
+from django.urls import reverse
+from .models import Project, Document, Comment, Member, UploadSession, User
+from .permissions import OWNER, project_role
 
 User = get_user_model()
 
@@ -26,9 +28,28 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'username', 'email')
 
 class DocumentSerializer(serializers.ModelSerializer):
+    preview = serializers.SerializerMethodField()
+
     class Meta:
         model = Document
-        fields = ['id', 'project', 'name', 'file']
+        fields = ['id', 'project', 'name', 'file', 'size', 'content_type', 'sha256', 'uploaded_at', 'preview']
+        read_only_fields = ['size', 'content_type', 'sha256', 'uploaded_at']
+
+    def get_preview(self, obj):
+        """``None`` until ``generate_previews`` has seen the current file."""
+        preview = getattr(obj, 'preview', None)
+        if preview is None or preview.source != (obj.file.name if obj.file else None):
+            return None
+        thumbnail = reverse('document-thumbnail', args=[obj.pk]) if preview.thumbnail else None
+        return {'status': preview.status, 'snippet': preview.snippet, 'thumbnail': thumbnail}
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    filename = serializers.CharField(write_only=True, required=False)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'project', 'name', 'filename', 'key', 'content_type', 'created_at', 'updated_at']
+        read_only_fields = ['key', 'created_at', 'updated_at']
 
 class CommentSerializer(serializers.ModelSerializer):
     is_owner = serializers.SerializerMethodField()
@@ -42,11 +63,11 @@ class CommentSerializer(serializers.ModelSerializer):
 
     def get_is_owner(self, obj):
         request = self.context.get('request')
-        return obj.user == request.user if request else False
+        return obj.user_id == request.user.id if request else False
 
     def get_is_project_owner(self, obj):
         request = self.context.get('request')
-        return obj.project.owner == request.user if request else False
+        return project_role(request, obj.project_id) == OWNER if request else False
 
 class ProjectSerializer(serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
@@ -57,6 +78,31 @@ class ProjectSerializer(serializers.ModelSerializer):
         model = Project
         fields = ['id', 'project_name', 'owner', 'documents', 'comments']
 
+class ProjectSummarySerializer(serializers.ModelSerializer):
+    """Dashboard representation: counts come from queryset annotations, nested lists only on request."""
+    owner = UserSerializer(read_only=True)
+    document_count = serializers.IntegerField(read_only=True)
+    comment_count = serializers.IntegerField(read_only=True)
+    member_count = serializers.IntegerField(read_only=True)
+    last_activity = serializers.DateTimeField(read_only=True)
+
+    expandable = {
+        'documents': lambda: DocumentSerializer(many=True, read_only=True),
+        'comments': lambda: CommentSerializer(many=True, read_only=True, source='comment_set'),
+    }
+
+    class Meta:
+        model = Project
+        fields = ['id', 'project_name', 'owner', 'document_count', 'comment_count', 'member_count', 'last_activity']
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in expand:
+            self.fields[name] = self.expandable[name]()
+        if fields:
+            for name in set(self.fields) - set(fields) - set(expand):
+                self.fields.pop(name)
+
 class MemberSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source='member.id', read_only=True)
     username = serializers.CharField(source='member.username', read_only=True)
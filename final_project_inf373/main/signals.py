@@ -0,0 +1,106 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import forget_user
+from .blobs import enqueue_deletion, release_blob
+from .caching import bump_project, bump_user
+from .changes import record_change
+from .models import ChangeLogEntry, Comment, Document, DocumentPreview, Member, Project, User
+from .realtime import publish_event
+from .serializers import CommentSerializer, DocumentSerializer
+
+
+def deleted_with_project(origin):
+    """True when a child row is going away because its whole project is being deleted."""
+    if isinstance(origin, QuerySet):
+        return origin.model is Project
+    return isinstance(origin, Project)
+
+
+@receiver([post_save, post_delete], sender=Project)
+def project_changed(sender, instance, **kwargs):
+    bump_project(instance.pk)
+    bump_user(instance.owner_id)
+
+
+@receiver([post_save, post_delete], sender=Member)
+def member_changed(sender, instance, origin=None, **kwargs):
+    if not deleted_with_project(origin):
+        bump_project(instance.project_id)
+    bump_user(instance.member_id)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Document)
+def project_content_changed(sender, instance, origin=None, **kwargs):
+    if not deleted_with_project(origin):
+        bump_project(instance.project_id)
+
+
+EVENT_SERIALIZERS = {Comment: CommentSerializer, Document: DocumentSerializer}
+
+
+def push_change(instance, entry):
+    serializer = EVENT_SERIALIZERS.get(type(instance))
+    if serializer is None:
+        return
+    event = {'type': entry.kind, 'action': entry.action, 'id': entry.object_id, 'seq': entry.id}
+    if entry.action != ChangeLogEntry.DELETED:
+        event['data'] = serializer(instance).data
+    publish_event(instance.project_id, event)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Document)
+@receiver(post_save, sender=Member)
+def log_saved(sender, instance, created, **kwargs):
+    entry = record_change(instance, ChangeLogEntry.CREATED if created else ChangeLogEntry.UPDATED)
+    push_change(instance, entry)
+
+
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Document)
+@receiver(post_delete, sender=Member)
+def log_deleted(sender, instance, origin=None, **kwargs):
+    # Nobody syncs a deleted project: skip a tombstone and an event per child of the cascade.
+    if deleted_with_project(origin):
+        return
+    entry = record_change(instance, ChangeLogEntry.DELETED)
+    push_change(instance, entry)
+
+
+@receiver(post_delete, sender=Project)
+def project_deleted(sender, instance, **kwargs):
+    ChangeLogEntry.objects.filter(project_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=Document)
+def document_deleted(sender, instance, **kwargs):
+    if instance.blob_id:
+        release_blob(instance.blob_id)
+    elif instance.file:
+        enqueue_deletion([instance.file.name])
+
+
+@receiver(post_delete, sender=DocumentPreview)
+def preview_deleted(sender, instance, **kwargs):
+    if instance.thumbnail:
+        enqueue_deletion([instance.thumbnail.name])
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_forgotten(sender, instance, **kwargs):
+    # Authentication caches the User row; drop it so deactivation takes effect immediately.
+    forget_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    # Usernames are embedded in cached project payloads (owner, comment authors).
+    if created or update_fields == {'last_login'}:
+        return
+    project_ids = set(instance.owned_projects.values_list('id', flat=True))
+    project_ids.update(instance.memberships.values_list('project_id', flat=True))
+    for project_id in project_ids:
+        bump_project(project_id)
@@ -1,13 +1,74 @@
-from main.models import Project, Comment, Member
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import threading
+import unittest
+from unittest import mock
+
+from django.conf import settings
+
+# moto only intercepts S3 traffic for endpoints it knows about, and reads this list on import.
+os.environ.setdefault(
+    'MOTO_S3_CUSTOM_ENDPOINTS',
+    f'{settings.AWS_S3_ENDPOINT_URL},{settings.AWS_S3_PUBLIC_ENDPOINT_URL}',
+)
+
+import requests
+from moto import mock_aws
+from final_project.asgi import application as asgi_application
+from final_project.storages import MinIOStorage
+from main.realtime import InMemoryBroker, get_broker
+from main.models import KEY_MAX_LENGTH, Blob, ChangeLogEntry, DocumentPreview, DocumentText, Project, Comment, Member, OutboxEmail, StorageDeletion, UploadSession, document_key
 from main.models import User, Project, Member
-from main.models import Project, Document, User
+from main.models import Project, Document, User, Comment
+from django.core.files.storage import InMemoryStorage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from main.models import Project
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.core import mail
+from rest_framework.fields import DateTimeField
+from django.core.mail import EmailMessage, get_connection
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.models import Count, F
+from datetime import timedelta
+from django.utils import timezone
+from main.upload_handlers import S3StreamingUploadHandler
+from main.previews import Image
+from main.seeding import power_law_counts
+from main import metrics
+from main.profiling import should_profile
+from main.query_shapes import QueryShapeRecorder, RepeatedQueriesError, assert_no_repeated_queries
+from main.admin import CommentAdmin
+from main.authentication import CachedJWTAuthentication, local_users
+from main.caching import get_versions
+from main.benchmarks import ENDPOINTS, benchmark_environment, compare, prepare, run_benchmarks
+
+
+class S3StorageMixin:
+    def setUp(self):
+        super().setUp()
+        s3 = mock_aws()
+        s3.start()
+        self.addCleanup(s3.stop)
+        self.storage = Document._meta.get_field('file').storage
+        self.storage.client.create_bucket(Bucket=self.storage.bucket_name)
+
+    def stored_keys(self):
+        listing = self.storage.client.list_objects_v2(Bucket=self.storage.bucket_name, Prefix='documents/')
+        return [obj['Key'] for obj in listing.get('Contents', [])]
 
 
 class CommentAPITest(APITestCase):
@@ -31,7 +92,30 @@ class CommentAPITest(APITestCase):
         self.authenticate(self.user1)
         response = self.client.get(self.url_list)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_comment_feeds_are_cursor_paginated(self):
+        Comment.objects.bulk_create(
+            [Comment(text=f'Bulk {i}', user=self.user2, project=self.project) for i in range(7)]
+        )
+        self.authenticate(self.user1)
+        for url, total in (
+            (self.url_list, 9),
+            (reverse('comment-by-project', args=[self.project.id]), 9),
+            (reverse('comment-by-user', args=[self.user2.id]), 8),
+        ):
+            with self.subTest(url=url):
+                seen = []
+                next_url = url + '?page_size=3'
+                while next_url:
+                    response = self.client.get(next_url)
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+                    self.assertLessEqual(len(response.data['results']), 3)
+                    seen.extend(c['id'] for c in response.data['results'])
+                    next_url = response.data['next']
+                self.assertEqual(len(seen), total)
+                ordered = Comment.objects.filter(id__in=seen).order_by('created_at', 'id')
+                self.assertEqual(seen, [c.id for c in ordered])
 
     def test_create_comment(self):
         self.authenticate(self.user1)
@@ -57,8 +141,9 @@ class CommentAPITest(APITestCase):
         url = reverse('comment-detail', args=[self.comment1.id])
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
-class DocumentTests(APITestCase):
+class DocumentTests(S3StorageMixin, APITestCase):
     def setUp(self):
+        super().setUp()
         self.user = User.objects.create_user(username='testuser', email='user@example.com', password='password')
         self.other_user = User.objects.create_user(username='otheruser', email='other@example.com', password='password')
         self.project = Project.objects.create(project_name='Test Project', owner=self.user)
@@ -145,6 +230,16 @@ class MemberTests(APITestCase):
         self.assertTrue(Member.objects.filter(project=self.project, member=existing_user).exists())
         self.assertIn('has been added', response.data['detail'])
 
+    def test_inviting_unknown_email_queues_invite(self):
+        url = reverse('project-members-invite-member', args=[self.project.id])
+        response = self.client.post(url, {'email': 'newcomer@example.com'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(mail.outbox, [])
+        queued = OutboxEmail.objects.get()
+        self.assertEqual(queued.recipient, 'newcomer@example.com')
+        self.assertIn(self.project.project_name, queued.body)
+
     def test_inviting_without_email_returns_400(self):
         url = reverse('project-members-invite-member', args=[self.project.id])
         response = self.client.post(url, {})  # No email
@@ -337,4 +432,1655 @@ class AuthTests(APITestCase):
 
     def test_protected_endpoint_requires_authentication(self):
         response = self.client.get(self.current_user_url)
-        self.assertEqual(response.status_code, 401)
\ No newline at end of file
+        self.assertEqual(response.status_code, 401)
+
+class QueryCountTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='pass')
+        self.client.force_authenticate(user=self.user)
+
+    def seed_projects(self, count):
+        projects = Project.objects.bulk_create(
+            [Project(project_name=f'Project {i}', owner=self.user) for i in range(count)]
+        )
+        Member.objects.bulk_create(
+            [Member(member=self.user, project=p, is_owner=True) for p in projects]
+            + [Member(member=self.other, project=p) for p in projects]
+        )
+        Document.objects.bulk_create(
+            [Document(project=p, name=f'Doc {i}') for p in projects for i in range(2)]
+        )
+        Comment.objects.bulk_create(
+            [Comment(project=p, user=u, text='hi') for p in projects for u in (self.user, self.other)]
+        )
+        return projects
+
+    def test_project_list_query_count_is_constant(self):
+        for count in (1, 10, 500):
+            with self.subTest(projects=count):
+                Project.objects.all().delete()
+                cache.clear()
+                self.seed_projects(count)
+                # One query to populate the access cache, then one annotated project query.
+                with self.assertNumQueries(2):
+                    response = self.client.get(reverse('project-list'))
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(len(response.data), count)
+                self.assertEqual(response.data[0]['comment_count'], 2)
+                with self.assertNumQueries(0):
+                    cached = self.client.get(reverse('project-list'))
+                self.assertEqual(cached.data, response.data)
+                # Expanding nested lists adds one prefetch query each.
+                with self.assertNumQueries(3):
+                    expanded = self.client.get(reverse('project-list'), {'expand': 'documents,comments'})
+                self.assertEqual(len(expanded.data[0]['comments']), 2)
+
+    def test_comment_list_query_count_is_constant(self):
+        for count in (1, 10, 500):
+            with self.subTest(projects=count):
+                Project.objects.all().delete()
+                projects = self.seed_projects(count)
+                # The first request also loads the user's project role map, later ones hit the cache.
+                with self.assertNumQueries(2):
+                    response = self.client.get(reverse('comment-list'))
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                with self.assertNumQueries(1):
+                    self.client.get(reverse('comment-by-project', args=[projects[0].id]))
+
+    def test_member_list_query_count_is_constant(self):
+        project = self.seed_projects(1)[0]
+        extra = User.objects.bulk_create(
+            [User(username=f'user{i}', email=f'user{i}@example.com') for i in range(50)]
+        )
+        Member.objects.bulk_create([Member(member=u, project=project) for u in extra])
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('project-members-list', args=[project.id]))
+        self.assertEqual(len(response.data['members']), 52)
+
+
+class ProjectAccessCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.user2 = User.objects.create_user(username='user2', email='user2@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Shared', owner=self.owner)
+        Member.objects.create(member=self.owner, project=self.project, is_owner=True)
+
+    def list_project_ids(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse('project-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [p['id'] for p in response.data]
+
+    def test_membership_changes_invalidate_access(self):
+        self.assertEqual(self.list_project_ids(self.user2), [])
+
+        self.client.force_authenticate(user=self.owner)
+        url = reverse('project-members-invite-member', args=[self.project.id])
+        response = self.client.post(url, {'email': self.user2.email})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.list_project_ids(self.user2), [self.project.id])
+
+        self.client.force_authenticate(user=self.owner)
+        self.client.delete(reverse('project-members-detail', args=[self.project.id, self.user2.id]))
+        self.assertEqual(self.list_project_ids(self.user2), [])
+
+    def test_project_delete_invalidates_owner_and_members(self):
+        Member.objects.create(member=self.user2, project=self.project)
+        self.assertEqual(self.list_project_ids(self.owner), [self.project.id])
+        self.assertEqual(self.list_project_ids(self.user2), [self.project.id])
+
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.delete(reverse('project-detail', args=[self.project.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.list_project_ids(self.owner), [])
+        self.assertEqual(self.list_project_ids(self.user2), [])
+
+    def test_versions_survive_eviction_between_add_and_read(self):
+        # Simulates a full cache that evicts the freshly added counters before they are read back.
+        with mock.patch.object(cache, 'add'):
+            versions = get_versions('project', [1, 2])
+        self.assertEqual(set(versions), {1, 2})
+
+    def test_new_comment_invalidates_cached_payload(self):
+        self.list_project_ids(self.owner)
+        Comment.objects.create(text='fresh', user=self.owner, project=self.project)
+        response = self.client.get(reverse('project-list'), {'expand': 'comments'})
+        self.assertEqual([c['text'] for c in response.data[0]['comments']], ['fresh'])
+
+
+class PresignedUploadTests(S3StorageMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.outsider = User.objects.create_user(username='outsider', email='out@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Uploads', owner=self.owner)
+        self.client.force_authenticate(user=self.owner)
+
+    def request_upload(self, **data):
+        payload = {'project': self.project.id, 'name': 'Spec', 'filename': 'spec sheet.pdf'}
+        payload.update(data)
+        return self.client.post(reverse('document-upload-url'), payload)
+
+    def test_presigned_upload_round_trip(self):
+        response = self.request_upload(content_type='application/pdf')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['key'].startswith('documents/'))
+        self.assertTrue(response.data['url'].startswith(settings.AWS_S3_PUBLIC_ENDPOINT_URL))
+
+        put = requests.put(response.data['url'], data=b'%PDF-1.4 body', headers=response.data['headers'])
+        self.assertEqual(put.status_code, 200)
+
+        complete = self.client.post(reverse('document-complete-upload'), {'upload_token': response.data['upload_token']})
+        self.assertEqual(complete.status_code, status.HTTP_201_CREATED)
+        document = Document.objects.get()
+        self.assertEqual(document.name, 'Spec')
+        self.assertEqual(document.file.name, response.data['key'])
+
+    def test_long_filename_round_trip(self):
+        filename = 'quarterly-structural-inspection-report-north-tower-rev-final.pdf'
+        response = self.request_upload(filename=filename)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(len(response.data['key']), 100)
+        requests.put(response.data['url'], data=b'%PDF-1.4 body', headers=response.data['headers'])
+
+        complete = self.client.post(reverse('document-complete-upload'), {'upload_token': response.data['upload_token']})
+        self.assertEqual(complete.status_code, status.HTTP_201_CREATED)
+        key = Document.objects.get().file.name
+        self.assertEqual(key, response.data['key'])
+        self.assertLessEqual(len(key), Document._meta.get_field('file').max_length)
+
+    def test_complete_requires_uploaded_object(self):
+        response = self.request_upload()
+        complete = self.client.post(reverse('document-complete-upload'), {'upload_token': response.data['upload_token']})
+        self.assertEqual(complete.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Document.objects.exists())
+
+    def test_complete_rejects_tampered_token(self):
+        complete = self.client.post(reverse('document-complete-upload'), {'upload_token': 'documents/evil.txt'})
+        self.assertEqual(complete.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_non_member_cannot_request_upload(self):
+        self.client.force_authenticate(user=self.outsider)
+        response = self.request_upload()
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class DocumentDownloadTests(S3StorageMixin, APITestCase):
+    content = b'0123456789abcdefghij'
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Downloads', owner=self.user)
+        self.storage.client.put_object(
+            Bucket=self.storage.bucket_name, Key='documents/report.txt', Body=self.content, ContentType='text/plain',
+        )
+        self.document = Document.objects.create(
+            project=self.project, name='Report', filename='report.txt', file='documents/report.txt',
+        )
+        self.url = reverse('document-download', args=[self.document.id])
+        self.client.force_authenticate(user=self.user)
+
+    def test_full_download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('report.txt', response['Content-Disposition'])
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5-9')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), b'56789')
+        self.assertEqual(response['Content-Range'], 'bytes 5-9/20')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), b'ghij')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=50-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], 'bytes */20')
+
+    def test_conditional_get(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_redirect_mode(self):
+        response = self.client.get(self.url, {'mode': 'redirect'})
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertTrue(response['Location'].startswith(settings.AWS_S3_PUBLIC_ENDPOINT_URL))
+        self.assertEqual(requests.get(response['Location']).content, self.content)
+
+    def test_accel_mode(self):
+        response = self.client.get(self.url, {'mode': 'accel'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['X-Accel-Redirect'].startswith(f'/{self.storage.bucket_name}/documents/report.txt?'))
+        self.assertEqual(response.content, b'')
+
+    def test_unknown_mode(self):
+        response = self.client.get(self.url, {'mode': 'teleport'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UploadSessionTests(S3StorageMixin, APITestCase):
+    part_size = 5 * 1024 * 1024
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Big files', owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def start_session(self, filename='dump.bin'):
+        response = self.client.post(reverse('upload-session-list'), {
+            'project': self.project.id, 'name': 'Dump', 'filename': filename,
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data
+
+    def upload_parts(self, session_id, parts):
+        response = self.client.post(
+            reverse('upload-session-parts', args=[session_id]), {'part_numbers': list(parts)}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for number, body in parts.items():
+            put = requests.put(response.data['urls'][str(number)], data=body)
+            self.assertEqual(put.status_code, 200)
+
+    def test_resumable_upload(self):
+        session = self.start_session()
+        self.assertTrue(session['key'].startswith('documents/'))
+        first, second = b'a' * self.part_size, b'tail'
+
+        self.upload_parts(session['id'], {2: second})
+        detail = self.client.get(reverse('upload-session-detail', args=[session['id']]))
+        self.assertEqual([p['part_number'] for p in detail.data['parts']], [2])
+
+        self.upload_parts(session['id'], {1: first})
+        response = self.client.post(reverse('upload-session-complete', args=[session['id']]), {'parts_count': 2})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        document = Document.objects.get()
+        self.assertEqual(document.file.name, session['key'])
+        body = self.storage.get_object(session['key'])['Body'].read()
+        self.assertEqual(body, first + second)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_long_filename_completes(self):
+        session = self.start_session(filename='database-export-production-cluster-eu-west-full-snapshot.tar.gz')
+        self.assertGreater(len(session['key']), 100)
+        self.upload_parts(session['id'], {1: b'small dump'})
+        response = self.client.post(reverse('upload-session-complete', args=[session['id']]), {'parts_count': 1})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Document.objects.get().file.name, session['key'])
+
+    def test_session_refuses_keys_documents_cannot_store(self):
+        with mock.patch('main.api_views.document_key', return_value='documents/' + 'x' * KEY_MAX_LENGTH):
+            response = self.client.post(reverse('upload-session-list'), {'project': self.project.id, 'name': 'Dump'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_complete_rejects_missing_parts(self):
+        session = self.start_session()
+        self.upload_parts(session['id'], {1: b'only part'})
+        response = self.client.post(reverse('upload-session-complete', args=[session['id']]), {'parts_count': 3})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Document.objects.exists())
+
+    def test_sessions_are_private(self):
+        session = self.start_session()
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass')
+        self.client.force_authenticate(user=other)
+        response = self.client.get(reverse('upload-session-detail', args=[session['id']]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_abort(self):
+        session = self.start_session()
+        response = self.client.delete(reverse('upload-session-detail', args=[session['id']]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(self.storage.list_multipart_uploads('documents/')), [])
+
+    def test_reaper_aborts_stale_sessions(self):
+        stale = self.start_session()
+        fresh = self.start_session()
+        UploadSession.objects.filter(id=stale['id']).update(updated_at=timezone.now() - timedelta(days=2))
+
+        call_command('reap_upload_sessions', '--max-age', '24', stdout=io.StringIO())
+
+        self.assertEqual(list(UploadSession.objects.values_list('id', flat=True)), [fresh['id']])
+        keys = [u['Key'] for u in self.storage.list_multipart_uploads('documents/')]
+        self.assertEqual(keys, [fresh['key']])
+
+
+class StreamingUploadTests(S3StorageMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.outsider = User.objects.create_user(username='outsider', email='out@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Streams', owner=self.user)
+
+    @override_settings(DOCUMENT_UPLOAD_PART_SIZE=5 * 1024 * 1024)
+    def test_large_upload_is_streamed_in_parts(self):
+        content = os.urandom(1024) * (11 * 1024)
+        self.client.force_authenticate(user=self.user)
+        upload = SimpleUploadedFile('big.bin', content, content_type='application/octet-stream')
+        with mock.patch.object(self.storage.client, 'upload_part', wraps=self.storage.client.upload_part) as upload_part:
+            response = self.client.post(reverse('document-list'), {'project': self.project.id, 'name': 'Big', 'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(upload_part.call_count, 3)
+
+        document = Document.objects.get()
+        self.assertTrue(document.file.name.startswith('documents/'))
+        self.assertEqual(self.storage.get_object(document.file.name)['Body'].read(), content)
+
+    def test_long_filename_fits_the_key_column(self):
+        self.client.force_authenticate(user=self.user)
+        filename = 'quarterly-structural-inspection-report-north-tower-rev-final.pdf'
+        upload = SimpleUploadedFile(filename, b'%PDF-1.7 long', content_type='application/pdf')
+        response = self.client.post(reverse('document-list'), {'project': self.project.id, 'name': 'Report', 'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        key = Document.objects.get().file.name
+        self.assertTrue(key.endswith('/' + filename))
+        self.assertGreater(len(key), 100)
+        self.assertLessEqual(len(key), Document._meta.get_field('file').max_length)
+
+        huge = document_key('y' * 2000 + '.txt')
+        self.assertEqual(len(huge), KEY_MAX_LENGTH)
+        self.assertTrue(huge.endswith('y.txt'))
+
+    def test_rejected_upload_leaves_no_object(self):
+        self.client.force_authenticate(user=self.outsider)
+        upload = SimpleUploadedFile('file.txt', b'content', content_type='text/plain')
+        response = self.client.post(reverse('document-list'), {'project': self.project.id, 'name': 'Doc', 'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.stored_keys(), [])
+
+    @override_settings(DOCUMENT_UPLOAD_PART_SIZE=5 * 1024 * 1024)
+    def test_handler_buffers_at_most_one_part(self):
+        handler = S3StreamingUploadHandler(storage=self.storage)
+        handler.new_file('file', 'data.bin', 'application/octet-stream', None)
+        chunk = b'x' * (64 * 1024)
+        expected = hashlib.sha256()
+        for i in range(200):
+            handler.receive_data_chunk(chunk, i * len(chunk))
+            expected.update(chunk)
+            self.assertLess(len(handler.buffer), handler.part_size)
+        uploaded = handler.file_complete(200 * len(chunk))
+        self.assertEqual(uploaded.size, 200 * len(chunk))
+        self.assertEqual(uploaded.sha256, expected.hexdigest())
+        self.assertEqual(self.storage.head(uploaded.key)['ContentLength'], uploaded.size)
+
+
+class DocumentMetadataTests(S3StorageMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Metadata', owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def test_upload_records_metadata(self):
+        upload = SimpleUploadedFile('notes.txt', b'hello world', content_type='text/plain')
+        response = self.client.post(reverse('document-list'), {'project': self.project.id, 'name': 'Notes', 'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['size'], 11)
+        self.assertEqual(response.data['content_type'], 'text/plain')
+        self.assertEqual(response.data['sha256'], hashlib.sha256(b'hello world').hexdigest())
+        self.assertIsNotNone(response.data['uploaded_at'])
+
+    def test_listing_makes_no_storage_calls(self):
+        Document.objects.bulk_create([
+            Document(project=self.project, name=f'Doc {i}', file=f'documents/{i}.txt', size=i, content_type='text/plain')
+            for i in range(1000)
+        ])
+        with mock.patch('botocore.client.BaseClient._make_api_call', side_effect=AssertionError('storage call')):
+            response = self.client.get(reverse('document-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1000)
+        self.assertEqual(response.data[5]['size'], 5)
+
+    def test_backfill_command(self):
+        self.storage.client.put_object(Bucket=self.storage.bucket_name, Key='documents/old.csv', Body=b'a,b\n1,2\n', ContentType='text/csv')
+        old = Document.objects.create(project=self.project, name='Old', file='documents/old.csv')
+        gone = Document.objects.create(project=self.project, name='Gone', file='documents/gone.csv')
+
+        out = io.StringIO()
+        call_command('backfill_document_metadata', '--checksums', '--workers', '4', stdout=out)
+
+        old.refresh_from_db()
+        self.assertEqual(old.size, 8)
+        self.assertEqual(old.content_type, 'text/csv')
+        self.assertEqual(old.sha256, hashlib.sha256(b'a,b\n1,2\n').hexdigest())
+        gone.refresh_from_db()
+        self.assertIsNone(gone.size)
+        self.assertIn('1 files were missing', out.getvalue())
+
+    def test_checksums_for_direct_uploads_deduplicate_them(self):
+        body = b'%PDF-1.7 same drawing'
+        existing = self.client.post(reverse('document-list'), {
+            'project': self.project.id, 'name': 'Drawing', 'file': SimpleUploadedFile('a.pdf', body, content_type='application/pdf'),
+        }, format='multipart')
+        kept = Document.objects.get(pk=existing.data['id']).file.name
+        # What presigned completion and upload sessions create: size and type from HEAD, no checksum.
+        self.storage.client.put_object(Bucket=self.storage.bucket_name, Key='documents/direct/b.pdf', Body=body)
+        direct = Document.objects.create(project=self.project, name='Copy', file='documents/direct/b.pdf', size=len(body))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('backfill_document_metadata', '--checksums', stdout=io.StringIO())
+
+        direct.refresh_from_db()
+        self.assertEqual(direct.sha256, hashlib.sha256(body).hexdigest())
+        self.assertEqual(direct.file.name, kept)
+        self.assertEqual(direct.filename, 'b.pdf')
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+        self.assertEqual(self.stored_keys(), [kept])
+
+
+class BlobDeduplicationTests(S3StorageMixin, APITestCase):
+    content = b'%PDF-1.7 shared spec sheet'
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.project_a = Project.objects.create(project_name='A', owner=self.user)
+        self.project_b = Project.objects.create(project_name='B', owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, project, filename='spec.pdf'):
+        upload = SimpleUploadedFile(filename, self.content, content_type='application/pdf')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('document-list'), {'project': project.id, 'name': 'Spec', 'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Document.objects.get(id=response.data['id'])
+
+    def delete(self, document):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse('document-detail', args=[document.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_identical_uploads_share_one_object(self):
+        first = self.upload(self.project_a)
+        second = self.upload(self.project_b, filename='copy.pdf')
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+        self.assertEqual(self.stored_keys(), [first.file.name])
+
+    @override_settings(DOCUMENT_STREAMING_UPLOADS=False)
+    def test_buffered_upload_is_saved_once(self):
+        broker = InMemoryBroker()
+        with mock.patch('main.realtime._broker', broker), mock.patch.object(broker, 'publish') as publish:
+            document = self.upload(self.project_a)
+
+        self.assertEqual(self.stored_keys(), [document.file.name])
+        self.assertEqual(document.blob.key, document.file.name)
+        self.assertEqual(document.filename, 'spec.pdf')
+        entries = ChangeLogEntry.objects.filter(kind='document', object_id=document.id)
+        self.assertEqual(list(entries.values_list('action', flat=True)), [ChangeLogEntry.CREATED])
+        self.assertEqual([call.args[1]['action'] for call in publish.call_args_list], [ChangeLogEntry.CREATED])
+
+    def test_shared_object_downloads_under_each_documents_own_name(self):
+        self.upload(self.project_a, filename='acquisition-plan.pdf')
+        second = self.upload(self.project_b, filename='spec.pdf')
+        known = self.client.post(reverse('document-upload-url'), {
+            'project': self.project_b.id, 'name': 'Again', 'filename': 'again.pdf',
+            'sha256': hashlib.sha256(self.content).hexdigest(),
+        }).data['document']
+
+        for document_id, filename in ((second.id, 'spec.pdf'), (known['id'], 'again.pdf')):
+            response = self.client.get(reverse('document-download', args=[document_id]), {'mode': 'stream'})
+            self.assertEqual(response['Content-Disposition'], f'attachment; filename="{filename}"')
+            response = self.client.get(reverse('document-download', args=[document_id]), {'mode': 'redirect'})
+            self.assertIn(f'filename%3D%22{filename}%22', response['Location'])
+
+    def test_document_without_filename_downloads_under_its_name(self):
+        document = self.upload(self.project_a, filename='acquisition-plan.pdf')
+        Document.objects.filter(pk=document.pk).update(filename='')
+        response = self.client.get(reverse('document-download', args=[document.id]), {'mode': 'stream'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="Spec.pdf"')
+
+    def test_object_removed_with_last_reference(self):
+        first = self.upload(self.project_a)
+        second = self.upload(self.project_b)
+
+        self.delete(first)
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        self.assertEqual(self.stored_keys(), [second.file.name])
+
+        self.delete(second)
+        self.assertFalse(Blob.objects.exists())
+        self.assertEqual(list(StorageDeletion.objects.values_list('key', flat=True)), [second.file.name])
+
+        call_command('gc_storage', '--queue-only', stdout=io.StringIO())
+        self.assertEqual(self.stored_keys(), [])
+        self.assertFalse(StorageDeletion.objects.exists())
+
+    def test_project_delete_releases_blobs(self):
+        self.upload(self.project_a)
+        self.upload(self.project_a)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project_a.delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertEqual(StorageDeletion.objects.count(), 1)
+
+    def test_known_hash_skips_the_upload(self):
+        original = self.upload(self.project_a)
+        response = self.client.post(reverse('document-upload-url'), {
+            'project': self.project_b.id, 'name': 'Again', 'sha256': hashlib.sha256(self.content).hexdigest(),
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data['deduplicated'])
+        self.assertEqual(response.data['document']['file'], original.file.url)
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+
+    def test_hash_of_unreadable_content_is_not_trusted(self):
+        self.upload(self.project_a)
+        stranger = User.objects.create_user(username='stranger', email='s@example.com', password='pass')
+        own_project = Project.objects.create(project_name='Mine', owner=stranger)
+        self.client.force_authenticate(user=stranger)
+        response = self.client.post(reverse('document-upload-url'), {
+            'project': own_project.id, 'name': 'Steal', 'sha256': hashlib.sha256(self.content).hexdigest(),
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('url', response.data)
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+
+    def test_concurrent_identical_upload_points_at_the_kept_object(self):
+        first = self.upload(self.project_a)
+        # The other upload committed its blob after this one found none.
+        with mock.patch('main.api_views.reuse_blob', return_value=None):
+            second = self.upload(self.project_b, filename='race.pdf')
+        self.assertEqual(second.file.name, first.file.name)
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+        self.assertEqual(self.stored_keys(), [first.file.name])
+
+    def test_replacing_the_file_updates_metadata_and_releases_the_old_blob(self):
+        document = self.upload(self.project_a)
+        old_key = document.file.name
+        upload = SimpleUploadedFile('notes.txt', b'new contents', content_type='text/plain')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('document-detail', args=[document.id]), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        document.refresh_from_db()
+        self.assertEqual(document.size, len(b'new contents'))
+        self.assertEqual(document.content_type, 'text/plain')
+        self.assertEqual(document.sha256, hashlib.sha256(b'new contents').hexdigest())
+        self.assertEqual(Blob.objects.get().pk, document.blob_id)
+        self.assertEqual(list(StorageDeletion.objects.values_list('key', flat=True)), [old_key])
+
+
+class StorageGarbageCollectorTests(S3StorageMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Bucket', owner=self.user)
+
+    def put(self, key, body=b'data'):
+        self.storage.client.put_object(Bucket=self.storage.bucket_name, Key=key, Body=body)
+
+    def gc(self, *args):
+        out = io.StringIO()
+        call_command('gc_storage', *args, stdout=out)
+        return out.getvalue()
+
+    def test_project_delete_queues_files_for_one_batch(self):
+        for i in range(3):
+            key = f'documents/{i}/file.txt'
+            self.put(key)
+            Document.objects.create(project=self.project, name=f'Doc {i}', file=key)
+        with mock.patch.object(self.storage.client, 'delete_object') as delete_object:
+            self.project.delete()
+        delete_object.assert_not_called()
+        self.assertEqual(StorageDeletion.objects.count(), 3)
+
+        with mock.patch.object(self.storage.client, 'delete_objects', wraps=self.storage.client.delete_objects) as delete_objects:
+            self.gc('--queue-only')
+        self.assertEqual(delete_objects.call_count, 1)
+        self.assertEqual(self.stored_keys(), [])
+        self.assertFalse(StorageDeletion.objects.exists())
+
+    def test_queued_key_still_referenced_is_kept(self):
+        self.put('documents/kept/file.txt')
+        Document.objects.create(project=self.project, name='Kept', file='documents/kept/file.txt')
+        StorageDeletion.objects.create(key='documents/kept/file.txt')
+        self.gc('--queue-only')
+        self.assertEqual(self.stored_keys(), ['documents/kept/file.txt'])
+        self.assertFalse(StorageDeletion.objects.exists())
+
+    def test_sweep_removes_orphans_in_batches(self):
+        Document.objects.create(project=self.project, name='Live', file='documents/live/file.txt')
+        self.put('documents/live/file.txt')
+        for i in range(1005):
+            self.put(f'documents/orphan-{i:04d}/x', b'')
+        with mock.patch.object(self.storage.client, 'delete_objects', wraps=self.storage.client.delete_objects) as delete_objects:
+            output = self.gc('--grace', '0')
+        self.assertEqual(delete_objects.call_count, 2)
+        self.assertEqual(self.stored_keys(), ['documents/live/file.txt'])
+        self.assertIn('listed 1006 objects', output)
+
+    def test_dry_run_and_grace_period(self):
+        self.put('documents/orphan/file.txt')
+        self.assertIn('deleted 0 orphans', self.gc())
+        output = self.gc('--grace', '0', '--dry-run')
+        self.assertIn('documents/orphan/file.txt', output)
+        self.assertEqual(self.stored_keys(), ['documents/orphan/file.txt'])
+        self.gc('--grace', '0')
+        self.assertEqual(self.stored_keys(), [])
+
+
+class OutboxWorkerTests(APITestCase):
+    def setUp(self):
+        for i in range(3):
+            OutboxEmail.objects.create(subject='Hi', body='Body', from_email='from@example.com', recipient=f'user{i}@example.com')
+
+    def send(self, *args):
+        out = io.StringIO()
+        call_command('send_outbox', *args, stdout=out)
+        return out.getvalue()
+
+    def test_batches_share_one_connection(self):
+        with mock.patch('main.management.commands.send_outbox.get_connection', wraps=get_connection) as connect:
+            output = self.send('--batch-size', '2')
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['user0@example.com', 'user1@example.com', 'user2@example.com'])
+        self.assertFalse(OutboxEmail.objects.filter(sent_at__isnull=True).exists())
+        self.assertIn('Sent 3 emails', output)
+
+        self.send()
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_failures_are_retried_with_backoff(self):
+        failing = OutboxEmail.objects.get(recipient='user1@example.com')
+        original_send = EmailMessage.send
+
+        def send(message, *args, **kwargs):
+            if message.to == [failing.recipient]:
+                raise ConnectionError('mail server went away')
+            return original_send(message, *args, **kwargs)
+
+        with mock.patch.object(EmailMessage, 'send', send):
+            self.send()
+        failing.refresh_from_db()
+        self.assertIsNone(failing.sent_at)
+        self.assertEqual(failing.attempts, 1)
+        self.assertIn('mail server went away', failing.last_error)
+        self.assertGreater(failing.next_attempt_at, timezone.now())
+        self.assertEqual(len(mail.outbox), 2)
+
+        self.send()
+        self.assertEqual(len(mail.outbox), 2)
+
+        OutboxEmail.objects.filter(pk=failing.pk).update(next_attempt_at=timezone.now())
+        self.send()
+        self.assertEqual([m.to for m in mail.outbox[2:]], [[failing.recipient]])
+
+    def test_gives_up_after_max_attempts(self):
+        OutboxEmail.objects.update(attempts=8)
+        self.send('--max-attempts', '8')
+        self.assertEqual(mail.outbox, [])
+
+
+class BulkMemberTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Team', owner=self.owner)
+        self.client.force_authenticate(user=self.owner)
+
+    def make_users(self, count, prefix='user'):
+        return User.objects.bulk_create([
+            User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com') for i in range(count)
+        ])
+
+    def test_bulk_add_uses_constant_queries(self):
+        self.client.get(reverse('project-list'))  # warm the owner's role map
+        small = self.make_users(2, 'small')
+        with self.assertNumQueries(7):
+            self.client.post(reverse('project-members-bulk-add', args=[self.project.id]),
+                             {'user_ids': [u.id for u in small]}, format='json')
+
+        # 150 keeps each bulk insert inside one SQLite statement (999 parameters); Postgres has no such split.
+        team = self.make_users(150)
+        with self.assertNumQueries(7):
+            response = self.client.post(reverse('project-members-bulk-add', args=[self.project.id]),
+                                        {'user_ids': [u.id for u in team]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Member.objects.filter(project=self.project).count(), 152)
+
+    def test_bulk_add_reports_each_item(self):
+        existing, fresh, by_email = self.make_users(3)
+        Member.objects.create(project=self.project, member=existing)
+        response = self.client.post(reverse('project-members-bulk-add', args=[self.project.id]), {
+            'user_ids': [existing.id, fresh.id, 999999],
+            'emails': [by_email.email, fresh.email, 'stranger@example.com'],
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['status'] for r in response.data['results']],
+                         ['exists', 'added', 'not_found', 'added', 'exists', 'invited'])
+        self.assertEqual(response.data['results'][3]['user_id'], by_email.id)
+        self.assertEqual(list(OutboxEmail.objects.values_list('recipient', flat=True)), ['stranger@example.com'])
+        self.assertEqual(
+            set(Member.objects.filter(project=self.project).values_list('member_id', flat=True)),
+            {existing.id, fresh.id, by_email.id},
+        )
+
+    def test_bulk_add_invalidates_member_access(self):
+        user, = self.make_users(1)
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.client.get(reverse('project-list')).data, [])
+
+        self.client.force_authenticate(user=self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('project-members-bulk-add', args=[self.project.id]), {'user_ids': [user.id]}, format='json')
+
+        self.client.force_authenticate(user=user)
+        self.assertEqual([p['id'] for p in self.client.get(reverse('project-list')).data], [self.project.id])
+
+    def test_bulk_remove(self):
+        member, outsider = self.make_users(2)
+        Member.objects.create(project=self.project, member=member)
+        Member.objects.create(project=self.project, member=self.owner, is_owner=True)
+        response = self.client.post(reverse('project-members-bulk-remove', args=[self.project.id]), {
+            'user_ids': [member.id, outsider.id, self.owner.id], 'emails': ['nobody@example.com'],
+        }, format='json')
+
+        self.assertEqual([r['status'] for r in response.data['results']],
+                         ['removed', 'not_member', 'forbidden', 'not_found'])
+        self.assertEqual(list(Member.objects.values_list('member_id', flat=True)), [self.owner.id])
+
+    def test_only_owner_can_bulk_manage(self):
+        member, = self.make_users(1)
+        Member.objects.create(project=self.project, member=member)
+        self.client.force_authenticate(user=member)
+        for name in ('project-members-bulk-add', 'project-members-bulk-remove'):
+            response = self.client.post(reverse(name, args=[self.project.id]), {'user_ids': [member.id]}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_request_validation(self):
+        url = reverse('project-members-bulk-add', args=[self.project.id])
+        self.assertEqual(self.client.post(url, {}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(url, {'user_ids': ['x']}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(url, {'user_ids': 5}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProjectPermissionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.member = User.objects.create_user(username='member', email='member@example.com', password='pass')
+        self.outsider = User.objects.create_user(username='outsider', email='outsider@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Private', owner=self.owner)
+        Member.objects.create(project=self.project, member=self.member)
+        self.document = Document.objects.create(project=self.project, name='Plan', file='documents/plan.txt')
+        self.comment = Comment.objects.create(project=self.project, user=self.owner, text='Hello')
+
+    def test_outsider_cannot_read_or_write_project_content(self):
+        self.client.force_authenticate(user=self.outsider)
+        self.assertEqual(self.client.get(reverse('document-list')).data, [])
+        self.assertEqual(self.client.get(reverse('comment-list')).data['results'], [])
+        for url in (reverse('document-detail', args=[self.document.id]),
+                    reverse('document-download', args=[self.document.id]),
+                    reverse('comment-detail', args=[self.comment.id]),
+                    reverse('comment-by-project', args=[self.project.id])):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN, url)
+        response = self.client.post(reverse('comment-list'), {'project': self.project.id, 'text': 'Spam'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(reverse('comment-by-project', args=[99999])).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_member_cannot_change_project_or_others_comments(self):
+        self.client.force_authenticate(user=self.member)
+        response = self.client.patch(reverse('project-detail', args=[self.project.id]), {'project_name': 'Mine'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.delete(reverse('project-detail', args=[self.project.id])).status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.patch(reverse('comment-detail', args=[self.comment.id]), {'text': 'Edited'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.patch(reverse('project-detail', args=[self.project.id]), {'project_name': 'Renamed'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_warm_role_map_costs_no_queries(self):
+        self.client.force_authenticate(user=self.member)
+        self.client.get(reverse('document-list'))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('document-detail', args=[self.document.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_role_map_follows_membership_changes(self):
+        self.client.force_authenticate(user=self.member)
+        url = reverse('document-detail', args=[self.document.id])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        Member.objects.filter(member=self.member).delete()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ProjectSummaryTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.member = User.objects.create_user(username='member', email='member@example.com', password='pass')
+        self.busy = Project.objects.create(project_name='Busy', owner=self.owner)
+        self.empty = Project.objects.create(project_name='Empty', owner=self.owner)
+        Member.objects.create(project=self.busy, member=self.owner, is_owner=True)
+        Member.objects.create(project=self.busy, member=self.member)
+        Document.objects.create(project=self.busy, name='Spec', uploaded_at=timezone.now() - timedelta(days=2))
+        self.comment = Comment.objects.create(project=self.busy, user=self.member, text='Looks good')
+        self.client.force_authenticate(user=self.owner)
+
+    def test_list_returns_counts_without_nested_lists(self):
+        busy, empty = self.client.get(reverse('project-list')).data
+        self.assertEqual(busy['owner']['username'], 'owner')
+        self.assertEqual((busy['document_count'], busy['comment_count'], busy['member_count']), (1, 1, 2))
+        self.assertEqual(busy['last_activity'], DateTimeField().to_representation(self.comment.created_at))
+        self.assertNotIn('documents', busy)
+        self.assertNotIn('comments', busy)
+        self.assertEqual((empty['document_count'], empty['comment_count'], empty['member_count']), (0, 0, 0))
+        self.assertIsNone(empty['last_activity'])
+
+    def test_sparse_fields_and_expand(self):
+        response = self.client.get(reverse('project-list'), {'fields': 'id,project_name', 'expand': 'documents'})
+        self.assertEqual(set(response.data[0]), {'id', 'project_name', 'documents'})
+        self.assertEqual(response.data[0]['documents'][0]['name'], 'Spec')
+
+        response = self.client.get(reverse('project-list'), {'fields': 'id,comments'})
+        self.assertEqual(set(response.data[0]), {'id', 'comments'})
+
+        response = self.client.get(reverse('project-list'), {'expand': 'owner_password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_detail_keeps_full_representation(self):
+        response = self.client.get(reverse('project-detail', args=[self.busy.id]))
+        self.assertEqual(len(response.data['documents']), 1)
+        self.assertEqual(len(response.data['comments']), 1)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.member = User.objects.create_user(username='member', email='member@example.com', password='pass')
+        self.outsider = User.objects.create_user(username='outsider', email='outsider@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Polled', owner=self.owner)
+        Member.objects.create(project=self.project, member=self.owner, is_owner=True)
+        Member.objects.create(project=self.project, member=self.member)
+        Comment.objects.create(project=self.project, user=self.owner, text='First')
+        self.urls = [
+            reverse('project-detail', args=[self.project.id]),
+            reverse('comment-by-project', args=[self.project.id]),
+            reverse('project-members-list', args=[self.project.id]),
+        ]
+        self.client.force_authenticate(user=self.owner)
+
+    def test_unchanged_resources_return_304_without_queries(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                etag = response['ETag']
+                with self.assertNumQueries(0):
+                    cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+                self.assertEqual(cached['ETag'], etag)
+                self.assertEqual(cached.content, b'')
+
+    def test_writes_change_the_etag(self):
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        Comment.objects.create(project=self.project, user=self.member, text='Second')
+        for url, etag in zip(self.urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_is_per_user_and_not_a_bypass(self):
+        url = self.urls[0]
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(user=self.member)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=self.outsider)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(self.urls[1], HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ChangeFeedTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.member = User.objects.create_user(username='member', email='member@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Synced', owner=self.owner)
+        Member.objects.create(project=self.project, member=self.owner, is_owner=True)
+        self.url = reverse('project-changes', args=[self.project.id])
+        self.client.force_authenticate(user=self.owner)
+
+    def changes(self, since):
+        response = self.client.get(self.url, {'since': since})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_feed_reports_creates_updates_and_tombstones(self):
+        cursor = self.client.get(self.url).data['cursor']
+        document = Document.objects.create(project=self.project, name='Draft')
+        comment = Comment.objects.create(project=self.project, user=self.owner, text='v1')
+        comment.text = 'v2'
+        comment.save()
+        Member.objects.create(project=self.project, member=self.member)
+        document_id = document.id
+        document.delete()
+
+        feed = self.changes(cursor)
+        self.assertFalse(feed['has_more'])
+        summary = [(c['type'], c['id'], c['action']) for c in feed['changes']]
+        self.assertEqual(summary, [
+            ('comment', comment.id, 'created'),
+            ('member', self.member.id, 'created'),
+            ('document', document_id, 'deleted'),
+        ])
+        self.assertEqual(feed['changes'][0]['data']['text'], 'v2')
+        self.assertEqual(feed['changes'][1]['data']['username'], 'member')
+        self.assertNotIn('data', feed['changes'][2])
+
+        self.assertEqual(self.changes(feed['cursor'])['changes'], [])
+        Comment.objects.filter(pk=comment.pk).get().delete()
+        self.assertEqual([c['action'] for c in self.changes(feed['cursor'])['changes']], ['deleted'])
+
+    def test_feed_is_paged(self):
+        cursor = self.client.get(self.url).data['cursor']
+        for i in range(3):
+            Comment.objects.create(project=self.project, user=self.owner, text=str(i))
+        with mock.patch('main.changes.MAX_CHANGES', 2):
+            first = self.changes(cursor)
+            second = self.changes(first['cursor'])
+        self.assertTrue(first['has_more'])
+        self.assertEqual([c['data']['text'] for c in first['changes'] + second['changes']], ['0', '1', '2'])
+        self.assertFalse(second['has_more'])
+
+    def test_cost_follows_changes_not_project_size(self):
+        Comment.objects.bulk_create([Comment(project=self.project, user=self.owner, text='old') for _ in range(300)])
+        cursor = self.client.get(self.url).data['cursor']
+        Comment.objects.create(project=self.project, user=self.owner, text='new')
+        # One range scan of the log and one query for the changed comments.
+        with self.assertNumQueries(2):
+            feed = self.changes(cursor)
+        self.assertEqual(len(feed['changes']), 1)
+
+    def test_bulk_member_add_is_logged_and_access_is_checked(self):
+        cursor = self.client.get(self.url).data['cursor']
+        self.client.post(reverse('project-members-bulk-add', args=[self.project.id]), {'user_ids': [self.member.id]}, format='json')
+        self.assertEqual([(c['type'], c['id']) for c in self.changes(cursor)['changes']], [('member', self.member.id)])
+
+        outsider = User.objects.create_user(username='outsider', email='outsider@example.com', password='pass')
+        self.client.force_authenticate(user=outsider)
+        self.assertEqual(self.client.get(self.url, {'since': 0}).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_project_delete_clears_its_log(self):
+        Comment.objects.create(project=self.project, user=self.owner, text='bye')
+        self.project.delete()
+        self.assertFalse(ChangeLogEntry.objects.exists())
+
+    def test_project_delete_skips_per_child_logging(self):
+        def delete_project(children):
+            project = Project.objects.create(project_name='Doomed', owner=self.owner)
+            Comment.objects.bulk_create([Comment(project=project, user=self.owner, text='x') for _ in range(children)])
+            Document.objects.bulk_create([Document(project=project, name=f'{i}.txt') for i in range(children)])
+            with mock.patch('main.signals.publish_event') as publish, \
+                    mock.patch('main.signals.bump_project') as bump, CaptureQueriesContext(connection) as queries:
+                project.delete()
+            publish.assert_not_called()
+            self.assertEqual(bump.call_count, 1)
+            return len(queries)
+
+        self.assertEqual(delete_project(2), delete_project(40))
+        self.assertFalse(ChangeLogEntry.objects.exclude(project_id=self.project.id).exists())
+
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Concurrent transactions need PostgreSQL')
+class ChangeFeedConcurrencyTests(APITransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Synced', owner=self.owner)
+        Member.objects.create(project=self.project, member=self.owner, is_owner=True)
+        self.url = reverse('project-changes', args=[self.project.id])
+        self.client.force_authenticate(user=self.owner)
+
+    def in_thread(self, target):
+        def run():
+            try:
+                target()
+            finally:
+                connections.close_all()
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def test_cursor_never_passes_an_uncommitted_entry(self):
+        cursor = self.client.get(self.url).data['cursor']
+        written, release, second_done = threading.Event(), threading.Event(), threading.Event()
+
+        def slow_writer():
+            # Like DocumentViewSet.perform_create: the entry is written early in a longer transaction.
+            with transaction.atomic():
+                Comment.objects.create(project=self.project, user=self.owner, text='first')
+                written.set()
+                release.wait(10)
+
+        def fast_writer():
+            Comment.objects.create(project=self.project, user=self.owner, text='second')
+            second_done.set()
+
+        slow = self.in_thread(slow_writer)
+        self.assertTrue(written.wait(10))
+        fast = self.in_thread(fast_writer)
+        # The autocommit write waits for the open transaction instead of committing ahead of it.
+        self.assertFalse(second_done.wait(0.5))
+        during = self.client.get(self.url, {'since': cursor}).data
+        self.assertEqual(during['changes'], [])
+
+        release.set()
+        slow.join()
+        fast.join()
+        after = self.client.get(self.url, {'since': during['cursor']}).data
+        self.assertEqual([c['data']['text'] for c in after['changes']], ['first', 'second'])
+
+class RealtimeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        self.outsider = User.objects.create_user(username='outsider', email='outsider@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Live', owner=self.owner)
+        self.broker = InMemoryBroker()
+        patcher = mock.patch('main.realtime._broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def connect(self, user=None, token=None, project_id=None):
+        if token is None:
+            token = str(RefreshToken.for_user(user).access_token)
+        scope = {
+            'type': 'websocket',
+            'path': f'/ws/projects/{project_id or self.project.id}/',
+            'query_string': f'token={token}'.encode(),
+        }
+        return ApplicationCommunicator(asgi_application, scope)
+
+    def post_comment(self, text):
+        self.client.force_authenticate(user=self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('comment-list'), {'project': self.project.id, 'text': text})
+        return response.data['id']
+
+    async def test_new_comments_are_pushed(self):
+        socket = self.connect(self.owner)
+        await socket.send_input({'type': 'websocket.connect'})
+        self.assertEqual(await socket.receive_output(2), {'type': 'websocket.accept'})
+
+        comment_id = await sync_to_async(self.post_comment)('Hello there')
+        message = await socket.receive_output(2)
+        event = json.loads(message['text'])
+        self.assertEqual((event['type'], event['action'], event['id']), ('comment', 'created', comment_id))
+        self.assertEqual(event['data']['text'], 'Hello there')
+
+        await socket.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await socket.wait(2)
+        self.assertEqual(dict(self.broker._subscribers), {})
+
+    async def test_removed_member_is_disconnected(self):
+        member = await sync_to_async(User.objects.create_user)(username='member', email='member@example.com', password='pass')
+        await sync_to_async(Member.objects.create)(project=self.project, member=member)
+        socket = self.connect(member)
+        await socket.send_input({'type': 'websocket.connect'})
+        self.assertEqual(await socket.receive_output(2), {'type': 'websocket.accept'})
+
+        def remove():
+            with self.captureOnCommitCallbacks(execute=True):
+                Member.objects.get(project=self.project, member=member).delete()
+
+        await sync_to_async(remove)()
+        await sync_to_async(self.post_comment)('After removal')
+        self.assertEqual(await socket.receive_output(2), {'type': 'websocket.close', 'code': 4403})
+
+    async def test_socket_closes_when_the_token_expires(self):
+        token = AccessToken.for_user(self.owner)
+        token.set_exp(lifetime=timedelta(seconds=1))
+        socket = self.connect(token=str(token))
+        await socket.send_input({'type': 'websocket.connect'})
+        self.assertEqual(await socket.receive_output(2), {'type': 'websocket.accept'})
+        self.assertEqual(await socket.receive_output(3), {'type': 'websocket.close', 'code': 4401})
+
+    async def test_rejects_bad_tokens_and_outsiders(self):
+        for socket, code in ((self.connect(token='garbage'), 4401), (self.connect(self.outsider), 4403)):
+            await socket.send_input({'type': 'websocket.connect'})
+            self.assertEqual(await socket.receive_output(2), {'type': 'websocket.close', 'code': code})
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        self.stranger = User.objects.create_user(username='stranger', email='stranger@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Bridge', owner=self.user)
+        self.hidden = Project.objects.create(project_name='Secret', owner=self.stranger)
+        self.client.force_authenticate(user=self.user)
+
+    def search(self, **params):
+        response = self.client.get(reverse('search'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_finds_comments_and_documents_in_own_projects(self):
+        hit = Comment.objects.create(project=self.project, user=self.user, text='Concrete pour scheduled for Monday')
+        Comment.objects.create(project=self.project, user=self.user, text='Steel delivery delayed')
+        Comment.objects.create(project=self.hidden, user=self.stranger, text='Concrete supplier contract')
+        document = Document.objects.create(project=self.project, name='Concrete mix specification')
+
+        data = self.search(q='concrete')
+        self.assertEqual([c['id'] for c in data['comments']], [hit.id])
+        self.assertEqual([d['id'] for d in data['documents']], [document.id])
+        self.assertIn('rank', data['comments'][0])
+
+        self.assertEqual([c['id'] for c in self.search(q='concr', type='comments')['comments']], [hit.id])
+        self.assertNotIn('documents', self.search(q='concrete', type='comments'))
+
+    def test_index_follows_edits_and_deletes(self):
+        comment = Comment.objects.create(project=self.project, user=self.user, text='first draft')
+        comment.text = 'final version'
+        comment.save()
+        self.assertEqual(self.search(q='draft')['comments'], [])
+        self.assertEqual(len(self.search(q='final')['comments']), 1)
+        comment.delete()
+        self.assertEqual(self.search(q='final')['comments'], [])
+
+    def test_more_matches_rank_higher(self):
+        weak = Comment.objects.create(project=self.project, user=self.user, text='crane booked, crew on site, permits filed, fence up')
+        strong = Comment.objects.create(project=self.project, user=self.user, text='crane crane crane')
+        self.assertEqual([c['id'] for c in self.search(q='crane')['comments']], [strong.id, weak.id])
+
+    def test_query_syntax_is_not_interpreted(self):
+        Comment.objects.create(project=self.project, user=self.user, text='quote "this" please')
+        self.assertEqual(len(self.search(q='"this (please* -')['comments']), 1)
+        self.assertEqual(self.search(q='***')['comments'], [])
+
+    def test_query_count_does_not_grow_with_volume(self):
+        Comment.objects.bulk_create([Comment(project=self.project, user=self.user, text=f'routine note {i}') for i in range(500)])
+        Comment.objects.create(project=self.project, user=self.user, text='unusual vibration in pump')
+        self.search(q='warmup')
+        with self.assertNumQueries(2):
+            data = self.search(q='vibration', type='comments')
+        self.assertEqual(len(data['comments']), 1)
+
+    def test_scoping_and_validation(self):
+        self.assertEqual(self.client.get(reverse('search')).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('search'), {'q': 'x', 'type': 'users'}).status_code, status.HTTP_400_BAD_REQUEST)
+        for limit in ('-5', '0', 'many'):
+            response = self.client.get(reverse('search'), {'q': 'x', 'limit': limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('search'), {'q': 'x', 'project': self.hidden.id})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_admin_comment_search(self):
+        admin_user = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        Comment.objects.create(project=self.project, user=self.user, text='hello')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:main_comment_changelist'), {'q': 'reader'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, 'hello')
+
+
+class DocumentTextExtractionTests(S3StorageMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Bridge', owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def document(self, name, body, content_type=''):
+        key = f'documents/{name}'
+        if body is not None:
+            self.storage.client.put_object(Bucket=self.storage.bucket_name, Key=key, Body=body)
+        return Document.objects.create(project=self.project, name=name, file=key, content_type=content_type)
+
+    def extract(self, *args):
+        out = io.StringIO()
+        call_command('extract_document_text', *args, '--workers', '2', stdout=out)
+        return out.getvalue()
+
+    def search(self, q):
+        response = self.client.get(reverse('search'), {'q': q, 'type': 'documents'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [d['id'] for d in response.data['documents']]
+
+    def test_extracted_contents_are_searchable(self):
+        notes = self.document('notes.md', '# Site notes\n\nRebar inspection passed.'.encode())
+        costs = self.document('costs.csv', b'item,cost\nformwork,1200\n', content_type='text/csv')
+        self.assertFalse(DocumentText.objects.exists())
+
+        self.assertIn('done 2', self.extract())
+        self.assertEqual(DocumentText.objects.get(document=notes).status, DocumentText.DONE)
+        self.assertIn('formwork,1200', DocumentText.objects.get(document=costs).content)
+        self.assertEqual(self.search('rebar inspection'), [notes.id])
+        self.assertEqual(self.search('formwork'), [costs.id])
+        # Nothing left to do on the next pass.
+        self.assertIn('done 0', self.extract())
+
+    def test_unsupported_and_missing_files(self):
+        image = self.document('photo.png', b'\x89PNG\r\n')
+        missing = self.document('gone.txt', None)
+
+        self.extract()
+        self.assertEqual(DocumentText.objects.get(document=image).status, DocumentText.UNSUPPORTED)
+        failed = DocumentText.objects.get(document=missing)
+        self.assertEqual(failed.status, DocumentText.FAILED)
+        self.assertIn('NoSuchKey', failed.error)
+
+        self.assertIn('failed 0', self.extract())
+        self.storage.client.put_object(Bucket=self.storage.bucket_name, Key='documents/gone.txt', Body=b'found again')
+        self.extract('--retry-failed')
+        self.assertEqual(DocumentText.objects.get(document=missing).content, 'found again')
+
+    @override_settings(DOCUMENT_TEXT_MAX_CHARS=100)
+    def test_text_is_capped_and_cleaned(self):
+        document = self.document('log.txt', b'\x00bad \xff byte ' + b'x' * 500_000)
+        self.extract()
+        text = DocumentText.objects.get(document=document)
+        self.assertEqual(len(text.content), 100)
+        self.assertTrue(text.truncated)
+        self.assertTrue(text.content.startswith('bad � byte x'))
+
+    def test_replaced_file_is_extracted_again(self):
+        document = self.document('plan.txt', b'original foundation plan')
+        self.extract()
+        self.storage.client.put_object(Bucket=self.storage.bucket_name, Key='documents/plan-v2.txt', Body=b'revised scaffolding plan')
+        document.file = 'documents/plan-v2.txt'
+        document.save()
+
+        self.extract()
+        self.assertEqual(DocumentText.objects.get(document=document).source, 'documents/plan-v2.txt')
+        self.assertEqual(self.search('scaffolding'), [document.id])
+        self.assertEqual(self.search('foundation'), [])
+
+
+class DocumentPreviewTests(S3StorageMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='pass')
+        self.stranger = User.objects.create_user(username='stranger', email='stranger@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Bridge', owner=self.user)
+        Member.objects.create(member=self.user, project=self.project, is_owner=True)
+        self.client.force_authenticate(user=self.user)
+
+    def document(self, name, body):
+        key = f'documents/{name}'
+        self.storage.client.put_object(Bucket=self.storage.bucket_name, Key=key, Body=body)
+        return Document.objects.create(project=self.project, name=name, file=key)
+
+    def generate(self):
+        out = io.StringIO()
+        call_command('generate_previews', '--workers', '2', stdout=out)
+        return out.getvalue()
+
+    def test_snippet_is_generated_and_serialized(self):
+        document = self.document('notes.txt', b'Pour the east abutment on Monday. ' * 100)
+        response = self.client.get(reverse('document-detail', args=[document.id]))
+        self.assertIsNone(response.data['preview'])
+        etag = self.client.get(reverse('project-detail', args=[self.project.id]))['ETag']
+
+        self.assertIn('done 1', self.generate())
+        response = self.client.get(reverse('project-detail', args=[self.project.id]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        preview = response.data['documents'][0]['preview']
+        self.assertEqual(preview['status'], DocumentPreview.DONE)
+        self.assertTrue(preview['snippet'].startswith('Pour the east abutment'))
+        self.assertLessEqual(len(preview['snippet']), settings.DOCUMENT_PREVIEW_SNIPPET_CHARS)
+        self.assertIsNone(preview['thumbnail'])
+        self.assertTrue(ChangeLogEntry.objects.filter(object_id=document.id, action=ChangeLogEntry.UPDATED).exists())
+        self.assertIn('done 0', self.generate())
+
+    def test_thumbnail_endpoint_and_cleanup(self):
+        document = self.document('site.png', b'\x89PNG original')
+        key = f'previews/{document.id}/thumb.jpg'
+        self.storage.client.put_object(Bucket=self.storage.bucket_name, Key=key, Body=b'small jpeg')
+        DocumentPreview.objects.create(document=document, source=document.file.name, status=DocumentPreview.DONE, thumbnail=key)
+
+        url = reverse('document-detail', args=[document.id])
+        thumbnail_url = self.client.get(url).data['preview']['thumbnail']
+        self.assertEqual(thumbnail_url, reverse('document-thumbnail', args=[document.id]))
+        response = self.client.get(thumbnail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), b'small jpeg')
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        again = self.client.get(thumbnail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.force_authenticate(user=self.stranger)
+        self.assertEqual(self.client.get(thumbnail_url).status_code, status.HTTP_403_FORBIDDEN)
+
+        document.delete()
+        self.assertTrue(StorageDeletion.objects.filter(key=key).exists())
+
+    def test_preview_of_replaced_file_is_hidden_until_regenerated(self):
+        document = self.document('a.txt', b'first version')
+        self.generate()
+        self.storage.client.put_object(Bucket=self.storage.bucket_name, Key='documents/b.txt', Body=b'second version')
+        document.file = 'documents/b.txt'
+        document.save()
+        self.assertIsNone(self.client.get(reverse('document-detail', args=[document.id])).data['preview'])
+
+        self.generate()
+        preview = self.client.get(reverse('document-detail', args=[document.id])).data['preview']
+        self.assertEqual(preview['snippet'], 'second version')
+
+    @unittest.skipUnless(Image, 'Pillow is not installed')
+    def test_image_thumbnail_is_downscaled(self):
+        body = io.BytesIO()
+        Image.new('RGB', (1200, 600), 'orange').save(body, 'PNG')
+        document = self.document('wide.png', body.getvalue())
+
+        self.generate()
+        preview = DocumentPreview.objects.get(document=document)
+        self.assertTrue(preview.thumbnail.name.startswith(f'previews/{document.id}/'))
+        with Image.open(io.BytesIO(preview.thumbnail.read())) as thumbnail:
+            self.assertEqual(thumbnail.size, (settings.DOCUMENT_PREVIEW_SIZE, settings.DOCUMENT_PREVIEW_SIZE // 2))
+
+    @unittest.skipIf(Image, 'Pillow is installed')
+    def test_images_are_unsupported_without_pillow(self):
+        document = self.document('wide.png', b'\x89PNG')
+        self.assertIn('unsupported 1', self.generate())
+        self.assertIsNone(self.client.get(reverse('document-detail', args=[document.id])).data['preview']['thumbnail'])
+
+
+class BenchmarkTests(APITestCase):
+    def test_benchmarks_measure_every_endpoint(self):
+        with benchmark_environment():
+            target = prepare({'projects': 3, 'members': 3, 'comments': 5, 'documents': 2})
+            results = run_benchmarks(target, iterations=2)
+        shape = Project.objects.annotate(
+            comment_count=Count('comment', distinct=True), document_count=Count('documents', distinct=True),
+            team_size=Count('members', distinct=True),
+        ).values_list('comment_count', 'document_count', 'team_size')
+        self.assertEqual(set(shape), {(5, 2, 3)})
+        self.assertEqual(set(results), set(ENDPOINTS))
+        for result in results.values():
+            self.assertGreater(result['queries'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertGreater(result['memory_kib'], 0)
+        self.assertEqual(compare(results, results, tolerance=0), [])
+
+    def test_environment_swaps_storage_and_broker_through_settings(self):
+        storage = Document._meta.get_field('file').storage
+        with benchmark_environment():
+            self.assertIsInstance(storage, InMemoryStorage)
+            self.assertIsInstance(get_broker(), InMemoryBroker)
+        self.assertIsInstance(storage, MinIOStorage)
+
+    def test_compare_flags_regressions(self):
+        baseline = {'project-list': {'p50_ms': 5, 'p95_ms': 10, 'queries': 2, 'memory_kib': 100}}
+        noisy = {'project-list': {'p50_ms': 6, 'p95_ms': 11.5, 'queries': 2, 'memory_kib': 150}}
+        self.assertEqual(compare(noisy, baseline, tolerance=0.1), [])
+
+        worse = {'project-list': {'p50_ms': 20, 'p95_ms': 40, 'queries': 3, 'memory_kib': 1000}}
+        regressions = compare(worse, baseline, tolerance=0.5)
+        self.assertEqual(len(regressions), 3)
+        self.assertIn('project-list: 3 queries, baseline 2', regressions)
+
+
+class SeedCommandTests(APITestCase):
+    def seed(self, **options):
+        call_command('seed', users=60, projects=12, comments=600, documents=40, stdout=io.StringIO(), **options)
+
+    def test_generates_requested_volumes_with_skew(self):
+        self.seed(seed=3)
+        self.assertEqual(User.objects.filter(username__startswith='seed-user-').count(), 60)
+        self.assertEqual(Project.objects.count(), 12)
+        self.assertEqual(Comment.objects.count(), 600)
+        self.assertEqual(Document.objects.count(), 40)
+        self.assertEqual(Member.objects.filter(is_owner=True).count(), 12)
+
+        per_project = sorted(Project.objects.annotate(n=Count('comment')).values_list('n', flat=True), reverse=True)
+        self.assertGreater(per_project[0], 3 * per_project[-1])
+        # Authors are members of the project they comment on.
+        self.assertFalse(Comment.objects.exclude(project__members__member=F('user')).exists())
+        # Timestamps are spread out rather than all set to now().
+        self.assertGreater(Comment.objects.dates('created_at', 'day').count(), 100)
+
+    def test_same_seed_same_shape_and_prefix_guard(self):
+        self.seed(seed=5)
+        first = list(Project.objects.annotate(n=Count('comment')).order_by('pk').values_list('n', flat=True))
+        with self.assertRaises(CommandError):
+            self.seed(seed=5)
+        self.seed(seed=5, prefix='again')
+        second = list(Project.objects.annotate(n=Count('comment')).order_by('pk').values_list('n', flat=True))[12:]
+        self.assertEqual(first, second)
+
+        comment = Comment.objects.create(project=Project.objects.first(), user=User.objects.first(), text='live')
+        self.assertLess(timezone.now() - comment.created_at, timedelta(minutes=1))
+
+    def test_power_law_counts(self):
+        counts = power_law_counts(1000, 50, random.Random(1))
+        self.assertEqual(sum(counts), 1000)
+        self.assertEqual(len(counts), 50)
+        self.assertEqual(counts, power_law_counts(1000, 50, random.Random(1)))
+
+
+@override_settings(
+    METRICS_BACKEND='memory',
+    CACHES={'default': {'BACKEND': 'main.cache_backends.LocMemCache', 'LOCATION': 'metrics-tests'}},
+)
+class MetricsTests(S3StorageMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        for patcher in (mock.patch.object(metrics, 'registry', metrics.Registry()),
+                        mock.patch.object(metrics, '_sink', metrics.MemorySink())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='ops', email='ops@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Bridge', owner=self.user)
+        Member.objects.create(member=self.user, project=self.project, is_owner=True)
+        self.client.force_authenticate(user=self.user)
+
+    def scrape(self, **headers):
+        response = self.client.get(reverse('metrics'), **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_requests_queries_and_cache_reads_are_recorded(self):
+        self.client.get(reverse('project-list'))
+        self.client.get(reverse('project-list'))
+        body = self.scrape()
+
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="project-list",method="GET",status="200",le="+Inf"} 2', body)
+        self.assertIn('http_request_duration_seconds_count{view="project-list",method="GET",status="200"} 2', body)
+        self.assertRegex(body, r'db_queries_total\{view="project-list"\} \d+')
+        self.assertRegex(body, r'cache_requests_total\{result="hit"\} \d+')
+        self.assertRegex(body, r'cache_requests_total\{result="miss"\} \d+')
+        buckets = re.findall(r'view="project-list",method="GET",status="200",le="([^"]+)"', body)
+        self.assertEqual(buckets[-1], '+Inf')
+        self.assertEqual(buckets[:-1], sorted(buckets[:-1], key=float))
+
+    def test_storage_calls_are_timed(self):
+        self.storage.client.put_object(Bucket=self.storage.bucket_name, Key='documents/a.txt', Body=b'a')
+        self.storage.head('documents/a.txt')
+        self.assertIn('storage_request_duration_seconds_count{operation="HeadObject"} 1', self.scrape())
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_token_is_required_when_configured(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.scrape(HTTP_AUTHORIZATION='Bearer scrape-secret')
+
+    def test_failed_flush_keeps_deltas(self):
+        metrics.registry.inc('db_queries_total', 3, view='x')
+        with mock.patch.object(metrics.MemorySink, 'add', side_effect=ConnectionError), self.assertLogs('main.metrics', 'WARNING'):
+            metrics.flush()
+        metrics.flush()
+        self.assertEqual(metrics.get_sink().read(), {'db_queries_total{view="x"}': 3})
+
+    def test_silk_is_opt_in_and_sampled(self):
+        self.assertNotIn('silk.middleware.SilkyMiddleware', settings.MIDDLEWARE)
+        request = mock.Mock(headers={'X-Silk-Profile': 'let-me-in'})
+        with override_settings(SILK_SAMPLE_RATE=0, SILK_TRIGGER_TOKEN='let-me-in'):
+            self.assertTrue(should_profile(request))
+            self.assertFalse(should_profile(mock.Mock(headers={'X-Silk-Profile': 'guess'})))
+        with override_settings(SILK_SAMPLE_RATE=1, SILK_TRIGGER_TOKEN=''):
+            self.assertTrue(should_profile(mock.Mock(headers={})))
+
+
+class RepeatedQueryTests(S3StorageMixin, APITestCase):
+    """Every GET route of every registered viewset, against enough rows to expose per-row queries."""
+    rows = 10
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.owner = User.objects.create_superuser(username='owner', email='owner@example.com', password='pass')
+        self.project = Project.objects.create(project_name='Bridge', owner=self.owner)
+        Member.objects.create(member=self.owner, project=self.project, is_owner=True)
+        for i in range(self.rows):
+            user = User.objects.create_user(username=f'crew{i}', email=f'crew{i}@example.com', password='pass')
+            Member.objects.create(member=user, project=self.project)
+            Comment.objects.create(project=self.project, user=user, text=f'note {i}')
+            key = f'documents/doc{i}.txt'
+            self.storage.client.put_object(Bucket=self.storage.bucket_name, Key=key, Body=b'text')
+            document = Document.objects.create(project=self.project, name=f'doc{i}.txt', file=key)
+            DocumentPreview.objects.create(document=document, source=key, status=DocumentPreview.DONE, snippet='text')
+            other = Project.objects.create(project_name=f'Side {i}', owner=self.owner)
+            Member.objects.create(member=self.owner, project=other, is_owner=True)
+        UploadSession.objects.create(project=self.project, user=self.owner, name='big.bin', key='documents/big.bin', upload_id='u1')
+        self.client.force_authenticate(user=self.owner)
+
+    def get_routes(self):
+        from final_project.urls import projects_router, router
+
+        values = {'project_pk': self.project.pk, 'project_id': self.project.pk, 'user_id': self.owner.pk}
+        for registry, nested in ((router.registry, False), (projects_router.registry, True)):
+            for prefix, viewset, basename in registry:
+                serializer = getattr(viewset, 'serializer_class', None)
+                model = serializer.Meta.model if serializer else None
+                routes = [('list', False, '')] if hasattr(viewset, 'list') else []
+                if hasattr(viewset, 'retrieve'):
+                    routes.append(('detail', True, ''))
+                routes += [(action.url_name, action.detail, action.url_path)
+                           for action in viewset.get_extra_actions() if 'get' in action.mapping]
+                for name, detail, url_path in routes:
+                    kwargs = {key: values[key] for key in re.findall(r'\(\?P<(\w+)>', url_path)}
+                    if nested:
+                        kwargs['project_pk'] = self.project.pk
+                    if detail:
+                        kwargs['pk'] = model.objects.order_by('pk').first().pk
+                    yield reverse(f'{basename}-{name}', kwargs=kwargs)
+
+    def test_no_viewset_repeats_queries(self):
+        urls = list(self.get_routes())
+        self.assertGreater(len(urls), 10)
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                with assert_no_repeated_queries(label=url):
+                    response = self.client.get(url)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                self.assertLess(response.status_code, 500)
+
+    def test_admin_changelists(self):
+        self.client.force_login(self.owner)
+        for model in (Comment, Member, Document, Project, DocumentPreview, UploadSession):
+            url = reverse(f'admin:main_{model._meta.model_name}_changelist')
+            with self.subTest(url=url), assert_no_repeated_queries(label=url):
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_detector_reports_shape_and_origin(self):
+        with self.assertRaises(AssertionError) as raised, assert_no_repeated_queries(threshold=3):
+            [comment.username for comment in Comment.objects.all()]
+        report = str(raised.exception)
+        self.assertIn('10x SELECT', report)
+        self.assertIn('main/models.py', report)
+
+        with QueryShapeRecorder() as recorder:
+            list(Comment.objects.filter(pk__in=[1, 2]))
+            list(Comment.objects.filter(pk__in=[3, 4, 5]))
+        self.assertEqual(len(recorder.counts), 1)
+
+    @override_settings(QUERY_SHAPE_MODE='raise')
+    def test_middleware_raises_in_ci_mode(self):
+        self.client.force_login(self.owner)
+        with mock.patch.object(CommentAdmin, 'list_select_related', ('project',)):
+            with self.assertRaisesMessage(RepeatedQueriesError, 'main/models.py'):
+                self.client.get(reverse('admin:main_comment_changelist'))
+
+
+class CachedAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        local_users.clear()
+        self.user = User.objects.create_user(username='cached', email='cached@example.com', password='pass')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.url = reverse('current_user')
+
+    def test_repeat_requests_skip_the_database(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).data['username'], 'cached')
+
+    def test_shared_cache_serves_other_processes(self):
+        self.client.get(self.url)
+        local_users.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_local_entries_expire(self):
+        self.client.get(self.url)
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+        later = mock.patch('main.authentication.time.monotonic', return_value=10 ** 9)
+        with later, self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_saving_the_user_invalidates(self):
+        self.client.get(self.url)
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).data['username'], 'renamed')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_each_request_gets_its_own_user(self):
+        auth = CachedJWTAuthentication()
+        token = auth.get_validated_token(str(RefreshToken.for_user(self.user).access_token))
+        first, second = auth.get_user(token), auth.get_user(token)
+        self.assertIsNot(first, second)
+        first.first_name = 'Changed'
+        self.assertEqual(second.first_name, '')
+
+        # Only the loaded fields are written back, so the cached copy can't clobber anything.
+        second.set_password('rotated')
+        second.save()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('rotated'))
+        self.assertEqual(self.user.username, 'cached')
+
+    def test_shared_cache_holds_no_password_hash(self):
+        self.client.get(self.url)
+        entry = cache.get(f'auth-user-fields:{self.user.pk}')
+        self.assertIn('cached', entry[0])
+        self.assertNotIn(self.user.password, repr(entry))
+
+    def test_deleted_user_is_rejected(self):
+        self.client.get(self.url)
+        self.user.delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
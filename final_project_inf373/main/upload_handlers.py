@@ -0,0 +1,94 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+from .models import Document, document_key
+
+
+class S3UploadedFile(UploadedFile):
+    """A file that already lives in storage under ``key``; only its metadata is kept in memory."""
+
+    def __init__(self, key, name, content_type, size, sha256, charset=None, content_type_extra=None):
+        super().__init__(None, name, content_type, size, charset, content_type_extra)
+        self.key = key
+        self.sha256 = sha256
+
+    def open(self, mode=None):
+        raise ValueError("S3UploadedFile has already been written to storage; open it through the storage.")
+
+    def close(self):
+        pass
+
+
+class S3StreamingUploadHandler(FileUploadHandler):
+    """Forward multipart request bodies to an S3 multipart upload as the chunks arrive.
+
+    At most one part (``DOCUMENT_UPLOAD_PART_SIZE``) is buffered per file, nothing is spooled to
+    disk, and size and SHA-256 are computed on the way through. Files that fit in a single part
+    are written with one PUT instead.
+    """
+
+    def __init__(self, request=None, storage=None):
+        super().__init__(request)
+        self.storage = storage or Document._meta.get_field('file').storage
+        self.part_size = max(settings.DOCUMENT_UPLOAD_PART_SIZE, 5 * 1024 * 1024)
+        self.uploaded = []
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.key = document_key(self.file_name)
+        self.upload_id = None
+        self.parts = []
+        self.buffer = bytearray()
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha256.update(raw_data)
+        self.size += len(raw_data)
+        self.buffer += raw_data
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+        return None
+
+    def file_complete(self, file_size):
+        if self.upload_id is None:
+            self.storage.client.put_object(
+                Bucket=self.storage.bucket_name,
+                Key=self.key,
+                Body=bytes(self.buffer),
+                ContentType=self.content_type or 'application/octet-stream',
+            )
+        else:
+            if self.buffer:
+                self._upload_part(bytes(self.buffer))
+            self.storage.complete_multipart_upload(self.key, self.upload_id, self.parts)
+        self.buffer = bytearray()
+
+        uploaded = S3UploadedFile(
+            self.key, self.file_name, self.content_type, self.size, self.sha256.hexdigest(),
+            self.charset, self.content_type_extra,
+        )
+        self.uploaded.append(uploaded)
+        return uploaded
+
+    def upload_interrupted(self):
+        if getattr(self, 'upload_id', None):
+            self.storage.abort_multipart_upload(self.key, self.upload_id)
+            self.upload_id = None
+
+    def _upload_part(self, body):
+        if self.upload_id is None:
+            self.upload_id = self.storage.create_multipart_upload(self.key, content_type=self.content_type)
+        number = len(self.parts) + 1
+        response = self.storage.client.upload_part(
+            Bucket=self.storage.bucket_name,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=number,
+            Body=body,
+        )
+        self.parts.append({'PartNumber': number, 'ETag': response['ETag']})
@@ -3,7 +3,12 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import RegisterSerializer, UserSerializer
+from .metrics import render as render_metrics
+from .permissions import project_roles, require_project_role
+from .search import MAX_RESULTS, search_comments, search_documents
+from .serializers import CommentSerializer, DocumentSerializer, RegisterSerializer, UserSerializer
+from django.conf import settings
+from django.http import HttpResponse
 from django.views.generic import TemplateView
 from django.shortcuts import render
 
@@ -37,3 +42,52 @@ class CurrentUserView(APIView):
         return Response(serializer.data)
 
 
+
+class SearchView(APIView):
+    """Full-text search over comment text and document names and contents in the caller's projects."""
+    permission_classes = [IsAuthenticated]
+    kinds = ('comments', 'documents')
+
+    def get(self, request):
+        query = (request.query_params.get('q') or '').strip()
+        if not query:
+            return Response({'detail': 'q is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        kinds = [kind for kind in request.query_params.get('type', ','.join(self.kinds)).split(',') if kind]
+        if not kinds or set(kinds) - set(self.kinds):
+            return Response({'detail': f'type must be one of: {", ".join(self.kinds)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response({'detail': 'limit must be a positive integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, MAX_RESULTS)
+
+        project = request.query_params.get('project')
+        if project:
+            require_project_role(request, project, "You do not have permission to view this project.")
+            project_ids = [int(project)]
+        else:
+            project_ids = sorted(project_roles(request))
+
+        context = {'request': request}
+        data = {}
+        if 'comments' in kinds:
+            comments = search_comments(query, project_ids, limit)
+            data['comments'] = [
+                {**CommentSerializer(comment, context=context).data, 'rank': comment.rank} for comment in comments
+            ]
+        if 'documents' in kinds:
+            documents = search_documents(query, project_ids, limit)
+            data['documents'] = [
+                {**DocumentSerializer(document, context=context).data, 'rank': document.rank} for document in documents
+            ]
+        return Response(data)
+
+
+def metrics(request):
+    """Prometheus scrape target; plain Django so scrapes skip DRF authentication and rendering."""
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=401)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -87,6 +87,9 @@ const ProjectDashboard = () => {
           {projects.map(project => (
             <Link to={`/projects/${project.id}`} key={project.id} className="project-card">
               {project.project_name}
+              <div className="project-card__stats">
+                {project.document_count} documents · {project.comment_count} comments · {project.member_count} members
+              </div>
             </Link>
           ))}
         </div>
@@ -1,7 +1,40 @@
 import React, { useEffect, useState } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import '../styles/project-details.css';
-import { authFetch } from '../utils/authFetch';
+import { authFetch, BASE_URL } from '../utils/authFetch';
+
+const formatSize = (bytes) => {
+  const units = ['B', 'KB', 'MB', 'GB'];
+  let size = bytes;
+  let unit = 0;
+  while (size >= 1024 && unit < units.length - 1) {
+    size /= 1024;
+    unit += 1;
+  }
+  return `${unit ? size.toFixed(1) : size} ${units[unit]}`;
+};
+
+// Thumbnails need the auth header, so they are fetched and shown through an object URL.
+function DocumentThumbnail({ src, alt }) {
+  const [url, setUrl] = useState(null);
+
+  useEffect(() => {
+    let objectUrl = null;
+    let cancelled = false;
+    authFetch(src).then(async (res) => {
+      if (!res.ok || cancelled) return;
+      objectUrl = URL.createObjectURL(await res.blob());
+      if (cancelled) URL.revokeObjectURL(objectUrl);
+      else setUrl(objectUrl);
+    });
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
+  }, [src]);
+
+  return url ? <img className="document-card__thumbnail" src={url} alt={alt} /> : null;
+}
 
 function ProjectDetails() {
   const { id } = useParams();
@@ -28,6 +61,29 @@ function ProjectDetails() {
     fetchData();
   }, [id]);
 
+  // Live updates: the server pushes comment/document changes instead of us polling.
+  useEffect(() => {
+    const token = localStorage.getItem('access');
+    if (!token) return undefined;
+
+    const upsert = (items, event) =>
+      items.some(item => item.id === event.id) ? items : [event.data, ...items];
+    const socket = new WebSocket(`${BASE_URL.replace(/^http/, 'ws')}/ws/projects/${id}/?token=${token}`);
+    socket.onmessage = (message) => {
+      const event = JSON.parse(message.data);
+      const update = event.type === 'comment' ? setComments : event.type === 'document' ? setDocuments : null;
+      if (!update) return;
+      if (event.action === 'deleted') {
+        update(items => items.filter(item => item.id !== event.id));
+      } else if (event.action === 'created') {
+        update(items => upsert(items, event));
+      } else {
+        update(items => items.map(item => (item.id === event.id ? { ...item, ...event.data } : item)));
+      }
+    };
+    return () => socket.close();
+  }, [id]);
+
   const handleCommentSubmit = async (e) => {
     e.preventDefault();
     if (!newComment.trim()) return;
@@ -106,9 +162,14 @@ function ProjectDetails() {
       <div className="documents">
         {documents.length > 0 ? documents.map(doc => (
           <div key={doc.id} className="document-card">
+            {doc.preview?.thumbnail && <DocumentThumbnail src={doc.preview.thumbnail} alt={doc.name} />}
             <div className="document-card__info">
               <div className="document-card__name">{doc.name}</div>
               <div className="document-card__path">{doc.file}</div>
+              {doc.size != null && (
+                <div className="document-card__path">{formatSize(doc.size)}{doc.content_type && ` · ${doc.content_type}`}</div>
+              )}
+              {doc.preview?.snippet && <div className="document-card__snippet">{doc.preview.snippet}</div>}
             </div>
             <div className="document-card__actions">
               <button onClick={() => handleDownload(doc.id, doc.name)}>⬇️</button>